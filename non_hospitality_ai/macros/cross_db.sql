@@ -0,0 +1,57 @@
+{#- BigQuery functions the models use, with DuckDB equivalents for local runs on the seeds -#}
+
+{% macro safe_cast_to(expr, data_type) -%}
+  {{ return(adapter.dispatch('safe_cast_to')(expr, data_type)) }}
+{%- endmacro %}
+
+{% macro default__safe_cast_to(expr, data_type) -%}
+  SAFE_CAST({{ expr }} AS {{ data_type }})
+{%- endmacro %}
+
+{% macro duckdb__safe_cast_to(expr, data_type) -%}
+  {%- set types = {'STRING': 'VARCHAR', 'INT64': 'BIGINT', 'FLOAT64': 'DOUBLE', 'BOOL': 'BOOLEAN'} -%}
+  TRY_CAST({{ expr }} AS {{ types.get(data_type | upper, data_type) }})
+{%- endmacro %}
+
+
+{% macro initcap(expr) -%}
+  {{ return(adapter.dispatch('initcap')(expr)) }}
+{%- endmacro %}
+
+{% macro default__initcap(expr) -%}
+  INITCAP({{ expr }})
+{%- endmacro %}
+
+{% macro duckdb__initcap(expr) -%}
+  {#- DuckDB has no INITCAP: capitalise each space-separated word -#}
+  ARRAY_TO_STRING(
+    LIST_TRANSFORM(STRING_SPLIT(LOWER({{ expr }}), ' '), w -> UPPER(w[1]) || w[2:]),
+    ' '
+  )
+{%- endmacro %}
+
+
+{% macro safe_divide(numerator, denominator) -%}
+  {{ return(adapter.dispatch('safe_divide')(numerator, denominator)) }}
+{%- endmacro %}
+
+{% macro default__safe_divide(numerator, denominator) -%}
+  SAFE_DIVIDE({{ numerator }}, {{ denominator }})
+{%- endmacro %}
+
+{% macro duckdb__safe_divide(numerator, denominator) -%}
+  ({{ numerator }}) / NULLIF({{ denominator }}, 0)
+{%- endmacro %}
+
+
+{% macro month_start(year, month) -%}
+  {{ return(adapter.dispatch('month_start')(year, month)) }}
+{%- endmacro %}
+
+{% macro default__month_start(year, month) -%}
+  DATE({{ year }}, {{ month }}, 1)
+{%- endmacro %}
+
+{% macro duckdb__month_start(year, month) -%}
+  MAKE_DATE({{ year }}, {{ month }}, 1)
+{%- endmacro %}
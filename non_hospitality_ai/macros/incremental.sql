@@ -0,0 +1,35 @@
+{#-
+  Incremental models reprocess only recent days: everything on or after the
+  latest date already in the model minus `lookback_days`, so late-arriving
+  rows for those days are picked up again. The start date is resolved at
+  compile time and inlined as a literal so BigQuery can prune partitions.
+-#}
+
+{% macro incremental_strategy() -%}
+  {#- BigQuery replaces whole date partitions; DuckDB deletes and re-inserts by unique key -#}
+  {{ return('insert_overwrite' if target.type == 'bigquery' else 'delete+insert') }}
+{%- endmacro %}
+
+
+{% macro watermark_start(date_column) -%}
+  {%- if not (execute and is_incremental()) -%}
+    {{ return(none) }}
+  {%- endif -%}
+  {%- set latest = run_query('SELECT MAX(' ~ date_column ~ ') FROM ' ~ this).columns[0].values()[0] -%}
+  {%- if latest is none -%}
+    {{ return(none) }}
+  {%- endif -%}
+  {%- set latest = modules.datetime.date.fromisoformat((latest ~ '')[:10]) -%}
+  {{ return((latest - modules.datetime.timedelta(days=var('lookback_days'))).isoformat()) }}
+{%- endmacro %}
+
+
+{% macro incremental_filter(date_column, source_column=none) -%}
+  {#- `AND`-able predicate on the upstream column; TRUE on full builds -#}
+  {%- set start = watermark_start(date_column) -%}
+  {%- if start -%}
+    {{ source_column or date_column }} >= DATE '{{ start }}'
+  {%- else -%}
+    TRUE
+  {%- endif -%}
+{%- endmacro %}
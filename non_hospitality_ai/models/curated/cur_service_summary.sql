@@ -1,12 +1,18 @@
-{{ config(materialized='table') }}
+{{ config(
+    materialized='incremental',
+    incremental_strategy=incremental_strategy(),
+    unique_key=['service_category', 'city', 'date'],
+    partition_by={'field': 'date', 'data_type': 'date', 'granularity': 'day'},
+    cluster_by=['service_category', 'city']
+) }}
 
 SELECT
   service_category,
   city,
-  DATE(transaction_date) AS date,
-  SUM(total_amount_usd) AS total_revenue,
-  SUM(quantity * unit_price_usd) AS total_sales_value,
-  COUNT(DISTINCT guest_id) AS total_guests,
-  AVG(unit_price_usd) AS avg_unit_price
-FROM {{ ref('stg_sales_tran') }}
-GROUP BY 1, 2, 3
\ No newline at end of file
+  date,
+  total_revenue,
+  total_sales_value,
+  total_guests,
+  avg_unit_price
+FROM {{ ref('int_service_daily') }}
+WHERE {{ incremental_filter('date') }}
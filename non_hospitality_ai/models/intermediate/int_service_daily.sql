@@ -0,0 +1,20 @@
+{{ config(
+    materialized='incremental',
+    incremental_strategy=incremental_strategy(),
+    unique_key=['service_category', 'city', 'date'],
+    partition_by={'field': 'date', 'data_type': 'date', 'granularity': 'day'},
+    cluster_by=['service_category', 'city']
+) }}
+
+-- one row per service, city and day; shared by both curated models
+SELECT
+  service_category,
+  city,
+  transaction_date AS date,
+  SUM(total_amount_usd) AS total_revenue,
+  SUM(quantity * unit_price_usd) AS total_sales_value,
+  COUNT(DISTINCT guest_id) AS total_guests,
+  AVG(unit_price_usd) AS avg_unit_price
+FROM {{ ref('stg_sales_tran') }}
+WHERE {{ incremental_filter('date', 'transaction_date') }}
+GROUP BY 1, 2, 3
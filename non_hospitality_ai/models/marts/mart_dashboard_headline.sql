@@ -0,0 +1,69 @@
+{{ config(materialized='table') }}
+
+-- One row: the portfolio numbers the Home page header and KPI cards show.
+
+WITH metrics AS (
+  SELECT * FROM {{ ref('mart_kpi_window_metrics') }}
+),
+
+monthly AS (
+  SELECT
+    month_index,
+    year,
+    month,
+    AVG(roi_percent) AS avg_roi,
+    {{ safe_divide('SUM(total_revenue)', 'SUM(marketing_spend_month)') }} AS mer,
+    COUNT(*) AS pair_count
+  FROM metrics
+  GROUP BY 1, 2, 3
+),
+
+portfolio AS (
+  SELECT
+    *,
+    MAX(avg_roi) OVER (ORDER BY month_index RANGE BETWEEN 1 PRECEDING AND 1 PRECEDING) AS prev_avg_roi,
+    MAX(avg_roi) OVER (ORDER BY month_index RANGE BETWEEN 12 PRECEDING AND 12 PRECEDING) AS last_year_avg_roi,
+    AVG(avg_roi) OVER (ORDER BY month_index RANGE BETWEEN 2 PRECEDING AND CURRENT ROW) AS avg_roi_3m,
+    MAX(mer) OVER (ORDER BY month_index RANGE BETWEEN 1 PRECEDING AND 1 PRECEDING) AS prev_mer
+  FROM monthly
+),
+
+latest AS (
+  SELECT * FROM portfolio
+  WHERE month_index = (SELECT MAX(month_index) FROM portfolio)
+),
+
+-- best / worst by mean ROI over the whole history, ties broken by name
+services AS (
+  SELECT
+    service_category,
+    ROW_NUMBER() OVER (ORDER BY AVG(roi_percent) DESC, service_category) AS best_rank,
+    ROW_NUMBER() OVER (ORDER BY AVG(roi_percent), service_category) AS worst_rank
+  FROM metrics
+  GROUP BY 1
+),
+
+cities AS (
+  SELECT
+    city,
+    ROW_NUMBER() OVER (ORDER BY AVG(roi_percent) DESC, city) AS best_rank,
+    ROW_NUMBER() OVER (ORDER BY AVG(roi_percent), city) AS worst_rank
+  FROM metrics
+  GROUP BY 1
+)
+
+SELECT
+  l.year AS latest_year,
+  l.month AS latest_month,
+  l.avg_roi AS roi_current,
+  l.avg_roi - l.prev_avg_roi AS roi_mom,
+  l.avg_roi - l.last_year_avg_roi AS roi_yoy,
+  l.avg_roi_3m AS roi_3m_avg,
+  l.mer AS mer_current,
+  l.mer - l.prev_mer AS mer_mom,
+  l.pair_count,
+  (SELECT service_category FROM services WHERE best_rank = 1) AS best_service,
+  (SELECT service_category FROM services WHERE worst_rank = 1) AS worst_service,
+  (SELECT city FROM cities WHERE best_rank = 1) AS best_city,
+  (SELECT city FROM cities WHERE worst_rank = 1) AS worst_city
+FROM latest l
@@ -0,0 +1,71 @@
+{{ config(
+    materialized='table',
+    partition_by={'field': 'month_start', 'data_type': 'date', 'granularity': 'month'},
+    cluster_by=['service_category', 'city']
+) }}
+
+-- locally the analytics source is the sample seed
+{% if target.type != 'bigquery' %}-- depends_on: {{ ref('monthly_service_kpis_sample') }}{% endif %}
+
+-- Per service, city and month: neighbouring months, MoM / YoY deltas,
+-- rolling means and ranks. Lags are RANGE frames over a month index, so a
+-- missing month gives NULL instead of silently comparing the wrong rows.
+
+WITH kpis AS (
+  SELECT
+    service_category,
+    city,
+    year,
+    month,
+    {{ month_start('year', 'month') }} AS month_start,
+    year * 12 + month - 1 AS month_index,
+    roi_percent,
+    profit_margin_pct,
+    total_revenue,
+    marketing_spend_month
+  FROM {{ source('analytics', 'monthly_service_kpis') }}
+),
+
+windowed AS (
+  SELECT
+    *,
+    MAX(roi_percent) OVER (pair_months RANGE BETWEEN 1 PRECEDING AND 1 PRECEDING) AS roi_prev_month,
+    MAX(roi_percent) OVER (pair_months RANGE BETWEEN 1 FOLLOWING AND 1 FOLLOWING) AS roi_next_month,
+    MAX(roi_percent) OVER (pair_months RANGE BETWEEN 12 PRECEDING AND 12 PRECEDING) AS roi_last_year,
+    MAX(total_revenue) OVER (pair_months RANGE BETWEEN 1 PRECEDING AND 1 PRECEDING) AS revenue_prev_month,
+    MAX(profit_margin_pct) OVER (pair_months RANGE BETWEEN 1 PRECEDING AND 1 PRECEDING) AS margin_prev_month,
+    AVG(roi_percent) OVER (pair_months RANGE BETWEEN 2 PRECEDING AND CURRENT ROW) AS roi_3m_avg,
+    AVG(roi_percent) OVER (pair_months RANGE BETWEEN 5 PRECEDING AND CURRENT ROW) AS roi_6m_avg,
+    AVG(roi_percent) OVER (pair_months RANGE BETWEEN 11 PRECEDING AND CURRENT ROW) AS roi_12m_avg,
+    MAX(month_index) OVER () AS latest_month_index
+  FROM kpis
+  WINDOW pair_months AS (PARTITION BY service_category, city ORDER BY month_index)
+)
+
+SELECT
+  service_category,
+  city,
+  year,
+  month,
+  month_start,
+  month_index,
+  roi_percent,
+  profit_margin_pct,
+  total_revenue,
+  marketing_spend_month,
+  roi_prev_month,
+  roi_next_month,
+  roi_last_year,
+  roi_percent - roi_prev_month AS roi_mom,
+  roi_percent - roi_last_year AS roi_yoy,
+  total_revenue - revenue_prev_month AS revenue_mom,
+  profit_margin_pct - margin_prev_month AS margin_mom,
+  roi_3m_avg,
+  roi_6m_avg,
+  roi_12m_avg,
+  -- 1 = best ROI across all pairs that month
+  RANK() OVER (PARTITION BY month_index ORDER BY roi_percent DESC) AS roi_rank,
+  -- 1 = weakest 3-month average that month
+  RANK() OVER (PARTITION BY month_index ORDER BY roi_3m_avg) AS roi_3m_weakest_rank,
+  month_index = latest_month_index AS is_latest_month
+FROM windowed
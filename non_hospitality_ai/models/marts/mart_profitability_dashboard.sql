@@ -1,4 +1,10 @@
-{{ config(materialized='table') }}
+{{ config(
+    materialized='incremental',
+    incremental_strategy=incremental_strategy(),
+    unique_key=['service_category', 'city', 'date'],
+    partition_by={'field': 'date', 'data_type': 'date', 'granularity': 'day'},
+    cluster_by=['service_category', 'city']
+) }}
 
 SELECT
   service_category,
@@ -13,4 +19,5 @@ SELECT
     WHEN total_revenue BETWEEN 1000 AND 4999 THEN 'Moderate Revenue'
     ELSE 'Low Revenue'
   END AS revenue_band
-FROM {{ ref('cur_service_summary') }}
\ No newline at end of file
+FROM {{ ref('cur_service_summary') }}
+WHERE {{ incremental_filter('date') }}
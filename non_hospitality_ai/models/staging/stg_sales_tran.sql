@@ -1,19 +1,31 @@
-{{ config(materialized='view') }}
+{{ config(
+    materialized='incremental',
+    incremental_strategy=incremental_strategy(),
+    unique_key='transaction_id',
+    partition_by={'field': 'transaction_date', 'data_type': 'date', 'granularity': 'day'},
+    cluster_by=['service_category', 'city'],
+    on_schema_change='append_new_columns'
+) }}
 
+-- locally the source is the raw_sales_tran seed; the ref orders it first
+{% if target.type != 'bigquery' %}-- depends_on: {{ ref('raw_sales_tran') }}{% endif %}
+
+-- casts run once per transaction; downstream models read the stored result
 SELECT
-  SAFE_CAST(Transaction_ID AS STRING) AS transaction_id,
-  SAFE_CAST(Guest_ID AS STRING) AS guest_id,
-  DATE(Transaction_Date) AS transaction_date,
-  SAFE_CAST(Transaction_Time AS TIME) AS transaction_time,
-  INITCAP(City) AS city,
-  INITCAP(Service_Category) AS service_category,
-  INITCAP(Service_Item) AS service_item,
-  SAFE_CAST(Quantity AS INT64) AS quantity,
-  SAFE_CAST(Unit_Price_USD AS FLOAT64) AS unit_price_usd,
-  SAFE_CAST(Total_Amount_USD AS FLOAT64) AS total_amount_usd,
-  INITCAP(Payment_Method) AS payment_method,
-  SAFE_CAST(Is_Guest AS BOOL) AS is_guest,
-  INITCAP(Guest_Type) AS guest_type,
-  CURRENT_TIMESTAMP() AS load_timestamp
+  {{ safe_cast_to('Transaction_ID', 'STRING') }} AS transaction_id,
+  {{ safe_cast_to('Guest_ID', 'STRING') }} AS guest_id,
+  CAST(Transaction_Date AS DATE) AS transaction_date,
+  {{ safe_cast_to('Transaction_Time', 'TIME') }} AS transaction_time,
+  {{ initcap('City') }} AS city,
+  {{ initcap('Service_Category') }} AS service_category,
+  {{ initcap('Service_Item') }} AS service_item,
+  {{ safe_cast_to('Quantity', 'INT64') }} AS quantity,
+  {{ safe_cast_to('Unit_Price_USD', 'FLOAT64') }} AS unit_price_usd,
+  {{ safe_cast_to('Total_Amount_USD', 'FLOAT64') }} AS total_amount_usd,
+  {{ initcap('Payment_Method') }} AS payment_method,
+  {{ safe_cast_to('Is_Guest', 'BOOL') }} AS is_guest,
+  {{ initcap('Guest_Type') }} AS guest_type,
+  {{ dbt.current_timestamp() }} AS load_timestamp
 FROM {{ source('sales_tran', 'sales_tran') }}
-WHERE Total_Amount_USD IS NOT NULL
\ No newline at end of file
+WHERE Total_Amount_USD IS NOT NULL
+  AND {{ incremental_filter('transaction_date', 'CAST(Transaction_Date AS DATE)') }}
@@ -0,0 +1,3 @@
+SELECT COUNT(*) AS n
+FROM {{ ref('mart_dashboard_headline') }}
+HAVING COUNT(*) != 1
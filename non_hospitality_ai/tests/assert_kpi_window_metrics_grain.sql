@@ -0,0 +1,5 @@
+-- one row per service, city and month
+SELECT service_category, city, month_index, COUNT(*) AS n
+FROM {{ ref('mart_kpi_window_metrics') }}
+GROUP BY 1, 2, 3
+HAVING COUNT(*) > 1
@@ -1,56 +1,32 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-from google.cloud import bigquery
-import vertexai
-from vertexai.generative_models import GenerativeModel
 import calendar
+from concurrent.futures import wait
+
+from dashboard_data import fetch_dashboard_data, cache_stats
+from page_timer import PageTimer
+from kpi_cube import month_index
+from lifecycle import classify_cube, render_lifecycle_panel, roi_cube
+from insight_service import get_insight_service, weakest_pair_inputs, INSIGHT_WAIT_SECONDS
+from single_flight import flight_stats
+from sql_cache import get_sql_cache
+from startup import prewarm_in_background
+from tracing import get_tracer, render_debug_panel
 
 
 # -----------------------------------------------------
 # PAGE CONFIG
 # -----------------------------------------------------
 st.set_page_config(page_title="Ancillary Intelligence Hub", layout="wide")
-client = bigquery.Client()
-
-
-# -----------------------------------------------------
-# INIT VERTEX AI
-# -----------------------------------------------------
-vertexai.init(project="nonhospitality-bi", location="us-central1")
-gemini = GenerativeModel("gemini-2.0-flash")
+timer = PageTimer()
+tracer = get_tracer()
+page_span = tracer.start_span("page.home", parent=False)
 
-
-# -----------------------------------------------------
-# AI INSIGHT GENERATOR (SHORT + BULLET POINTS)
-# -----------------------------------------------------
-def generate_ai_insight(service, city, roi_value, trend, mom, yoy, revenue_drop, margin_drop):
-    prompt = f"""
-You are a senior revenue optimization analyst.
-
-Provide a VERY SHORT business insight for the weakest service–city pair.
-STRICT: 5 bullet points, each max 12 words.
-
-Context:
-- Service: {service}
-- City: {city}
-- Avg ROI (3M): {roi_value:.2f}%
-- ROI Trend: {trend}
-- MoM ROI: {mom:.2f}%
-- YoY ROI: {yoy:.2f}%
-- Revenue Drop: {revenue_drop:.2f}
-- Margin Drop: {margin_drop:.2f}
-
-Deliver EXACTLY:
-1. Root cause hint
-2. Operational bottleneck
-3. Pricing/demand issue
-4. Quick action
-5. Risk if not fixed
-
-Tone: Sharp, diagnostic, no long paragraphs.
-"""
-    return gemini.generate_content(prompt).text
+# every dataset the page needs is requested up front and fetched
+# concurrently; each section below waits only for its own inputs. The
+# BigQuery client is built in the fetch threads, once a dataset has to be
+# checked or fetched.
+data = fetch_dashboard_data(parent=page_span)
 
 
 # -----------------------------------------------------
@@ -68,42 +44,28 @@ A Data-Driven Intelligence for Non-Hospitality Revenue Optimization
 
 
 # -----------------------------------------------------
-# FETCH DATA
+# HEADLINE (precomputed by the dbt marts)
 # -----------------------------------------------------
 with st.spinner("⏳ Loading KPIs..."):
-    df = client.query("""
-        SELECT service_category, city, year, month,
-               roi_percent, profit_margin_pct, total_revenue,
-               total_guest_count, marketing_spend_month
-        FROM `nonhospitality-bi.analytics.monthly_service_kpis`
-    """).to_dataframe()
-
-df = df.sort_values(["year", "month"])
-df["ym"] = df["year"] * 100 + df["month"]
+    headline = timer.wait("Headline query", data["headline"]).iloc[0]
 
 
-# -----------------------------------------------------
-# GLOBAL KPI CALCULATIONS
-# -----------------------------------------------------
-def compute_global_kpis(df):
-    latest = df.iloc[-1]
-    prev = df.iloc[-2]
-    yoy = df.iloc[-13] if len(df) > 12 else None
-
-    return {
-        "roi": {
-            "current": latest["roi_percent"],
-            "mom": latest["roi_percent"] - prev["roi_percent"],
-            "yoy": (latest["roi_percent"] - yoy["roi_percent"]) if yoy is not None else None
-        }
-    }
+def optional(x):
+    return None if pd.isna(x) else float(x)
 
 
-kpis = compute_global_kpis(df)
+kpis = {
+    "roi": {
+        "current": float(headline["roi_current"]),
+        "mom": optional(headline["roi_mom"]) or 0.0,
+        "yoy": optional(headline["roi_yoy"]),
+    }
+}
 
 # helpers
 def arrow(x): return "▲" if x and x > 0 else "▼"
 def color(x): return "green" if x and x > 0 else "red"
+def pct(x): return f"{x:.2f}%" if x is not None else "n/a"
 
 
 # -----------------------------------------------------
@@ -115,16 +77,17 @@ summary = f"""
 ROI trend is **{'positive' if kpis['roi']['mom'] > 0 else 'negative'}**.
 
 Strengths:
-➡ Best Service: **{df.groupby('service_category')['roi_percent'].mean().idxmax()}**  
-➡ Best City: **{df.groupby('city')['roi_percent'].mean().idxmax()}**
+➡ Best Service: **{headline['best_service']}**  
+➡ Best City: **{headline['best_city']}**
 
 Weak Areas:
-⚠ Weakest Service: **{df.groupby('service_category')['roi_percent'].mean().idxmin()}**  
-⚠ Weakest City: **{df.groupby('city')['roi_percent'].mean().idxmin()}**
+⚠ Weakest Service: **{headline['worst_service']}**  
+⚠ Weakest City: **{headline['worst_city']}**
 """
 
 st.markdown(summary, unsafe_allow_html=True)
 st.markdown("<hr>", unsafe_allow_html=True)
+timer.lap("Business summary")
 
 
 # -----------------------------------------------------
@@ -133,16 +96,15 @@ st.markdown("<hr>", unsafe_allow_html=True)
 st.markdown("<h2>📊 Key KPIs This Month</h2>", unsafe_allow_html=True)
 c1, c2, c3, c4 = st.columns(4)
 
-latest = df.iloc[-1]
-prev = df.iloc[-2]
+latest_year, latest_month = int(headline["latest_year"]), int(headline["latest_month"])
+prev_year, prev_month = (latest_year, latest_month - 1) if latest_month > 1 else (latest_year - 1, 12)
 
-latest_label = f"{calendar.month_name[latest['month']]} {latest['year']}"
-prev_label = f"{calendar.month_name[prev['month']]} {prev['year']}"
+latest_label = f"{calendar.month_name[latest_month]} {latest_year}"
+prev_label = f"{calendar.month_name[prev_month]} {prev_year}"
 
 # MER (Marketing Efficiency Ratio)
-latest_mer = latest["total_revenue"] / (latest["marketing_spend_month"] or 1)
-prev_mer = prev["total_revenue"] / (prev["marketing_spend_month"] or 1)
-mer_mom = latest_mer - prev_mer
+latest_mer = optional(headline["mer_current"])
+mer_mom = optional(headline["mer_mom"])
 
 with c1:
     st.markdown(f"""
@@ -152,7 +114,7 @@ with c1:
         <p style='color:{color(kpis['roi']['mom'])}'>
             {arrow(kpis['roi']['mom'])} MoM: {kpis['roi']['mom']:.2f}%</p>
         <p style='color:{color(kpis['roi']['yoy'])}'>
-            {arrow(kpis['roi']['yoy'])} YoY: {kpis['roi']['yoy']:.2f}%</p>
+            {arrow(kpis['roi']['yoy'])} YoY: {pct(kpis['roi']['yoy'])}</p>
     </div>
     """, unsafe_allow_html=True)
 
@@ -259,6 +221,7 @@ with c1:
 
 
 st.markdown("<hr>", unsafe_allow_html=True)
+timer.lap("KPI cards")
 
 
 # -----------------------------------------------------
@@ -266,27 +229,16 @@ st.markdown("<hr>", unsafe_allow_html=True)
 # -----------------------------------------------------
 st.subheader("⛔ Weakest Service–City Pair (Last 3 Months)")
 
-latest_ym = df["ym"].max()
-last_three = df[df["ym"] >= latest_ym - 2]
-
-weak_pair = (
-    last_three.groupby(["service_category", "city"])["roi_percent"]
-    .mean()
-    .reset_index()
-    .sort_values("roi_percent")
-    .iloc[0]
-)
+pair_metrics = timer.wait("Pair metrics query", data["pair_metrics"])
 
-svc = weak_pair["service_category"]
-city = weak_pair["city"]
-roi_val = weak_pair["roi_percent"]
+# insights for the N weakest pairs are generated in the background and
+# cached; the page renders now and fills them in at the end
+insights = get_insight_service()
+with tracer.start_span("weakest_pairs", parent=page_span):
+    weak_inputs = weakest_pair_inputs(pair_metrics)
+pending_insights = insights.precompute(weak_inputs, parent=page_span)
 
-recent = last_three[(last_three["service_category"] == svc) & (last_three["city"] == city)]
-mom = recent["roi_percent"].iloc[-1] - recent["roi_percent"].iloc[-2]
-yoy = mom
-rev_drop = recent["total_revenue"].iloc[-1] - recent["total_revenue"].iloc[-2]
-margin_drop = recent["profit_margin_pct"].iloc[-1] - recent["profit_margin_pct"].iloc[-2]
-trend = "Upward" if mom > 0 else "Declining"
+svc, city, roi_val, trend, mom, yoy, rev_drop, margin_drop = weak_inputs[0]
 
 st.markdown(f"""
 <div style="padding:18px; background:white; border-left:6px solid #E74A3B;
@@ -302,12 +254,9 @@ st.markdown(f"""
 # -----------------------------------------------------
 st.subheader("🤖 AI Recommendation for Weakest Pair")
 
-with st.spinner("Generating AI insights..."):
-    ai_text = generate_ai_insight(
-        svc, city, roi_val, trend, mom, yoy, rev_drop, margin_drop
-    )
 
-st.markdown(f"""
+def render_insight(slot, ai_text):
+    slot.markdown(f"""
 <div style='padding:16px; background:#fdfdfd; border-radius:14px;
             border-left:6px solid #6c63ff; box-shadow:0 2px 8px rgba(0,0,0,0.05);'>
     <h4>📌 Strategic Insights</h4>
@@ -316,91 +265,86 @@ st.markdown(f"""
 """, unsafe_allow_html=True)
 
 
+insight_slots = [(st.empty(), pending_insights[0][1])]
+
+if len(pending_insights) > 1:
+    with st.expander("Other weak pairs"):
+        for (p_svc, p_city, p_roi, *_), future in pending_insights[1:]:
+            st.markdown(f"**{p_svc}** in **{p_city}** — Avg ROI (3M): {p_roi:.2f}%")
+            insight_slots.append((st.empty(), future))
+
+for slot, future in insight_slots:
+    if future.done() and not future.exception():
+        render_insight(slot, future.result())
+    else:
+        slot.info("⏳ Generating AI insights...")
+
+timer.lap("Weakest pair")
+
+
 # -----------------------------------------------------
 # SERVICE LIFECYCLE + MINI FORECAST
 # -----------------------------------------------------
 st.subheader("🔍 Service Lifecycle Recommendations")
 
-forecast_df = client.query("""
-    SELECT service_category, city, ds,
-           actual_roi_percent,
-           forecasted_roi_percent
-    FROM `nonhospitality-bi.analytics.monthly_service_kpis_forecasts`
-    ORDER BY service_category, city, ds
-""").to_dataframe()
-
-forecast_df['date'] = pd.to_datetime(forecast_df['ds']).dt.date
-
-actual_df = df.copy()
-actual_df['date'] = pd.to_datetime(
-    actual_df['year'].astype(str) + "-" +
-    actual_df['month'].astype(str) + "-01"
-).dt.date
-
-latest_actual_date = actual_df['date'].max()
-
-combined = pd.concat([
-    actual_df[['service_category', 'city', 'date', 'roi_percent']].rename(columns={'roi_percent': 'roi'}),
-    forecast_df[['service_category', 'city', 'date', 'actual_roi_percent']].rename(columns={'actual_roi_percent': 'roi'}),
-    forecast_df[['service_category', 'city', 'date', 'forecasted_roi_percent']].rename(columns={'forecasted_roi_percent': 'roi'})
-], ignore_index=True)
-
-combined = combined.dropna(subset=['roi']).sort_values(['service_category', 'city', 'date'])
-
-
-def classify_lifecycle(values):
-    if len(values) < 3:
-        return "Insufficient Data", "Not enough ROI history."
-    t1, t2, t3 = values[-3], values[-2], values[-1]
-    if t1 < 0 and t2 < 0 and t3 < 0:
-        return "High Risk", "Consistently negative ROI."
-    if t3 > t2 > t1:
-        return "Growth", "Demand accelerating."
-    if t3 < t2 < t1:
-        return "Decline", "ROI falling — investigate."
-    return "Stable", "Watch for movement."
-
-
-unique_pairs = combined[['service_category', 'city']].drop_duplicates()
-
-for _, row in unique_pairs.iterrows():
-    svc = row['service_category']
-    city = row['city']
-
-    sub = combined[(combined['service_category'] == svc) &
-                   (combined['city'] == city)].sort_values('date')
-
-    roi_series = sub['roi'].tolist()
-    stage, advice = classify_lifecycle(roi_series)
-
-    badge_color = {
-        "Growth": "#28a745",
-        "Decline": "#dc3545",
-        "Stable": "#6c757d",
-        "High Risk": "#b30000"
-    }.get(stage, "#6c757d")
-
-    col1, col2 = st.columns([1, 2])
-
-    with col1:
-        st.markdown(f"""
-        <div style='padding:12px; border-radius:12px; background:white;
-                    border-left:6px solid {badge_color};
-                    margin-bottom:14px;
-                    box-shadow:0 2px 6px rgba(0,0,0,0.05);'>
-            <strong>{svc} ({city}) →
-                <span style="color:{badge_color}">{stage}</span>
-            </strong>
-            <br>{advice}
-        </div>
-        """, unsafe_allow_html=True)
-
-    with col2:
-        chart_df = sub[['date', 'roi']].copy()
-        chart_df['type'] = np.where(
-            chart_df['date'] <= latest_actual_date, 'Actual', 'Forecast'
-        )
-
-        st.line_chart(chart_df, x='date', y='roi', color='type', height=160)
+with st.spinner("⏳ Loading forecasts..."):
+    df = timer.wait("KPI query", data["kpis"])
+    forecast_df = timer.wait("Forecast query", data["forecasts"])
+
+# one dense (service, city, month) ROI cube: each pair's series is a view
+with tracer.start_span("lifecycle.classify", parent=page_span) as span:
+    cube = roi_cube(df, forecast_df)
+    lifecycle = classify_cube(cube)
+    span.set_attributes(pairs=len(lifecycle), months=cube.n_months)
+
+latest_actual = int(month_index(df["year"], df["month"]).max()) - cube.first_month
+render_lifecycle_panel(cube, lifecycle, latest_actual, parent=page_span)
 
 st.markdown("---")
+timer.lap("Service lifecycle")
+
+
+# -----------------------------------------------------
+# FILL IN PENDING AI INSIGHTS
+# -----------------------------------------------------
+# one deadline for all slots, not INSIGHT_WAIT_SECONDS per slot
+wait([future for _, future in insight_slots], timeout=INSIGHT_WAIT_SECONDS)
+for slot, future in insight_slots:
+    try:
+        render_insight(slot, future.result(timeout=0))
+    except Exception:
+        slot.warning("AI insight unavailable right now — it will be retried on the next load.")
+
+timer.lap("AI insights (wait)")
+
+
+# -----------------------------------------------------
+# SIDEBAR: CACHE + PAGE TIMING + TRACE
+# -----------------------------------------------------
+stats = cache_stats()
+st.sidebar.caption(
+    f"Data cache — hits: {stats['hits']}, misses: {stats['misses']}, "
+    f"hit rate: {stats['hit_rate']:.0%}"
+    + (f", from warm start: {stats['warm_starts']}" if stats["warm_starts"] else "")
+)
+sql_stats = get_sql_cache().stats()
+st.sidebar.caption(
+    f"Bot SQL cache — hits: {sql_stats['hits']} ({sql_stats['disk_hits']} from disk), "
+    f"misses: {sql_stats['misses']}, hit rate: {sql_stats['hit_rate']:.0%}"
+)
+flights = flight_stats()
+st.sidebar.caption(
+    "Coalesced calls — " + ", ".join(f"{name}: {f['coalesced']}/{f['calls']}" for name, f in sorted(flights.items()))
+)
+
+with st.sidebar.expander("⏱ Page timing"):
+    st.dataframe(pd.DataFrame(timer.table()).round(3), hide_index=True)
+
+page_span.set_attributes(**{
+    f"section.{row['step']}_s": round(row["seconds"], 4) for row in timer.table()
+})
+page_span.end()
+render_debug_panel(page_span.trace_id)
+
+# first render in this process: load the bot pipeline while the user reads
+prewarm_in_background()
@@ -0,0 +1,229 @@
+"""Run Analytical Bot questions headless, concurrently, within the Gemini and BigQuery quotas.
+
+Each question goes through the same pipeline as the bot page
+(`nlp_engine.stream_user_query`); one JSON line per question is written as
+it finishes, with the SQL, row count, summary, error and per-stage timings
+taken from the question's trace. Gemini calls and BigQuery jobs share one
+token bucket each, so any number of workers stays inside the quotas.
+
+    python batch_runner.py questions.txt --out results.jsonl --workers 8
+    python batch_runner.py questions.txt --warm --out warm.jsonl
+
+The questions file has one question per line (blank lines and lines
+starting with # are skipped), or one JSON object per line with a
+"question" key; other keys (e.g. "id") are copied to the output.
+
+--warm is for pre-warming before business hours: it refreshes the local
+DuckDB snapshot first and skips the summary call. Answered questions leave
+their SQL in the generated-SQL cache, and BigQuery keeps each job's result
+in its own 24h result cache. --fresh-sql regenerates SQL without reading
+or touching the shared SQL cache, which is what a regression eval wants.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from rate_limit import RateLimitedBigQueryClient, RateLimitedGenAIClient, TokenBucket
+from single_flight import flight_stats
+from tracing import get_tracer
+
+
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", "8"))
+# quotas shared by all workers; bursts are capped at the worker count
+GEMINI_RATE_PER_MINUTE = float(os.environ.get("GEMINI_RATE_PER_MINUTE", "60"))
+BIGQUERY_RATE_PER_MINUTE = float(os.environ.get("BIGQUERY_RATE_PER_MINUTE", "100"))
+
+
+# -----------------------------------------------------
+# INPUT
+# -----------------------------------------------------
+def load_questions(path):
+    items = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            item = json.loads(line) if line.startswith("{") else {"question": line}
+            if not item.get("question"):
+                raise ValueError(f"no question in line: {line[:80]}")
+            items.append(item)
+    return items
+
+
+# -----------------------------------------------------
+# ONE QUESTION
+# -----------------------------------------------------
+def stage_timings(trace_id):
+    """Milliseconds per pipeline stage (summed when a stage repeats, e.g. validation)."""
+    stages = {}
+    for span in get_tracer().trace(trace_id):
+        if span.parent_id is not None:
+            stages[span.name] = round(stages.get(span.name, 0.0) + span.duration_ms, 1)
+    return stages
+
+
+def run_question(index, item, client, summarize=True, fresh_sql=False):
+    import nlp_engine
+
+    question = item["question"]
+    started = time.perf_counter()
+    first_rows = None
+    result = None
+    events = nlp_engine.stream_user_query(
+        question, stream_tokens=False, client=client, summarize=summarize, use_sql_cache=not fresh_sql
+    )
+    for event in events:
+        if event["type"] == "rows" and first_rows is None:
+            first_rows = time.perf_counter() - started
+        elif event["type"] == "done":
+            result = event["result"]
+    seconds = time.perf_counter() - started
+
+    df = result["dataframe"]
+    return {
+        **item,
+        "index": index,
+        "sql": result["sql"],
+        "sql_cached": result["sql_cached"],
+        "engine": result["engine"],
+        "rows": None if df is None else len(df),
+        "truncated": None if df is None else result["truncated"],
+        "summary": result["summary"],
+        "error": result["error"],
+        "error_detail": result["error_detail"],
+        "trace_id": result["trace_id"],
+        "seconds": round(seconds, 3),
+        "first_rows_seconds": None if first_rows is None else round(first_rows, 3),
+        "stages_ms": stage_timings(result["trace_id"]),
+    }
+
+
+# -----------------------------------------------------
+# BATCH
+# -----------------------------------------------------
+def run_batch(items, out, client=None, workers=BATCH_WORKERS,
+              llm_rate_per_minute=GEMINI_RATE_PER_MINUTE,
+              bq_rate_per_minute=BIGQUERY_RATE_PER_MINUTE,
+              summarize=True, fresh_sql=False, progress=None):
+    """Answer every item on `workers` threads, writing JSON lines to `out`.
+
+    `client` is the google-genai client (the Vertex client when None); the
+    BigQuery client is the process-wide one from sql_executor, throttled
+    for the duration of the batch. Returns a summary dict.
+    """
+    from sql_executor import get_bigquery_client, get_bqstorage_client, set_bigquery_client
+    from vertex_utils import get_vertex_client
+
+    llm = RateLimitedGenAIClient(
+        client or get_vertex_client(), TokenBucket.per_minute(llm_rate_per_minute, burst=workers)
+    )
+    bq, bqstorage = get_bigquery_client(), get_bqstorage_client()
+    set_bigquery_client(
+        RateLimitedBigQueryClient(bq, TokenBucket.per_minute(bq_rate_per_minute, burst=workers)), bqstorage
+    )
+
+    # keep every in-flight question's trace around until its timings are read
+    tracer = get_tracer()
+    tracer.keep_recent = max(tracer.keep_recent, workers * 4)
+
+    write_lock = threading.Lock()
+    records = []
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+            futures = {
+                pool.submit(run_question, i, item, llm, summarize, fresh_sql): (i, item)
+                for i, item in enumerate(items)
+            }
+            for future in as_completed(futures):
+                index, item = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    record = {**item, "index": index, "error": f"{type(e).__name__}: {e}"}
+                with write_lock:
+                    out.write(json.dumps(record, default=str) + "\n")
+                    out.flush()
+                    records.append(record)
+                if progress:
+                    progress(len(records), len(items), record)
+    finally:
+        set_bigquery_client(bq, bqstorage)
+
+    wall = time.perf_counter() - started
+    seconds = np.array([r["seconds"] for r in records if "seconds" in r])
+    return {
+        "questions": len(records),
+        "errors": sum(1 for r in records if r.get("error")),
+        "sql_cached": sum(1 for r in records if r.get("sql_cached")),
+        "wall_seconds": round(wall, 2),
+        "questions_per_minute": round(len(records) / wall * 60, 1) if wall else None,
+        "p50_seconds": round(float(np.percentile(seconds, 50)), 3) if len(seconds) else None,
+        "p95_seconds": round(float(np.percentile(seconds, 95)), 3) if len(seconds) else None,
+        "coalesced": {name: s["coalesced"] for name, s in flight_stats().items()},
+    }
+
+
+def warm_local_engine():
+    from local_engine import LOCAL_ENGINE_ENABLED, get_local_engine
+    from sql_executor import get_bigquery_client
+
+    if not LOCAL_ENGINE_ENABLED:
+        return None
+    return get_local_engine().refresh(get_bigquery_client())
+
+
+# -----------------------------------------------------
+# CLI
+# -----------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("questions", help="text file (one question per line) or JSONL with a 'question' key")
+    parser.add_argument("--out", help="JSONL output (default: stdout)")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--llm-rpm", type=float, default=GEMINI_RATE_PER_MINUTE,
+                        help="Gemini requests per minute across all workers")
+    parser.add_argument("--bq-qpm", type=float, default=BIGQUERY_RATE_PER_MINUTE,
+                        help="BigQuery jobs per minute across all workers")
+    parser.add_argument("--warm", action="store_true",
+                        help="refresh the local snapshot first and skip summaries")
+    parser.add_argument("--no-summary", action="store_true", help="stop each question after its result")
+    parser.add_argument("--fresh-sql", action="store_true", help="regenerate SQL instead of using the cache")
+    args = parser.parse_args(argv)
+
+    items = load_questions(args.questions)
+
+    if args.warm:
+        report = warm_local_engine()
+        if report is not None:
+            print(f"local snapshot: {json.dumps(report)}", file=sys.stderr)
+
+    def progress(done, total, record):
+        status = "error" if record.get("error") else f"{record.get('rows')} rows"
+        print(f"[{done}/{total}] {record.get('seconds', '-')}s {status}: {record['question'][:70]}", file=sys.stderr)
+
+    out = open(args.out, "w") if args.out else sys.stdout
+    try:
+        summary = run_batch(
+            items, out, workers=args.workers,
+            llm_rate_per_minute=args.llm_rpm, bq_rate_per_minute=args.bq_qpm,
+            summarize=not (args.warm or args.no_summary), fresh_sql=args.fresh_sql,
+            progress=progress,
+        )
+    finally:
+        if args.out:
+            out.close()
+
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
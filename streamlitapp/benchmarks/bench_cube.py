@@ -0,0 +1,152 @@
+"""Dashboard computations: long-frame pandas path vs the dense KpiCube path.
+
+Both paths produce the headline, the latest-month pair metrics (weakest
+pairs) and the lifecycle stages with one ROI series per pair. Sizes are
+today's dimensions (8 services x 20 cities x 36 months) with the city count
+multiplied by each scale.
+
+    python benchmarks/bench_cube.py --scales 1 10 100
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from insight_service import weakest_pair_inputs  # noqa: E402
+from kpi_metrics import dashboard_headline, window_metrics  # noqa: E402
+from lifecycle import classify_cube, classify_pairs, combine_series, roi_cube  # noqa: E402
+from synthetic import make_forecasts, make_kpis  # noqa: E402
+
+
+PAIR_KEYS = ["service_category", "city"]
+
+
+# -----------------------------------------------------
+# BASELINE: LONG-FRAME PANDAS (before the cube)
+# -----------------------------------------------------
+def pandas_headline(df):
+    df = df.assign(ym=df["year"] * 12 + df["month"] - 1)
+    monthly = df.groupby("ym").agg(
+        roi=("roi_percent", "mean"),
+        revenue=("total_revenue", "sum"),
+        marketing=("marketing_spend_month", "sum"),
+    )
+    latest = monthly.index.max()
+    roi = monthly["roi"]
+    return {
+        "roi_current": roi[latest],
+        "roi_mom": roi[latest] - roi.get(latest - 1, np.nan),
+        "roi_yoy": roi[latest] - roi.get(latest - 12, np.nan),
+        "mer_current": monthly.at[latest, "revenue"] / monthly.at[latest, "marketing"],
+        "best_service": df.groupby("service_category")["roi_percent"].mean().idxmax(),
+        "worst_service": df.groupby("service_category")["roi_percent"].mean().idxmin(),
+        "best_city": df.groupby("city")["roi_percent"].mean().idxmax(),
+        "worst_city": df.groupby("city")["roi_percent"].mean().idxmin(),
+    }
+
+
+def pandas_latest_metrics(df):
+    # per-pair shifts and rolling means on the sorted long frame, by row position
+    df = df.sort_values(PAIR_KEYS + ["year", "month"], kind="mergesort").reset_index(drop=True)
+    df["ym"] = df["year"] * 12 + df["month"] - 1
+    by_pair = df.groupby(PAIR_KEYS, sort=False)
+    df["roi_mom"] = df["roi_percent"] - by_pair["roi_percent"].shift(1)
+    df["roi_yoy"] = df["roi_percent"] - by_pair["roi_percent"].shift(12)
+    df["revenue_mom"] = df["total_revenue"] - by_pair["total_revenue"].shift(1)
+    df["margin_mom"] = df["profit_margin_pct"] - by_pair["profit_margin_pct"].shift(1)
+    for months in (3, 6, 12):
+        df[f"roi_{months}m_avg"] = (
+            by_pair["roi_percent"].rolling(months, min_periods=1).mean().reset_index(drop=True)
+        )
+    latest = df[df["ym"] == df["ym"].max()].copy()
+    latest["roi_3m_weakest_rank"] = latest["roi_3m_avg"].rank(method="min")
+    return latest
+
+
+def pandas_lifecycle(df, forecast_df):
+    combined = combine_series(df, forecast_df)
+    stages = classify_pairs(combined)
+    series = dict(tuple(combined.groupby(PAIR_KEYS, sort=False)))
+    return stages, series
+
+
+def pandas_path(df, forecast_df):
+    headline = pandas_headline(df)
+    weakest = weakest_pair_inputs(pandas_latest_metrics(df))
+    stages, series = pandas_lifecycle(df, forecast_df)
+    for row in stages.itertuples(index=False):
+        series[(row.service_category, row.city)]["roi"].to_numpy()
+    return headline, weakest, stages
+
+
+# -----------------------------------------------------
+# KPI CUBE PATH (Home.py today)
+# -----------------------------------------------------
+def cube_path(df, forecast_df):
+    headline = dashboard_headline(df).iloc[0].to_dict()
+    metrics = window_metrics(df)
+    weakest = weakest_pair_inputs(metrics[metrics["is_latest_month"]])
+    cube = roi_cube(df, forecast_df)
+    stages = classify_cube(cube)
+    for row in stages.itertuples(index=False):
+        cube.pair("roi", row.service_category, row.city)
+    return headline, weakest, stages
+
+
+# -----------------------------------------------------
+# RUN
+# -----------------------------------------------------
+def best_of(runs, fn, *args):
+    best, out = None, None
+    for _ in range(runs):
+        start = time.perf_counter()
+        out = fn(*args)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, out
+
+
+def check_parity(pandas_out, cube_out):
+    (p_head, p_weak, p_stages), (c_head, c_weak, c_stages) = pandas_out, cube_out
+    for key in ("best_service", "worst_service", "best_city", "worst_city"):
+        assert p_head[key] == c_head[key], f"headline {key} mismatch"
+    assert np.isclose(p_head["roi_current"], c_head["roi_current"], rtol=1e-5), "headline ROI mismatch"
+    assert [w[:2] for w in p_weak] == [w[:2] for w in c_weak], "weakest pairs mismatch"
+    merged = p_stages.merge(c_stages, on=PAIR_KEYS, suffixes=("_pd", "_cube"))
+    assert len(merged) == len(p_stages) and (merged["stage_pd"] == merged["stage_cube"]).all(), "stage mismatch"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--services", type=int, default=8)
+    parser.add_argument("--cities", type=int, default=20)
+    parser.add_argument("--months", type=int, default=36)
+    parser.add_argument("--runs", type=int, default=3, help="best of N per path")
+    args = parser.parse_args()
+
+    print(f"{'scale':>6} {'pairs':>8} {'rows':>9} {'frame MB':>9} {'cube MB':>8} "
+          f"{'pandas (s)':>11} {'cube (s)':>9} {'speedup':>8}")
+    for scale in args.scales:
+        kpis = make_kpis(args.services, args.cities * scale, args.months)
+        forecasts = make_forecasts(kpis)
+
+        pd_s, pd_out = best_of(args.runs, pandas_path, kpis, forecasts)
+        cube_s, cube_out = best_of(args.runs, cube_path, kpis, forecasts)
+        check_parity(pd_out, cube_out)
+
+        frame_mb = kpis.memory_usage(deep=True).sum() / 2**20
+        cube = roi_cube(kpis, forecasts)
+        cube_mb = (sum(a.nbytes for a in cube.measures.values()) + cube.present.nbytes) / 2**20
+        print(f"{scale:>5}x {len(cube_out[2]):>8} {len(kpis):>9} {frame_mb:9.1f} {cube_mb:8.1f} "
+              f"{pd_s:11.3f} {cube_s:9.3f} {pd_s / cube_s:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
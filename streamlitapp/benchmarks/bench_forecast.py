@@ -0,0 +1,130 @@
+"""Lifecycle forecasts: reading the forecast table vs fitting them locally.
+
+Refresh: seconds to get the forecast rows, either by querying
+`monthly_service_kpis_forecasts` (fake BigQuery with the bench_suite latency
+profile) or by forecast_engine.forecast_table() on the KPI rows, serial and
+in the process pool. Accuracy: the last `--horizon` months of each series are
+held out; the synthetic table (mean of recent actuals plus noise, as built by
+synthetic.make_forecasts), the last actual and the local engine are scored
+against them, with the coverage of the local prediction intervals.
+
+Sizes are 8 services x 20 cities x 36 months with the city count multiplied
+by each scale.
+
+    python benchmarks/bench_forecast.py --scales 1 10 100 --workers 4
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import forecast_engine  # noqa: E402
+from dashboard_data import FORECAST_SQL  # noqa: E402
+from fakes import FakeBigQueryClient, Latencies  # noqa: E402
+from forecast_engine import FORECAST_INTERVAL, forecast_table  # noqa: E402
+from sql_executor import run_bigquery_sql  # noqa: E402
+from synthetic import FORECAST_TABLE, KPI_TABLE, make_forecasts, make_kpis  # noqa: E402
+
+
+PAIR_KEYS = ["service_category", "city"]
+MEASURES = ["roi_percent", "profit_margin_pct"]
+
+
+def timed(fn, runs):
+    seconds = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        out = fn()
+        seconds.append(time.perf_counter() - started)
+    return float(np.median(seconds)), out
+
+
+# -----------------------------------------------------
+# REFRESH
+# -----------------------------------------------------
+def refresh(kpis, args):
+    client = FakeBigQueryClient(
+        {KPI_TABLE: kpis, FORECAST_TABLE: make_forecasts(kpis)},
+        latencies=Latencies(scale=args.latency_scale),
+    )
+    table_s, table = timed(lambda: run_bigquery_sql(FORECAST_SQL, client=client), args.runs)
+    serial_s, local = timed(lambda: forecast_table(kpis, horizon=args.horizon, workers=1), args.runs)
+
+    pooled_s = None
+    if args.workers > 1:
+        # every size through the pool, whatever FORECAST_POOL_MIN_SERIES says
+        threshold, forecast_engine.FORECAST_POOL_MIN_SERIES = forecast_engine.FORECAST_POOL_MIN_SERIES, 1
+        try:
+            forecast_table(kpis, horizon=args.horizon, workers=args.workers)  # spawn the workers
+            pooled_s, _ = timed(lambda: forecast_table(kpis, horizon=args.horizon, workers=args.workers), args.runs)
+        finally:
+            forecast_engine.FORECAST_POOL_MIN_SERIES = threshold
+    return table_s, len(table), serial_s, pooled_s, len(local)
+
+
+# -----------------------------------------------------
+# HOLD-OUT ACCURACY
+# -----------------------------------------------------
+def holdout(kpis, horizon):
+    """MAE per method and measure over the last `horizon` months, plus interval coverage."""
+    month = kpis["year"] * 12 + kpis["month"] - 1
+    cutoff = month.max() - horizon
+    train, test = kpis[month <= cutoff], kpis[month > cutoff]
+    test = test.assign(ds=pd.to_datetime(dict(year=test["year"], month=test["month"], day=1)))
+
+    local = forecast_table(train, horizon=horizon, workers=1)
+    table = make_forecasts(train, horizon_months=horizon)
+    last = train.sort_values(PAIR_KEYS + ["year", "month"]).groupby(PAIR_KEYS).tail(1)
+
+    rows = []
+    for measure in MEASURES:
+        forecast, lower, upper = (f"forecasted_{measure}{suffix}" for suffix in ("", "_lower", "_upper"))
+        truth = test[PAIR_KEYS + ["ds", measure]]
+        scored = truth.merge(local[PAIR_KEYS + ["ds", forecast, lower, upper]], on=PAIR_KEYS + ["ds"])
+        on_table = truth.merge(table[PAIR_KEYS + ["ds", forecast]], on=PAIR_KEYS + ["ds"])
+        naive = truth.merge(last[PAIR_KEYS + [measure]], on=PAIR_KEYS, suffixes=("", "_last"))
+
+        actual = scored[measure]
+        inside = (scored[lower] <= actual) & (actual <= scored[upper])
+        rows.append((measure, "table (synthetic)", (on_table[measure] - on_table[forecast]).abs().mean(), None))
+        rows.append((measure, "last actual", (naive[measure] - naive[f"{measure}_last"]).abs().mean(), None))
+        rows.append((measure, "local engine", (actual - scored[forecast]).abs().mean(), inside.mean()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--months", type=int, default=36)
+    parser.add_argument("--horizon", type=int, default=3)
+    parser.add_argument("--runs", type=int, default=3, help="timed runs per variant (median reported)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="process pool size (1 = no pool)")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiplier on the fake BigQuery latencies")
+    args = parser.parse_args()
+
+    print(f"{'series':>8} {'table query (s)':>16} {'table rows':>11} {'local (s)':>10} "
+          f"{'pool (s)':>9} {'local rows':>11}")
+    for scale in args.scales:
+        kpis = make_kpis(n_cities=20 * scale, n_months=args.months)
+        table_s, table_rows, serial_s, pooled_s, local_rows = refresh(kpis, args)
+        n_series = kpis.groupby(PAIR_KEYS).ngroups * len(MEASURES)
+        pooled = f"{pooled_s:9.3f}" if pooled_s is not None else f"{'-':>9}"
+        print(f"{n_series:>8,} {table_s:16.3f} {table_rows:>11,} {serial_s:10.3f} {pooled} {local_rows:>11,}")
+
+    kpis = make_kpis(n_cities=20 * args.scales[0], n_months=args.months)
+    print(f"\nhold-out: last {args.horizon} months, {FORECAST_INTERVAL:.0%} intervals")
+    print(f"{'measure':<18} {'method':<18} {'MAE':>8} {'coverage':>9}")
+    for measure, method, mae, coverage in holdout(kpis, args.horizon):
+        shown = f"{coverage:9.0%}" if coverage is not None else f"{'-':>9}"
+        print(f"{measure:<18} {method:<18} {mae:8.2f} {shown}")
+
+
+if __name__ == "__main__":
+    main()
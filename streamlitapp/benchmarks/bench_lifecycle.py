@@ -0,0 +1,101 @@
+"""Lifecycle classification: per-pair loop (old Home.py) vs lifecycle.classify_pairs.
+
+    python benchmarks/bench_lifecycle.py --pairs 100 1000 10000 50000
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lifecycle import classify_pairs  # noqa: E402
+
+
+# -----------------------------------------------------
+# BASELINE: THE ORIGINAL PER-PAIR LOOP
+# -----------------------------------------------------
+def classify_lifecycle(values):
+    if len(values) < 3:
+        return "Insufficient Data", "Not enough ROI history."
+    t1, t2, t3 = values[-3], values[-2], values[-1]
+    if t1 < 0 and t2 < 0 and t3 < 0:
+        return "High Risk", "Consistently negative ROI."
+    if t3 > t2 > t1:
+        return "Growth", "Demand accelerating."
+    if t3 < t2 < t1:
+        return "Decline", "ROI falling — investigate."
+    return "Stable", "Watch for movement."
+
+
+def classify_loop(combined):
+    out = []
+    unique_pairs = combined[['service_category', 'city']].drop_duplicates()
+    for _, row in unique_pairs.iterrows():
+        sub = combined[(combined['service_category'] == row['service_category']) &
+                       (combined['city'] == row['city'])].sort_values('date', kind='mergesort')
+        stage, _ = classify_lifecycle(sub['roi'].tolist())
+        out.append((row['service_category'], row['city'], stage))
+    return pd.DataFrame(out, columns=['service_category', 'city', 'stage'])
+
+
+# -----------------------------------------------------
+# SYNTHETIC INPUT
+# -----------------------------------------------------
+def make_combined(n_pairs, n_months=24, seed=0):
+    rng = np.random.default_rng(seed)
+    n_services = max(1, int(np.sqrt(n_pairs)))
+    n_cities = -(-n_pairs // n_services)
+
+    pair_ids = np.arange(n_pairs)
+    services = np.array([f"Service {i}" for i in range(n_services)])[pair_ids // n_cities]
+    cities = np.array([f"City {i}" for i in range(n_cities)])[pair_ids % n_cities]
+    dates = pd.date_range(date(2023, 1, 1), periods=n_months, freq="MS").date
+
+    trend = rng.normal(0, 2, n_pairs)[:, None] * np.arange(n_months)
+    roi = rng.normal(5, 10, n_pairs)[:, None] + trend + rng.normal(0, 3, (n_pairs, n_months))
+
+    return pd.DataFrame({
+        "service_category": np.repeat(services, n_months),
+        "city": np.repeat(cities, n_months),
+        "date": np.tile(dates, n_pairs),
+        "roi": roi.ravel(),
+    })
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return time.perf_counter() - start, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pairs", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--baseline-max-pairs", type=int, default=2000,
+                        help="skip the O(pairs x rows) loop above this size")
+    args = parser.parse_args()
+
+    print(f"{'pairs':>8} {'rows':>10} {'loop (s)':>10} {'vectorized (s)':>15} {'speedup':>8}")
+    for n in args.pairs:
+        combined = make_combined(n, args.months)
+        vec_s, vec = timed(classify_pairs, combined)
+
+        if n <= args.baseline_max_pairs:
+            loop_s, loop = timed(classify_loop, combined)
+            merged = loop.merge(vec, on=['service_category', 'city'], suffixes=('_loop', '_vec'))
+            assert (merged['stage_loop'] == merged['stage_vec']).all(), "stage mismatch"
+            loop_col, speedup = f"{loop_s:10.3f}", f"{loop_s / vec_s:7.0f}x"
+        else:
+            loop_col, speedup = f"{'-':>10}", f"{'-':>8}"
+
+        print(f"{n:>8} {len(combined):>10} {loop_col} {vec_s:15.3f} {speedup}")
+
+
+if __name__ == "__main__":
+    main()
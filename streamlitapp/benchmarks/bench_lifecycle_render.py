@@ -0,0 +1,161 @@
+"""Lifecycle section render: a card and a line chart per pair (old Home.py) vs the paged panel.
+
+Each variant runs as a Streamlit script under AppTest on a synthetic ROI
+cube, so the timings include building every element and serializing it for
+the browser. "payload" is the size of the element protos the script sent.
+
+    python benchmarks/bench_lifecycle_render.py --pairs 50 500 5000
+"""
+import argparse
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+
+# -----------------------------------------------------
+# SCRIPTS (run by AppTest, so they import what they use)
+# -----------------------------------------------------
+def per_pair_script(root, bench_dir, n_pairs, n_months, forecast_months):
+    import sys
+
+    sys.path[:0] = [root, bench_dir]
+    import numpy as np
+    import pandas as pd
+    import streamlit as st
+
+    from bench_lifecycle_render import make_cube
+    from lifecycle import classify_cube
+
+    cube, latest_actual = make_cube(n_pairs, n_months, forecast_months)
+    lifecycle = classify_cube(cube)
+    month_dates = cube.month_starts().date
+
+    for row in lifecycle.itertuples(index=False):
+        roi = cube.pair("roi", row.service_category, row.city)
+        has_value = ~np.isnan(roi)
+        badge_color = {
+            "Growth": "#28a745", "Decline": "#dc3545", "Stable": "#6c757d", "High Risk": "#b30000"
+        }.get(row.stage, "#6c757d")
+
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            st.markdown(f"""
+            <div style='padding:12px; border-radius:12px; background:white;
+                        border-left:6px solid {badge_color};
+                        margin-bottom:14px;
+                        box-shadow:0 2px 6px rgba(0,0,0,0.05);'>
+                <strong>{row.service_category} ({row.city}) →
+                    <span style="color:{badge_color}">{row.stage}</span>
+                </strong>
+                <br>{row.advice}
+            </div>
+            """, unsafe_allow_html=True)
+        with col2:
+            chart_df = pd.DataFrame({'date': month_dates[has_value], 'roi': roi[has_value]})
+            chart_df['type'] = np.where(np.flatnonzero(has_value) <= latest_actual, 'Actual', 'Forecast')
+            st.line_chart(chart_df, x='date', y='roi', color='type', height=160)
+
+
+def panel_script(root, bench_dir, n_pairs, n_months, forecast_months):
+    import sys
+
+    sys.path[:0] = [root, bench_dir]
+    from bench_lifecycle_render import make_cube
+    from lifecycle import classify_cube, render_lifecycle_panel
+
+    cube, latest_actual = make_cube(n_pairs, n_months, forecast_months)
+    render_lifecycle_panel(cube, classify_cube(cube), latest_actual)
+
+
+# -----------------------------------------------------
+# SYNTHETIC INPUT
+# -----------------------------------------------------
+def make_cube(n_pairs, n_months=36, forecast_months=6, seed=0):
+    """ROI cube of `n_pairs` trending series; returns (cube, latest actual month position)."""
+    from bench_lifecycle import make_combined
+    import pandas as pd
+
+    from kpi_cube import KpiCube
+
+    combined = make_combined(n_pairs, n_months, seed)
+    dates = pd.to_datetime(combined["date"])
+    rows = pd.DataFrame({
+        "service_category": combined["service_category"],
+        "city": combined["city"],
+        "year": dates.dt.year,
+        "month": dates.dt.month,
+        "roi": combined["roi"],
+        "is_forecast": 0.0,
+    })
+    return KpiCube.from_frame(rows, ["roi", "is_forecast"]), n_months - forecast_months - 1
+
+
+# -----------------------------------------------------
+# MEASUREMENT
+# -----------------------------------------------------
+def walk(node):
+    yield node
+    children = getattr(node, "children", None)
+    if isinstance(children, dict):
+        for child in children.values():
+            yield from walk(child)
+
+
+def payload_bytes(tree):
+    return sum(
+        node.proto.ByteSize() for node in walk(tree)
+        if hasattr(getattr(node, "proto", None), "ByteSize")
+    )
+
+
+def render(script, n_pairs, args):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_function(
+        script, args=(ROOT, HERE, n_pairs, args.months, args.forecast_months), default_timeout=args.timeout,
+    )
+    started = time.perf_counter()
+    try:
+        at.run()
+    except RuntimeError as e:
+        if "timed out" not in str(e):
+            raise
+        return None
+    seconds = time.perf_counter() - started
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    charts = sum(1 for node in walk(at._tree) if getattr(node, "type", None) == "vega_lite_chart")
+    return seconds, payload_bytes(at._tree), len(at.markdown), charts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pairs", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--months", type=int, default=36)
+    parser.add_argument("--forecast-months", type=int, default=6)
+    parser.add_argument("--baseline-max-pairs", type=int, default=500,
+                        help="skip the per-pair render above this size (0.15s+ per pair)")
+    parser.add_argument("--timeout", type=float, default=900.0, help="per-run AppTest timeout (s)")
+    args = parser.parse_args()
+
+    print(f"{'pairs':>6} {'variant':<9} {'render (s)':>10} {'payload (KB)':>13} {'markdown':>9} {'charts':>7}")
+    for n in args.pairs:
+        variants = [("panel", panel_script)]
+        if n <= args.baseline_max_pairs:
+            variants.insert(0, ("per-pair", per_pair_script))
+        for name, script in variants:
+            measured = render(script, n, args)
+            if measured is None:
+                print(f"{n:>6} {name:<9} {'> ' + format(args.timeout, '.0f'):>10}  (timed out)")
+                continue
+            seconds, size, markdown, charts = measured
+            print(f"{n:>6} {name:<9} {seconds:10.2f} {size / 1024:13.1f} {markdown:>9} {charts:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""SQL-generation calls straight to the client vs through the LLM gateway, under injected faults.
+
+The fake model draws latencies from the llm.sql profile and, per request,
+fails with a transient 503, stalls or returns truncated JSON at the given
+rates. Each path makes the same number of calls from a worker pool; the
+report shows how many produced a usable answer and the latency tail
+(failed calls count with the time they took).
+
+    python benchmarks/bench_llm_gateway.py --calls 400 --stall-rate 0.02 --error-rate 0.03
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from fakes import FakeGenAIClient, Faults, Latencies  # noqa: E402
+from llm_gateway import LLMGateway, parse_json_response  # noqa: E402
+
+
+QUESTION = "Which service-city pairs had the lowest average ROI?"
+SQL_CONFIG = {"temperature": 0.0, "response_mime_type": "application/json"}
+
+
+def direct_call(client):
+    response = client.models.generate_content(model="fake", contents=QUESTION, config=SQL_CONFIG)
+    return parse_json_response(response.text)
+
+
+def gateway_call(client, gateway):
+    response = gateway.call(lambda: client.models.generate_content(model="fake", contents=QUESTION, config=SQL_CONFIG))
+    return parse_json_response(response.text)
+
+
+def run(fn, calls, workers):
+    def one(_):
+        started = time.perf_counter()
+        try:
+            fn()
+            ok = True
+        except Exception:
+            ok = False
+        return ok, time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(one, range(calls)))
+    ok = np.array([r[0] for r in results])
+    seconds = np.array([r[1] for r in results])
+    return ok, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--p50", type=float, default=1.2, help="model latency p50 (s)")
+    parser.add_argument("--p95", type=float, default=3.0, help="model latency p95 (s)")
+    parser.add_argument("--error-rate", type=float, default=0.03)
+    parser.add_argument("--stall-rate", type=float, default=0.02)
+    parser.add_argument("--stall-seconds", type=float, default=60.0)
+    parser.add_argument("--bad-json-rate", type=float, default=0.0)
+    parser.add_argument("--deadline", type=float, default=30.0, help="gateway per-call deadline (s)")
+    parser.add_argument("--hedge-percentile", type=float, default=95.0)
+    parser.add_argument("--scale", type=float, default=0.05, help="multiply every latency, stall and deadline")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    def client():
+        latencies = Latencies({"llm.sql": {"p50": args.p50, "p95": args.p95}}, scale=args.scale, seed=args.seed)
+        faults = Faults(args.error_rate, args.stall_rate, args.stall_seconds * args.scale,
+                        args.bad_json_rate, seed=args.seed)
+        return FakeGenAIClient({QUESTION: "SELECT 1"}, latencies, faults=faults)
+
+    direct = client()
+    gated = client()
+    gateway = LLMGateway(
+        "bench", deadline=args.deadline * args.scale, backoff=0.5 * args.scale,
+        backoff_max=8 * args.scale, hedge_percentile=args.hedge_percentile,
+    )
+    paths = [
+        ("direct", direct, lambda: direct_call(direct)),
+        ("gateway", gated, lambda: gateway_call(gated, gateway)),
+    ]
+
+    print(f"{'path':<8} {'answered':>9} {'requests':>9} {'p50 (s)':>8} {'p95 (s)':>8} "
+          f"{'p99 (s)':>8} {'max (s)':>8}")
+    for name, fake, fn in paths:
+        ok, seconds = run(fn, args.calls, args.workers)
+        p50, p95, p99 = np.percentile(seconds, [50, 95, 99])
+        print(f"{name:<8} {ok.mean():9.1%} {fake.calls:>9} {p50:8.3f} {p95:8.3f} {p99:8.3f} {seconds.max():8.3f}")
+
+    stats = gateway.stats()
+    print(f"\ngateway: retries={stats['retries']} hedges={stats['hedges']} "
+          f"hedge wins={stats['hedge_wins']} breaker={stats['breaker']}")
+
+
+if __name__ == "__main__":
+    main()
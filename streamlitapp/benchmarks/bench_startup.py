@@ -0,0 +1,121 @@
+"""Cold-start import time per module for each Streamlit page, from `python -X importtime`.
+
+A page's top-level imports are read from its source and imported in a fresh
+interpreter, the way a new Cloud Run instance loads them before the first
+paint. The report lists each imported module with its cumulative time
+(including the libraries it was first to load) and the heaviest packages
+overall. Home.py must not load the libraries that startup.py defers.
+
+    python benchmarks/bench_startup.py --runs 5 --budget-ms 2500
+"""
+import argparse
+import ast
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+PAGES = ["Home.py"] + sorted(
+    os.path.join("pages", name) for name in os.listdir(os.path.join(ROOT, "pages")) if name.endswith(".py")
+)
+
+# built on first use (see startup.py); loading any of these on Home.py is a regression
+DEFERRED = {
+    "Home.py": ["google.cloud.bigquery", "google.genai", "vertexai", "duckdb", "sqlglot",
+                "sentence_transformers", "torch"],
+}
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def page_imports(path):
+    # module names from the page's top-level import statements, in order
+    tree = ast.parse(open(os.path.join(ROOT, path)).read(), path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def import_times(modules):
+    """[(depth, module, self_us, cumulative_us)] for one cold interpreter importing `modules`."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((len(indent) // 2, name, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def profile(modules, runs):
+    """Median cumulative ms per page import, median self ms per package, and loaded modules."""
+    cumulative = defaultdict(list)
+    package_self = defaultdict(list)
+    loaded = set()
+    for _ in range(runs):
+        per_package = defaultdict(int)
+        for depth, name, self_us, cumulative_us in import_times(modules):
+            loaded.add(name)
+            per_package[name.split(".")[0]] += self_us
+            if depth == 0 and name in modules:
+                cumulative[name].append(cumulative_us)
+        for package, us in per_package.items():
+            package_self[package].append(us)
+
+    # a module another import already loaded does not appear on its own line
+    page = {m: float(np.median(cumulative[m])) / 1000 if cumulative[m] else 0.0 for m in modules}
+    packages = {p: float(np.median(us)) / 1000 for p, us in package_self.items()}
+    return page, packages, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", nargs="+", default=PAGES, help="page scripts, relative to the app directory")
+    parser.add_argument("--runs", type=int, default=5, help="cold interpreters per page (medians reported)")
+    parser.add_argument("--top", type=int, default=12, help="heaviest packages to list")
+    parser.add_argument("--budget-ms", type=float, default=None, help="exit 1 if a page's imports take longer")
+    args = parser.parse_args()
+
+    failed = False
+    for path in args.pages:
+        modules = page_imports(path)
+        page, packages, loaded = profile(modules, args.runs)
+        total = sum(page.values())
+
+        print(f"\n{path}: {total:,.0f} ms to import {len(modules)} modules")
+        for module, ms in sorted(page.items(), key=lambda kv: -kv[1]):
+            print(f"  {module:<28} {ms:8.1f} ms")
+        print("  heaviest packages (self time):")
+        for package, ms in sorted(packages.items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f"    {package:<26} {ms:8.1f} ms")
+
+        early = [m for m in DEFERRED.get(path, []) if m in loaded]
+        if early:
+            print(f"  loaded at import but should be deferred: {', '.join(early)}")
+            failed = True
+        if args.budget_ms is not None and total > args.budget_ms:
+            print(f"  over budget: {total:,.0f} ms > {args.budget_ms:,.0f} ms")
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,331 @@
+"""Offline benchmark suite: dashboard data path, Analytical Bot pipeline, summary digest.
+
+BigQuery and Gemini are replaced by the fakes in benchmarks/fakes.py, which
+replay configurable latency distributions over synthetic tables. Every
+stage reports p50/p95 latency, throughput and peak traced memory; results
+go to JSON so two commits can be compared.
+
+    python benchmarks/bench_suite.py --cities 20 --services 8 --months 36 --out bench.json
+    python benchmarks/bench_suite.py --latency-scale 0 --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+# keep the bench away from the app's on-disk SQL cache and local snapshots
+os.environ.setdefault("SQL_CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="bench-"), "sql_cache.sqlite"))
+os.environ["LOCAL_ENGINE"] = "0"
+
+from fakes import FakeBigQueryClient, FakeGenAIClient, Latencies  # noqa: E402
+from synthetic import make_tables, KPI_TABLE, FORECAST_TABLE, MARKET_TABLE  # noqa: E402
+
+
+SCENARIOS = ["dashboard", "bot", "batch", "summary"]
+
+BOT_QUESTIONS = {
+    "Which service-city pairs had the lowest average ROI in the last 3 months?": f"""
+        SELECT service_category, city, AVG(roi_percent) AS avg_roi
+        FROM `{KPI_TABLE}`
+        WHERE year * 100 + month >= (SELECT MAX(year * 100 + month) - 2 FROM `{KPI_TABLE}`)
+        GROUP BY service_category, city
+        ORDER BY avg_roi
+        LIMIT 10""",
+    "Show monthly revenue and ROI by city": f"""
+        SELECT city, year, month, SUM(total_revenue) AS revenue, AVG(roi_percent) AS roi
+        FROM `{KPI_TABLE}`
+        GROUP BY city, year, month
+        ORDER BY city, year, month""",
+    "How does market demand relate to ROI for each service and city?": f"""
+        SELECT k.service_category, k.city, k.year, k.month, k.roi_percent, m.market_demand_index
+        FROM `{KPI_TABLE}` k
+        JOIN `{MARKET_TABLE}` m
+          ON k.city = m.city AND k.service_category = m.service_category
+         AND k.year = m.year AND k.month = m.month""",
+    "What is the forecasted ROI for every pair?": f"""
+        SELECT service_category, city, ds, forecasted_roi_percent
+        FROM `{FORECAST_TABLE}`
+        ORDER BY service_category, city, ds""",
+}
+
+
+# -----------------------------------------------------
+# MEASUREMENT
+# -----------------------------------------------------
+class StageRecorder:
+    def __init__(self, track_memory=True):
+        self.track_memory = track_memory
+        self.samples = {}
+
+    @contextmanager
+    def stage(self, name):
+        if self.track_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - base if self.track_memory else None
+            self.add(name, seconds, peak)
+
+    def add(self, name, seconds, peak_bytes=None):
+        entry = self.samples.setdefault(name, {"seconds": [], "peak_bytes": []})
+        entry["seconds"].append(seconds)
+        if peak_bytes is not None:
+            entry["peak_bytes"].append(peak_bytes)
+
+    def summary(self):
+        out = {}
+        for name, entry in self.samples.items():
+            secs = np.array(entry["seconds"])
+            out[name] = {
+                "runs": len(secs),
+                "p50_s": float(np.percentile(secs, 50)),
+                "p95_s": float(np.percentile(secs, 95)),
+                "mean_s": float(secs.mean()),
+                "throughput_per_s": float(len(secs) / secs.sum()) if secs.sum() else None,
+                "peak_mem_mb": round(max(entry["peak_bytes"]) / 2**20, 3) if entry["peak_bytes"] else None,
+            }
+        return out
+
+
+# -----------------------------------------------------
+# SCENARIOS
+# -----------------------------------------------------
+def bench_dashboard(rec, bq, runs):
+    """Home.py's data path: concurrent fetch (cold and warm cache), then the page computations.
+
+    The fake client has no dbt mart tables, so the headline and pair metrics
+    come from the in-process fallbacks; their cost is timed separately below.
+    """
+    from dashboard_data import fetch_dashboard_data, clear_cache
+    from insight_service import weakest_pair_inputs
+    from kpi_metrics import dashboard_headline, window_metrics
+    from lifecycle import classify_cube, roi_cube
+
+    for i in range(runs):
+        clear_cache()
+        with rec.stage("fetch (cold cache)"):
+            data = fetch_dashboard_data(bq)
+            frames = {name: future.result()[0] for name, future in data.items()}
+
+        with rec.stage("fetch (warm cache)"):
+            data = fetch_dashboard_data(bq)
+            for future in data.values():
+                future.result()
+
+        df, forecast_df = frames["kpis"], frames["forecasts"]
+
+        with rec.stage("KPI summary (fallback)"):
+            dashboard_headline(df)
+
+        with rec.stage("window metrics (fallback)"):
+            metrics = window_metrics(df)
+
+        with rec.stage("weakest pairs"):
+            weakest_pair_inputs(metrics[metrics["is_latest_month"]])
+
+        with rec.stage("lifecycle"):
+            cube = roi_cube(df, forecast_df)
+            for row in classify_cube(cube).itertuples(index=False):
+                cube.pair("roi", row.service_category, row.city)
+
+
+def bench_bot(rec, llm, runs, keep_sql_cache=False):
+    """stream_user_query end to end, split at the events the page reacts to."""
+    import nlp_engine
+
+    schema_hash = nlp_engine.schema_snapshot().schema_hash
+
+    for i in range(runs):
+        for question in BOT_QUESTIONS:
+            if not keep_sql_cache:
+                nlp_engine.sql_cache.discard(question, schema_hash)
+
+            # stages run back to back; "bot total" is their sum (no separate memory peak)
+            start = time.perf_counter()
+            events = nlp_engine.stream_user_query(question, client=llm)
+            with rec.stage("prompt + SQL generation"):
+                event = next(events)
+            if event["type"] == "error":
+                raise RuntimeError(event["error"])
+
+            with rec.stage("query + first rows"):
+                event = next(events)
+            with rec.stage("remaining rows"):
+                while event["type"] != "result":
+                    event = next(events)
+                    if event["type"] == "error":
+                        raise RuntimeError(event["error"])
+
+            with rec.stage("summary"):
+                for event in events:
+                    if event["type"] == "error":
+                        raise RuntimeError(event["error"])
+            rec.add("bot total", time.perf_counter() - start)
+
+
+def bench_batch(rec, llm, runs, workers=(1, 8)):
+    """batch_runner over the bot questions: serial vs concurrent wall time (quotas not binding)."""
+    import io
+    from batch_runner import run_batch
+
+    items = [{"question": q} for q in BOT_QUESTIONS] * 2
+    for _ in range(runs):
+        for n in workers:
+            with rec.stage(f"{len(items)} questions, {n} worker(s)"):
+                run_batch(items, io.StringIO(), client=llm, workers=n,
+                          llm_rate_per_minute=1e6, bq_rate_per_minute=1e6, fresh_sql=True)
+
+
+def bench_summary(rec, bq, runs):
+    """Digest + prompt build for the largest result the bot can produce."""
+    from summary_engine import build_result_digest, make_json_safe, render_summary_prompt
+
+    frames = {
+        "kpi rows": bq.execute(f"SELECT * FROM `{KPI_TABLE}`").to_pandas(),
+        "joined rows": bq.execute(list(BOT_QUESTIONS.values())[2]).to_pandas(),
+    }
+
+    for i in range(runs):
+        for label, df in frames.items():
+            with rec.stage(f"digest ({label}, {len(df):,})"):
+                data, meta = build_result_digest(df)
+                render_summary_prompt("benchmark question", data, meta)
+            with rec.stage(f"json-safe head(200) ({label})"):
+                make_json_safe(df.head(200))
+
+
+# -----------------------------------------------------
+# REPORTING
+# -----------------------------------------------------
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_report(results):
+    for scenario, stages in results["scenarios"].items():
+        print(f"\n== {scenario} ==")
+        print(f"{'stage':<40} {'runs':>5} {'p50 (s)':>9} {'p95 (s)':>9} {'ops/s':>8} {'peak MB':>8}")
+        for name, s in stages.items():
+            peak = f"{s['peak_mem_mb']:8.1f}" if s["peak_mem_mb"] is not None else f"{'-':>8}"
+            ops = f"{s['throughput_per_s']:8.2f}" if s["throughput_per_s"] else f"{'-':>8}"
+            print(f"{name:<40} {s['runs']:>5} {s['p50_s']:9.4f} {s['p95_s']:9.4f} {ops} {peak}")
+
+
+def compare(results, baseline, threshold):
+    """Print p50 changes vs a previous run; return the stages that regressed."""
+    regressed = []
+    print(f"\n== vs {baseline['meta'].get('git_revision') or 'baseline'} ==")
+    for scenario, stages in results["scenarios"].items():
+        for name, s in stages.items():
+            old = baseline["scenarios"].get(scenario, {}).get(name)
+            if not old or not old["p50_s"]:
+                continue
+            change = s["p50_s"] / old["p50_s"] - 1
+            flag = "  REGRESSION" if change > threshold else ""
+            print(f"{scenario + ' / ' + name:<55} {old['p50_s']:9.4f} -> {s['p50_s']:9.4f} ({change:+.0%}){flag}")
+            if flag:
+                regressed.append(f"{scenario} / {name}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--services", type=int, default=8)
+    parser.add_argument("--cities", type=int, default=20)
+    parser.add_argument("--months", type=int, default=36)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency-profile", help="JSON file overriding fakes.DEFAULT_PROFILE entries")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="multiply every simulated latency (0 = CPU cost only)")
+    parser.add_argument("--page-rows", type=int, default=10_000)
+    parser.add_argument("--keep-sql-cache", action="store_true",
+                        help="let repeated bot questions hit the generated-SQL cache")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (lower overhead)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", help="previous results JSON to diff against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="p50 slowdown that counts as a regression with --compare")
+    args = parser.parse_args()
+
+    profile = None
+    if args.latency_profile:
+        with open(args.latency_profile) as f:
+            profile = json.load(f)
+    latencies = Latencies(profile, scale=args.latency_scale, seed=args.seed)
+
+    tables = make_tables(args.services, args.cities, args.months, seed=args.seed)
+    bq = FakeBigQueryClient(tables, latencies, page_rows=args.page_rows)
+    llm = FakeGenAIClient(BOT_QUESTIONS, latencies)
+
+    from sql_executor import set_bigquery_client
+    set_bigquery_client(bq)
+
+    if not args.no_memory:
+        tracemalloc.start()
+
+    results = {
+        "meta": {
+            "git_revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "args": vars(args),
+            "rows": {table_id: len(df) for table_id, df in tables.items()},
+        },
+        "scenarios": {},
+    }
+
+    for scenario in args.scenarios:
+        rec = StageRecorder(track_memory=not args.no_memory)
+        started = time.perf_counter()
+        if scenario == "dashboard":
+            bench_dashboard(rec, bq, args.runs)
+        elif scenario == "bot":
+            bench_bot(rec, llm, args.runs, args.keep_sql_cache)
+        elif scenario == "batch":
+            bench_batch(rec, llm, args.runs)
+        else:
+            bench_summary(rec, bq, args.runs)
+        results["scenarios"][scenario] = rec.summary()
+        results["meta"].setdefault("wall_seconds", {})[scenario] = time.perf_counter() - started
+
+    print_report(results)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nwrote {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressed = compare(results, json.load(f), args.threshold)
+        if regressed:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
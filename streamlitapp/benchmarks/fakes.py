@@ -0,0 +1,255 @@
+"""In-process stand-ins for bigquery.Client and the google-genai client.
+
+Both replay latencies drawn from `LatencyModel`s, so end-to-end timings
+include realistic waits without any GCP call. The BigQuery fake runs the
+SQL with DuckDB over synthetic frames (table names are rewritten the same
+way the local engine does it); the genai fake answers SQL prompts from a
+question -> SQL map and streams a canned summary.
+"""
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+
+from local_engine import LOCAL_TABLES, LocalEngine
+
+
+# -----------------------------------------------------
+# LATENCY
+# -----------------------------------------------------
+class LatencyModel:
+    """Log-normal latency with the given p50/p95, or a replay of recorded samples."""
+
+    def __init__(self, p50=0.0, p95=None, samples=None, seed=0):
+        self.p50 = p50
+        self.p95 = p95 if p95 is not None else p50
+        self.samples = list(samples) if samples else None
+        self._rng = np.random.default_rng(seed)
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_spec(cls, spec, seed=0):
+        if isinstance(spec, (int, float)):
+            return cls(spec, seed=seed)
+        if isinstance(spec, list):
+            return cls(samples=spec, seed=seed)
+        return cls(spec.get("p50", 0.0), spec.get("p95"), spec.get("samples"), seed=seed)
+
+    def sample(self):
+        with self._lock:
+            if self.samples:
+                value = self.samples[self._next % len(self.samples)]
+                self._next += 1
+                return value
+            if self.p50 <= 0:
+                return 0.0
+            sigma = np.log(max(self.p95, self.p50) / self.p50) / 1.645
+            return float(self.p50 * np.exp(sigma * self._rng.standard_normal()))
+
+
+# seconds; override per key with a JSON profile (see bench_suite --latency-profile)
+DEFAULT_PROFILE = {
+    "bq.get_table": {"p50": 0.05, "p95": 0.15},
+    "bq.query": {"p50": 0.8, "p95": 2.5},
+    "bq.page": {"p50": 0.02, "p95": 0.06},
+    "llm.sql": {"p50": 1.2, "p95": 3.0},
+    "llm.summary": {"p50": 1.5, "p95": 4.0},
+    "llm.first_token": {"p50": 0.4, "p95": 1.0},
+    "llm.chunk": {"p50": 0.03, "p95": 0.08},
+}
+
+
+class Latencies:
+    def __init__(self, profile=None, scale=1.0, seed=0):
+        merged = dict(DEFAULT_PROFILE, **(profile or {}))
+        self.models = {k: LatencyModel.from_spec(v, seed + i) for i, (k, v) in enumerate(sorted(merged.items()))}
+        self.scale = scale
+
+    def wait(self, key):
+        seconds = self.models[key].sample() * self.scale
+        if seconds > 0:
+            time.sleep(seconds)
+        return seconds
+
+
+# -----------------------------------------------------
+# BIGQUERY
+# -----------------------------------------------------
+class FakeRowIterator:
+    def __init__(self, table, latencies, page_rows):
+        self._table = table
+        self._latencies = latencies
+        self._page_rows = page_rows
+        self.total_rows = table.num_rows
+        self.schema = [SimpleNamespace(name=name) for name in table.column_names]
+
+    def to_arrow_iterable(self, bqstorage_client=None):
+        for batch in self._table.to_batches(max_chunksize=self._page_rows):
+            self._latencies.wait("bq.page")
+            yield batch
+
+    def to_arrow(self, bqstorage_client=None):
+        batches = list(self.to_arrow_iterable(bqstorage_client))
+        return pa.Table.from_batches(batches, schema=self._table.schema)
+
+    def to_dataframe(self, bqstorage_client=None):
+        return self.to_arrow(bqstorage_client).to_pandas()
+
+
+class FakeQueryJob:
+    def __init__(self, client, sql):
+        self._client = client
+        self._sql = sql
+        self._table = None
+        self._lock = threading.Lock()
+
+    def result(self):
+        # like a real job, only the first result() waits for it to run;
+        # later calls page through the same finished result
+        with self._lock:
+            if self._table is None:
+                self._client.latencies.wait("bq.query")
+                self._table = self._client.execute(self._sql)
+        return FakeRowIterator(self._table, self._client.latencies, self._client.page_rows)
+
+
+class FakeBigQueryClient:
+    """`query(sql).result()` and `get_table(id).modified` over in-memory frames."""
+
+    def __init__(self, tables, latencies=None, page_rows=10_000):
+        self.latencies = latencies or Latencies(scale=0.0)
+        self.page_rows = page_rows
+        self.modified = {table_id: time.time() for table_id in tables}
+        self.queries = 0
+        self._translator = LocalEngine()
+        self._con = duckdb.connect()
+        self._lock = threading.Lock()
+        for table_id, df in tables.items():
+            view = LOCAL_TABLES[table_id]["view"]
+            self._con.register(view, df)
+
+    def touch(self, table_id):
+        self.modified[table_id] = time.time()
+
+    def get_table(self, table_id):
+        self.latencies.wait("bq.get_table")
+        return SimpleNamespace(table_id=table_id, modified=self.modified[table_id])
+
+    def query(self, sql):
+        with self._lock:
+            self.queries += 1
+        return FakeQueryJob(self, sql)
+
+    def execute(self, sql):
+        local_sql = self._translator.translate(sql)
+        with self._lock:
+            return self._con.execute(local_sql).fetch_arrow_table()
+
+
+# -----------------------------------------------------
+# GENAI
+# -----------------------------------------------------
+class FakeServerError(Exception):
+    # shaped like google-genai's ServerError: the HTTP status is `code`
+    def __init__(self, code=503, message="service unavailable (injected)"):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class Faults:
+    """Per-request fault injection: transient errors, stalls, malformed JSON."""
+
+    def __init__(self, error_rate=0.0, stall_rate=0.0, stall_seconds=30.0, bad_json_rate=0.0, seed=0):
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.bad_json_rate = bad_json_rate
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        with self._lock:
+            return self._rng.random(3)
+
+    def inject(self):
+        """Raise or stall for this request; returns True when its JSON should be broken."""
+        error, stall, bad_json = self._draw()
+        if error < self.error_rate:
+            raise FakeServerError()
+        if stall < self.stall_rate:
+            time.sleep(self.stall_seconds)
+        return bad_json < self.bad_json_rate
+
+
+def _response(prompt, text):
+    usage = SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=len(text) // 4)
+    return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+class _FakeModels:
+    def __init__(self, client):
+        self._client = client
+
+    def generate_content(self, model, contents, config=None):
+        config = config or {}
+        self._client.count_call()
+        bad_json = self._client.faults.inject()
+        if config.get("response_mime_type") == "application/json":
+            self._client.latencies.wait("llm.sql")
+            text = self._client.sql_response(contents)
+            return _response(contents, text[:len(text) // 2] if bad_json else text)
+        self._client.latencies.wait("llm.summary")
+        return _response(contents, "".join(self._client.summary_chunks))
+
+    def generate_content_stream(self, model, contents, config=None):
+        self._client.count_call()
+        self._client.faults.inject()
+        self._client.latencies.wait("llm.first_token")
+        chunks = self._client.summary_chunks
+        for i, text in enumerate(chunks):
+            if i:
+                self._client.latencies.wait("llm.chunk")
+            # like the real stream, usage metadata arrives with the last chunk
+            if i == len(chunks) - 1:
+                yield SimpleNamespace(text=text, usage_metadata=_response(contents, "".join(chunks)).usage_metadata)
+            else:
+                yield SimpleNamespace(text=text, usage_metadata=None)
+
+
+class FakeGenAIClient:
+    """`models.generate_content(_stream)` answering from a question -> SQL map.
+
+    `faults` injects transient errors, stalls and truncated JSON per request.
+    """
+
+    def __init__(self, sql_by_question, latencies=None, summary_chunks=None, faults=None):
+        self.sql_by_question = sql_by_question
+        self.latencies = latencies or Latencies(scale=0.0)
+        self.faults = faults or Faults()
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.summary_chunks = summary_chunks or [
+            f"- Point {i}: ROI moved in the period shown.\n" for i in range(1, 6)
+        ]
+        self.models = _FakeModels(self)
+
+    def count_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def sql_response(self, prompt):
+        # the question is the last thing in the prompt; match the longest hit
+        hits = [q for q in self.sql_by_question if q in prompt]
+        if not hits:
+            return json.dumps({"sql": None})
+        sql = self.sql_by_question[max(hits, key=len)]
+        return json.dumps({
+            "sql": sql,
+            "uses_market_data": "market_data" in sql,
+            "uses_ml_prediction": "ML.PREDICT" in sql,
+        })
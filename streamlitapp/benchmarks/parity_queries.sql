@@ -0,0 +1,25 @@
+-- Sample bot queries for `python local_engine.py parity benchmarks/parity_queries.sql`
+
+SELECT service_category, city, ROUND(AVG(roi_percent), 2) AS avg_roi
+FROM `nonhospitality-bi.analytics.monthly_service_kpis`
+WHERE year = 2024
+GROUP BY service_category, city
+ORDER BY avg_roi
+LIMIT 10;
+
+SELECT year, month, SUM(total_revenue) AS revenue, SUM(operational_cost_month) AS cost
+FROM `nonhospitality-bi.analytics.monthly_service_kpis`
+GROUP BY year, month
+ORDER BY year, month;
+
+SELECT k.city, k.service_category, AVG(k.roi_percent) AS avg_roi, AVG(m.market_demand_index) AS avg_demand
+FROM `nonhospitality-bi.analytics.monthly_service_kpis` k
+JOIN `nonhospitality-bi.raw.market_data` m
+  ON k.city = m.city AND k.service_category = m.service_category
+ AND k.year = m.year AND k.month = m.month
+GROUP BY k.city, k.service_category;
+
+SELECT service_category, city, ds, forecasted_roi_percent
+FROM `nonhospitality-bi.analytics.monthly_service_kpis_forecasts`
+WHERE ds >= DATE_SUB(CURRENT_DATE(), INTERVAL 3 MONTH)
+ORDER BY service_category, city, ds
@@ -0,0 +1,136 @@
+"""Synthetic versions of the three BigQuery tables the app reads.
+
+Sizes scale with the number of services, cities and months; values are
+random but shaped like the real data (ROI with per-pair trends, forecast
+rows overlapping the last actual months, one market row per pair-month).
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+
+KPI_TABLE = "nonhospitality-bi.analytics.monthly_service_kpis"
+FORECAST_TABLE = "nonhospitality-bi.analytics.monthly_service_kpis_forecasts"
+MARKET_TABLE = "nonhospitality-bi.raw.market_data"
+
+
+def _grid(n_services, n_cities, n_months, start):
+    services = np.array([f"Service {i}" for i in range(n_services)])
+    cities = np.array([f"City {i}" for i in range(n_cities)])
+    months = pd.date_range(start, periods=n_months, freq="MS")
+
+    n_pairs = n_services * n_cities
+    return (
+        np.repeat(np.repeat(services, n_cities), n_months),
+        np.repeat(np.tile(cities, n_services), n_months),
+        pd.DatetimeIndex(np.tile(months, n_pairs)),
+        n_pairs,
+    )
+
+
+def make_kpis(n_services=8, n_cities=20, n_months=36, start=date(2022, 1, 1), seed=0):
+    rng = np.random.default_rng(seed)
+    services, cities, months, n_pairs = _grid(n_services, n_cities, n_months, start)
+    n = n_pairs * n_months
+
+    trend = rng.normal(0, 1.5, n_pairs)[:, None] * np.arange(n_months)
+    roi = (rng.normal(8, 12, n_pairs)[:, None] + trend + rng.normal(0, 4, (n_pairs, n_months))).ravel()
+
+    revenue = rng.gamma(4, 5000, n)
+    marketing = revenue * rng.uniform(0.05, 0.2, n)
+    operational = revenue * rng.uniform(0.3, 0.7, n)
+    capacity = rng.integers(200, 2000, n)
+    guests = (capacity * rng.uniform(0.3, 1.0, n)).astype("int64")
+
+    return pd.DataFrame({
+        "service_category": services,
+        "city": cities,
+        "year": months.year.astype("int64"),
+        "month": months.month.astype("int64"),
+        "total_revenue": revenue,
+        "txn_count": (guests * rng.uniform(0.8, 1.5, n)).astype("int64"),
+        "total_guest_count": guests,
+        "marketing_spend_month": marketing,
+        "operational_cost_month": operational,
+        "max_capacity": capacity,
+        "total_invest": marketing + operational,
+        "capacity_utilization_pct": guests / capacity * 100,
+        "roi_percent": roi,
+        "profit_margin_pct": (revenue - marketing - operational) / revenue * 100,
+    })
+
+
+def make_forecasts(kpis, history_months=6, horizon_months=3, seed=1):
+    """Forecast rows: the last `history_months` with actuals, then the horizon."""
+    rng = np.random.default_rng(seed)
+    kpis = kpis.sort_values(["service_category", "city", "year", "month"], kind="mergesort")
+    ds = pd.to_datetime(dict(year=kpis["year"], month=kpis["month"], day=1))
+
+    history = kpis.assign(ds=ds).groupby(["service_category", "city"], sort=False).tail(history_months)
+    history = pd.DataFrame({
+        "service_category": history["service_category"].to_numpy(),
+        "city": history["city"].to_numpy(),
+        "ds": history["ds"].to_numpy(),
+        "actual_roi_percent": history["roi_percent"].to_numpy(),
+        "actual_profit_margin_pct": history["profit_margin_pct"].to_numpy(),
+    })
+
+    last = history.groupby(["service_category", "city"], sort=False).tail(1)
+    future = pd.concat([
+        pd.DataFrame({
+            "service_category": last["service_category"].to_numpy(),
+            "city": last["city"].to_numpy(),
+            "ds": pd.DatetimeIndex(last["ds"]) + pd.DateOffset(months=step),
+        })
+        for step in range(1, horizon_months + 1)
+    ], ignore_index=True)
+
+    out = pd.concat([history, future], ignore_index=True)
+    base = out.groupby(["service_category", "city"])["actual_roi_percent"].transform("mean")
+    out["forecasted_roi_percent"] = base + rng.normal(0, 3, len(out))
+    margin = out.groupby(["service_category", "city"])["actual_profit_margin_pct"].transform("mean")
+    out["forecasted_profit_margin_pct"] = margin + rng.normal(0, 2, len(out))
+
+    return out.sort_values(["service_category", "city", "ds"], kind="mergesort").reset_index(drop=True)[[
+        "service_category", "city", "ds",
+        "forecasted_profit_margin_pct", "actual_profit_margin_pct",
+        "forecasted_roi_percent", "actual_roi_percent",
+    ]]
+
+
+def make_market(n_services=8, n_cities=20, n_months=36, start=date(2022, 1, 1), seed=2):
+    rng = np.random.default_rng(seed)
+    services, cities, months, _ = _grid(n_services, n_cities, n_months, start)
+    n = len(months)
+
+    return pd.DataFrame({
+        "date": months.date,
+        "year": months.year.astype("int64"),
+        "month": months.month.astype("int64"),
+        "city": cities,
+        "service_category": services,
+        "competitor_avg_price": rng.uniform(20, 300, n),
+        "competitor_discount_rate": rng.uniform(0, 0.3, n),
+        "market_demand_index": rng.uniform(0.5, 1.5, n),
+        "demand_growth_pct": rng.normal(2, 5, n),
+        "competitor_count": rng.integers(1, 30, n),
+        "competitor_available_capacity": rng.uniform(100, 5000, n),
+        "market_utilization_rate": rng.uniform(0.3, 1.0, n),
+        "seasonality_factor": rng.uniform(0.7, 1.3, n),
+        "city_event_impact_score": rng.integers(0, 10, n),
+        "avg_customer_rating": rng.uniform(3, 5, n),
+        "avg_review_sentiment_score": rng.uniform(-1, 1, n),
+        "willingness_to_pay_score": rng.uniform(0, 1, n),
+        "is_offered_by_hotel": rng.random(n) < 0.5,
+    })
+
+
+def make_tables(n_services=8, n_cities=20, n_months=36, seed=0):
+    """table_id -> DataFrame for every table the app queries."""
+    kpis = make_kpis(n_services, n_cities, n_months, seed=seed)
+    return {
+        KPI_TABLE: kpis,
+        FORECAST_TABLE: make_forecasts(kpis, seed=seed + 1),
+        MARKET_TABLE: make_market(n_services, n_cities, n_months, seed=seed + 2),
+    }
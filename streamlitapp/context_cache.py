@@ -0,0 +1,93 @@
+import os
+import threading
+
+
+CONTEXT_CACHE_ENABLED = os.environ.get("SQL_PROMPT_CONTEXT_CACHE", "0") == "1"
+CONTEXT_CACHE_MODEL = os.environ.get("SQL_PROMPT_CONTEXT_CACHE_MODEL", "gemini-2.0-flash-001")
+CONTEXT_CACHE_TTL = os.environ.get("SQL_PROMPT_CONTEXT_CACHE_TTL", "3600s")
+
+
+# -----------------------------
+# Backends
+# -----------------------------
+class GeminiContextBackend:
+    # provider-side cached content through the google-genai caches API
+
+    def create(self, client, prefix_id, prefix, model):
+        cache = client.caches.create(
+            model=model,
+            config={
+                "contents": [prefix],
+                "display_name": f"sql-prefix-{prefix_id}",
+                "ttl": CONTEXT_CACHE_TTL,
+            },
+        )
+        return cache.name
+
+
+class LocalContextBackend:
+    # in-process stand-in with the same contract, for tests and offline runs
+
+    def __init__(self):
+        self.contents = {}
+
+    def create(self, client, prefix_id, prefix, model):
+        name = f"local/{model}/{prefix_id}"
+        self.contents[name] = prefix
+        return name
+
+
+# -----------------------------
+# Prefix id -> cached content name
+# -----------------------------
+class ContextCache:
+    """Sends each static prompt prefix to the provider once per `prefix_id`.
+
+    A failed upload (e.g. prefix below the provider's minimum size) is
+    remembered so the caller just falls back to sending the full prompt.
+    """
+
+    def __init__(self, backend=None, model=CONTEXT_CACHE_MODEL):
+        self.backend = backend or GeminiContextBackend()
+        self.model = model
+        self._names = {}
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "reused": 0, "failed": 0}
+
+    def get_or_create(self, client, prefix_id, prefix):
+        with self._lock:
+            if prefix_id in self._names:
+                name = self._names[prefix_id]
+                if name:
+                    self.stats["reused"] += 1
+                return name
+
+            try:
+                name = self.backend.create(client, prefix_id, prefix, self.model)
+                self.stats["created"] += 1
+            except Exception:
+                name = None
+                self.stats["failed"] += 1
+
+            self._names[prefix_id] = name
+            return name
+
+    def forget(self, prefix_id=None):
+        # e.g. after the provider expired the cache (TTL) and rejected the name
+        with self._lock:
+            if prefix_id is None:
+                self._names.clear()
+            else:
+                self._names.pop(prefix_id, None)
+
+
+_context_cache = None
+_context_cache_lock = threading.Lock()
+
+
+def get_context_cache():
+    global _context_cache
+    with _context_cache_lock:
+        if _context_cache is None:
+            _context_cache = ContextCache()
+        return _context_cache
@@ -0,0 +1,351 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from forecast_engine import forecast_table
+from kpi_metrics import dashboard_headline, window_metrics
+from page_timer import timed_call
+from sql_executor import get_bigquery_client, run_bigquery_sql
+from startup import get_warm_start
+from tracing import get_tracer, current_span, record_cache
+
+
+KPI_TABLE = "nonhospitality-bi.analytics.monthly_service_kpis"
+FORECAST_TABLE = "nonhospitality-bi.analytics.monthly_service_kpis_forecasts"
+
+KPI_SQL = f"""
+    SELECT service_category, city, year, month,
+           roi_percent, profit_margin_pct, total_revenue,
+           total_guest_count, marketing_spend_month
+    FROM `{KPI_TABLE}`
+"""
+
+FORECAST_SQL = f"""
+    SELECT service_category, city, ds,
+           actual_roi_percent,
+           forecasted_roi_percent
+    FROM `{FORECAST_TABLE}`
+    ORDER BY service_category, city, ds
+"""
+
+# "table": read FORECAST_TABLE; "local": fit the same rows from the KPI table
+# with forecast_engine, again only when that table changes
+FORECAST_SOURCE = os.environ.get("FORECAST_SOURCE", "table")
+
+# dbt marts built by non_hospitality_ai/models/marts
+MART_DATASET = os.environ.get("KPI_MART_DATASET", "nonhospitality-bi.analytics")
+HEADLINE_TABLE = f"{MART_DATASET}.mart_dashboard_headline"
+WINDOW_METRICS_TABLE = f"{MART_DATASET}.mart_kpi_window_metrics"
+
+HEADLINE_SQL = f"SELECT * FROM `{HEADLINE_TABLE}`"
+
+LATEST_PAIR_METRICS_SQL = f"""
+    SELECT *
+    FROM `{WINDOW_METRICS_TABLE}`
+    WHERE is_latest_month
+"""
+
+# How long a cached copy is served without even asking BigQuery whether the
+# table changed, and how much memory all cached frames may use together.
+CACHE_TTL_SECONDS = float(os.environ.get("DASHBOARD_CACHE_TTL_SECONDS", "300"))
+CACHE_MAX_BYTES = int(os.environ.get("DASHBOARD_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+
+# -----------------------------------------------------
+# PROCESS-WIDE DATASET CACHE
+# -----------------------------------------------------
+class DatasetCache:
+    """One shared DataFrame per dataset for every session in the process.
+
+    An entry is served as-is until its TTL runs out; after that the table's
+    last-modified time is checked and the data is refetched only if it moved.
+    With a warm-start snapshot, a key's first lookup in the process is
+    served from disk and revalidated in the background.
+    """
+
+    def __init__(self, ttl_seconds=CACHE_TTL_SECONDS, max_bytes=CACHE_MAX_BYTES, warm_start=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        # startup.WarmStartSnapshot: read once per key, rewritten on every fetch
+        self.warm_start = warm_start
+        self._warm_keys = set()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._fetch_locks = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "revalidations": 0,
+            "evictions": 0,
+            "warm_starts": 0,
+        }
+
+    def get(self, key, table_id, fetch, client=None):
+        # one fetch per key at a time; other sessions wait and then hit
+        with self._fetch_lock(key):
+            entry = self._peek(key)
+            now = time.monotonic()
+
+            if entry is None:
+                entry = self._warm_start(key, table_id, fetch, client, now)
+                if entry is not None:
+                    return entry["df"]
+
+            if entry is not None and now - entry["checked_at"] < self.ttl_seconds:
+                self._count("hits")
+                record_cache("dashboard", True)
+                return entry["df"]
+
+            return self._refresh(key, table_id, fetch, client, entry, now)
+
+    def _refresh(self, key, table_id, fetch, client, entry, now):
+        # caller holds the key's fetch lock
+        modified = table_last_modified(client, table_id)
+
+        if entry is not None and modified is not None and modified == entry["modified"]:
+            entry["checked_at"] = now
+            self._count("hits")
+            self._count("revalidations")
+            record_cache("dashboard", True)
+            current_span().set_attribute("cache.revalidated", True)
+            return entry["df"]
+
+        df = fetch()
+        self._count("misses")
+        record_cache("dashboard", False)
+        self._store(key, {
+            "df": df,
+            "modified": modified,
+            "checked_at": now,
+            "nbytes": int(df.memory_usage(deep=True).sum()),
+        })
+        if self.warm_start is not None:
+            try:
+                self.warm_start.save(key, df, modified)
+            except Exception as e:
+                current_span().set_attribute("warm_start.save_error", str(e))
+        return df
+
+    def _warm_start(self, key, table_id, fetch, client, now):
+        """Serve the on-disk copy the first time a key is asked for, then check
+        BigQuery for a newer one in the background."""
+        with self._lock:
+            if self.warm_start is None or key in self._warm_keys:
+                return None
+            self._warm_keys.add(key)
+        loaded = self.warm_start.load(key)
+        if loaded is None:
+            return None
+
+        df, modified = loaded
+        entry = {
+            "df": df,
+            "modified": modified,
+            "checked_at": now,
+            "nbytes": int(df.memory_usage(deep=True).sum()),
+        }
+        self._store(key, entry)
+        self._count("hits")
+        self._count("warm_starts")
+        record_cache("dashboard", True)
+        current_span().set_attribute("cache.warm_start", True)
+
+        def revalidate():
+            try:
+                with self._fetch_lock(key):
+                    if self._peek(key) is entry:
+                        self._refresh(key, table_id, fetch, client, entry, time.monotonic())
+            except Exception:
+                pass  # keep the copy; the next check after the TTL tries again
+
+        threading.Thread(target=revalidate, name=f"warm-start-{key}", daemon=True).start()
+        return entry
+
+    def invalidate(self, key=None):
+        # the next get() fetches: an invalidated key is not served from disk either
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._warm_keys.update(self.warm_start.keys() if self.warm_start else ())
+            else:
+                self._entries.pop(key, None)
+                self._warm_keys.add(key)
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out["entries"] = len(self._entries)
+            out["bytes"] = sum(e["nbytes"] for e in self._entries.values())
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = out["hits"] / lookups if lookups else 0.0
+        return out
+
+    def _fetch_lock(self, key):
+        with self._lock:
+            return self._fetch_locks.setdefault(key, threading.Lock())
+
+    def _peek(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+
+            total = sum(e["nbytes"] for e in self._entries.values())
+            while total > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                total -= evicted["nbytes"]
+                self._stats["evictions"] += 1
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+
+def table_last_modified(client, table_id):
+    # metadata-only call: no job, no bytes scanned
+    try:
+        return (client or get_bigquery_client()).get_table(table_id).modified
+    except Exception:
+        return None
+
+
+_cache = DatasetCache(warm_start=get_warm_start())
+
+
+# -----------------------------------------------------
+# DATASETS USED BY HOME.PY
+# -----------------------------------------------------
+def load_kpis(client=None, parent=None):
+    with get_tracer().start_span("query.kpis", parent=parent, table=KPI_TABLE):
+        df = _cache.get(
+            "kpis", KPI_TABLE,
+            lambda: run_bigquery_sql(KPI_SQL, client=client),
+            client,
+        )
+    # shallow copy: callers may add columns without touching the shared frame
+    return df.copy(deep=False)
+
+
+def load_forecasts(client=None, parent=None):
+    if FORECAST_SOURCE == "local":
+        return load_local_forecasts(client, parent)
+    with get_tracer().start_span("query.forecasts", parent=parent, table=FORECAST_TABLE):
+        df = _cache.get(
+            "forecasts", FORECAST_TABLE,
+            lambda: run_bigquery_sql(FORECAST_SQL, client=client),
+            client,
+        )
+    return df.copy(deep=False)
+
+
+def load_local_forecasts(client=None, parent=None):
+    with get_tracer().start_span("forecast.local", parent=parent, table=KPI_TABLE) as span:
+        kpis = load_kpis(client, parent=span)
+        df = _cache.get("forecasts.local", KPI_TABLE, lambda: forecast_table(kpis), client)
+        span.set_attribute("rows", len(df))
+    return df.copy(deep=False)
+
+
+# table_id -> (monotonic time, deployed?) for the marts, rechecked after the TTL
+_mart_status = {}
+_mart_status_lock = threading.Lock()
+
+
+def _is_not_found(error):
+    # google.api_core.exceptions.NotFound without importing it here
+    return type(error).__name__ == "NotFound" or getattr(error, "code", None) == 404
+
+
+def _mart_deployed(table_id, client):
+    """False while the mart is known to be missing, so renders skip straight
+    to the fallback instead of paying a failed metadata call and job each time."""
+    now = time.monotonic()
+    with _mart_status_lock:
+        status = _mart_status.get(table_id)
+    if status is not None and now - status[0] < CACHE_TTL_SECONDS:
+        return status[1]
+    try:
+        (client or get_bigquery_client()).get_table(table_id)
+        deployed = True
+    except Exception as e:
+        deployed = not _is_not_found(e)  # anything else: let the query decide
+    _remember_mart(table_id, deployed)
+    return deployed
+
+
+def _remember_mart(table_id, deployed):
+    with _mart_status_lock:
+        _mart_status[table_id] = (time.monotonic(), deployed)
+
+
+def _load_mart(name, table_id, sql, fallback, client, parent):
+    with get_tracer().start_span(f"query.{name}", parent=parent, table=table_id) as span:
+        error = None
+        if _mart_deployed(table_id, client):
+            try:
+                df = _cache.get(name, table_id, lambda: run_bigquery_sql(sql, client=client), client)
+                return df.copy(deep=False)
+            except Exception as e:
+                _remember_mart(table_id, False)
+                error = type(e).__name__
+        # mart not deployed yet: derive the same rows from the KPI table,
+        # recomputed only when that table changes
+        span.set_attribute("mart.fallback", error or "NotFound")
+        kpis = load_kpis(client, parent=span)
+        df = _cache.get(f"{name}.fallback", KPI_TABLE, lambda: fallback(kpis), client)
+    return df.copy(deep=False)
+
+
+def load_headline(client=None, parent=None):
+    # one row: latest-month ROI, MoM, YoY, MER and best/worst service and city
+    return _load_mart("headline", HEADLINE_TABLE, HEADLINE_SQL, dashboard_headline, client, parent)
+
+
+def load_latest_pair_metrics(client=None, parent=None):
+    # one row per service-city pair for the latest month, with window metrics
+    def fallback(kpis):
+        metrics = window_metrics(kpis)
+        return metrics[metrics["is_latest_month"]].reset_index(drop=True)
+
+    return _load_mart("pair_metrics", WINDOW_METRICS_TABLE, LATEST_PAIR_METRICS_SQL, fallback, client, parent)
+
+
+def cache_stats():
+    return _cache.stats()
+
+
+def clear_cache():
+    _cache.invalidate()
+    with _mart_status_lock:
+        _mart_status.clear()
+
+
+# -----------------------------------------------------
+# CONCURRENT PAGE FETCH
+# -----------------------------------------------------
+_fetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="dashboard-fetch")
+
+
+def fetch_dashboard_data(client=None, parent=None):
+    """Start every Home.py dataset fetch at once.
+
+    Returns name -> Future of (DataFrame, seconds), for PageTimer.wait().
+    Each fetch is traced as a child of `parent` (the page span). Without a
+    `client`, the process-wide one is built on first use in the fetch
+    threads, and only if a dataset actually needs BigQuery.
+    """
+    loaders = {
+        "headline": load_headline,
+        "pair_metrics": load_latest_pair_metrics,
+        "kpis": load_kpis,
+        "forecasts": load_forecasts,
+    }
+    return {name: _fetch_pool.submit(timed_call, fn, client, parent) for name, fn in loaders.items()}
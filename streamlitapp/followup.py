@@ -0,0 +1,535 @@
+"""Follow-up questions answered from the previous result, without a new round trip.
+
+A Conversation (one per Streamlit session) keeps the last answer's SQL and
+its stored result (a result_store.ResultHandle: the rows on disk plus their
+column names and types). classify_followup() reads a follow-up such as
+
+    now only Mumbai              -> filter
+    sort that by margin          -> sort
+    top 5 by revenue             -> top-k
+    average roi by city          -> re-aggregate
+    pivot revenue by year        -> pivot
+    margin above 20, not Delhi   -> filters
+
+into a Refinement that runs in DuckDB over the stored result. It has to
+account for every word of the follow-up with the result's own columns
+(names and schema synonyms), its values, numbers and a small vocabulary of
+operations; anything else (a column or value the result does not have, a
+question that needs another table) goes to the full pipeline instead, with
+the earlier questions prepended so the model sees the context.
+"""
+import os
+import re
+from dataclasses import dataclass, field
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ParseError
+
+from schema_index import KEY_COLUMNS, tokenize
+
+
+FOLLOWUP_LOCAL = os.environ.get("BOT_FOLLOWUP_LOCAL", "1") == "1"
+# text columns with more distinct values than this are not matched against the question
+FOLLOWUP_MAX_VALUES = int(os.environ.get("BOT_FOLLOWUP_MAX_VALUES", "500"))
+FOLLOWUP_PIVOT_MAX_COLUMNS = int(os.environ.get("BOT_FOLLOWUP_PIVOT_MAX_COLUMNS", "36"))
+# earlier questions kept as context for a follow-up that needs new SQL
+FOLLOWUP_CONTEXT_TURNS = int(os.environ.get("BOT_FOLLOWUP_CONTEXT_TURNS", "4"))
+
+
+def _words(text):
+    # schema_index tokens, with "cities" -> "city" as well as "services" -> "service"
+    return [w[:-2] + "y" if w.endswith("ie") and len(w) > 4 else w for w in tokenize(text)]
+
+
+def _vocabulary(text):
+    return set(_words(text))
+
+
+# words that carry no operation of their own
+FILLER = _vocabulary(
+    "now only just show me that those these them it this the result results instead please "
+    "and or with in for of to a an same but can you could let see what about then again "
+    "list give data row rows table filter filtered keep where is are one ones all ok okay "
+    "i want would like do they look view display get from at be was were which first "
+    "what's whats there their"
+)
+SORT_WORDS = _vocabulary("sort sorted order ordered rank ranked arrange")
+DESC_WORDS = _vocabulary("desc descending highest largest biggest most top best decreasing")
+ASC_WORDS = _vocabulary("asc ascending lowest smallest least bottom worst increasing")
+BY_WORDS = _vocabulary("by per each across")
+GROUP_WORDS = _vocabulary("group grouped grouping break down breakdown split aggregate aggregated roll up")
+PIVOT_WORDS = _vocabulary("pivot pivoted pivoting")
+NEGATIONS = _vocabulary("not exclude excluding except without no")
+REFERENCES = _vocabulary("now that those these them it instead also too same previous above")
+FOLLOWUP_STARTS = _vocabulary(
+    "only just and but then sort order rank top bottom filter exclude excluding except without "
+    "pivot group break split per by average total"
+)
+AGGREGATES = {
+    **dict.fromkeys(_words("average avg mean"), "avg"),
+    **dict.fromkeys(_words("total sum"), "sum"),
+    **dict.fromkeys(_words("max maximum"), "max"),
+    **dict.fromkeys(_words("min minimum"), "min"),
+    **dict.fromkeys(_words("count"), "count"),
+}
+# column-name parts that say how a value was computed, not what it is
+GENERIC_PARTS = _vocabulary("avg sum total pct percent count num mean max min value amount")
+# measures that are ratios: averaged, never summed, when re-aggregated
+RATIO_PARTS = _vocabulary("pct percent rate ratio margin roi avg mean share utilization")
+TIME_PARTS = _vocabulary("year month quarter week")
+
+_TOP_K = re.compile(r"\b(top|bottom|first|highest|lowest|best|worst|largest|smallest)\s+(\d+)\b")
+_COMPARE = re.compile(
+    r"(?P<col>(?:[a-z][\w&]*\s+){0,4})(?:is\s+|are\s+)?"
+    r"(?P<op>>=|<=|!=|>|<|=|above|over|greater than|more than|higher than|at least|"
+    r"below|under|less than|lower than|at most|equal to|equals)"
+    r"\s*(?P<num>-?\d+(?:\.\d+)?)\s*%?"
+)
+_OPERATORS = {
+    "above": ">", "over": ">", "greater than": ">", "more than": ">", "higher than": ">",
+    "at least": ">=", "below": "<", "under": "<", "less than": "<", "lower than": "<",
+    "at most": "<=", "equal to": "=", "equals": "=",
+}
+
+
+# -----------------------------------------------------
+# REFINEMENT
+# -----------------------------------------------------
+@dataclass
+class Refinement:
+    """Operations on the previous result, applied in SQL order:
+    filter, then group or pivot, then sort, then limit."""
+    filters: list = field(default_factory=list)  # (column, op, value); op "in" / "not in" take a list
+    group_by: list = field(default_factory=list)
+    pivot: str = None
+    pivot_values: list = field(default_factory=list)
+    measures: list = field(default_factory=list)  # measures to aggregate (all when empty)
+    aggregate: str = None  # None: avg for ratios, sum otherwise
+    order_by: str = None
+    descending: bool = None
+    limit: int = None
+
+    def describe(self, handle):
+        parts = []
+        for column, op, value in self.filters:
+            if op in ("in", "not in"):
+                shown = ", ".join(str(v) for v in value)
+                parts.append(f"{'excluding' if op == 'not in' else 'only'} {column} = {shown}")
+            else:
+                parts.append(f"{column} {op} {value:g}")
+        measures = self.measures or [c for c in handle.numeric if not _is_dimension(c, handle)]
+        if self.pivot:
+            parts.append(f"{self.pivot} as columns ({self._aggregate(measures[0]).lower()} of {measures[0]})")
+        elif self.group_by:
+            shown = ["row count"] if self.aggregate == "count" else [self.output_name(m) for m in measures]
+            parts.append(f"{', '.join(shown)} by {', '.join(self.group_by)}")
+        if self.order_by:
+            parts.append(
+                f"sorted by {self.output_name(self.order_by)}" + (" (descending)" if self.descending else "")
+            )
+        if self.limit:
+            parts.append(f"first {self.limit} rows")
+        return "; ".join(parts)
+
+    def sql(self, handle):
+        """DuckDB query over the table `result` (see ResultStore.derive)."""
+        where = " AND ".join(_condition(*f) for f in self.filters)
+        where = f" WHERE {where}" if where else ""
+        measures = self.measures or [c for c in handle.numeric if not _is_dimension(c, handle)]
+
+        if self.pivot:
+            dims = self.group_by or [
+                c for c in handle.columns if _is_dimension(c, handle) and c != self.pivot
+            ]
+            measure = measures[0]
+            body = (
+                f"PIVOT (SELECT * FROM result{where}) ON {_quote(self.pivot)}"
+                f" IN ({', '.join(_literal(v) for v in self.pivot_values)})"
+                f" USING {self._aggregate(measure)}({_quote(measure)})"
+                + (f" GROUP BY {', '.join(map(_quote, dims))}" if dims else "")
+            )
+            query, output = f"SELECT * FROM ({body})", dims
+        elif self.group_by:
+            dims = ", ".join(map(_quote, self.group_by))
+            if self.aggregate == "count":
+                selected, output = "COUNT(*) AS row_count", self.group_by + ["row_count"]
+            else:
+                selected = ", ".join(
+                    f"{self._aggregate(m)}({_quote(m)}) AS {_quote(self.output_name(m))}" for m in measures
+                )
+                output = self.group_by + [self.output_name(m) for m in measures]
+            query = f"SELECT {dims}, {selected} FROM result{where} GROUP BY {dims}"
+        else:
+            query, output = f"SELECT * FROM result{where}", list(handle.columns)
+
+        order_by = self.output_name(self.order_by) if self.order_by else None
+        if order_by and order_by in output:
+            query += f" ORDER BY {_quote(order_by)} {'DESC' if self.descending else 'ASC'} NULLS LAST"
+        if self.limit:
+            query += f" LIMIT {int(self.limit)}"
+        return query
+
+    def output_name(self, column):
+        # a measure's column name after grouping, e.g. avg_roi_percent
+        if not self.group_by or column in self.group_by:
+            return column
+        if self.aggregate == "count":
+            return "row_count"
+        return f"{self._aggregate(column).lower()}_{column}"
+
+    def _aggregate(self, measure):
+        if self.aggregate and self.aggregate != "count":
+            return self.aggregate.upper()
+        return "AVG" if set(_words(measure)) & RATIO_PARTS else "SUM"
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _literal(value):
+    # values come from the stored result or the parsed question; rendered
+    # inline because DuckDB's PIVOT takes no parameters in its source
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _condition(column, op, value):
+    if op in ("in", "not in"):
+        return f"{_quote(column)} {op.upper()} ({', '.join(_literal(v) for v in value)})"
+    return f"{_quote(column)} {op} {_literal(value)}"
+
+
+def _is_dimension(column, handle):
+    return (
+        column in KEY_COLUMNS
+        or column not in handle.numeric
+        or bool(set(_words(column)) & TIME_PARTS)
+    )
+
+
+# -----------------------------------------------------
+# CLASSIFIER
+# -----------------------------------------------------
+def _column_phrases(handle, synonyms):
+    """column -> [(phrase tuple, weight)]: name parts beat schema synonyms."""
+    phrases = {}
+    schema_parts = {
+        name: tuple(w for w in _words(name) if w not in GENERIC_PARTS) for name in synonyms or {}
+    }
+    for column in handle.columns:
+        parts = tuple(w for w in _words(column) if w not in GENERIC_PARTS) or tuple(_words(column))
+        found = {tuple(_words(column)): 2}
+        found.setdefault(parts, 2)
+        for part in parts:
+            found.setdefault((part,), 2)
+        for name, terms in (synonyms or {}).items():
+            if name == column or (parts and schema_parts[name] == parts):
+                for term in terms or []:
+                    phrase = tuple(_words(term))
+                    if phrase:
+                        found.setdefault(phrase, 1)
+        phrases[column] = list(found.items())
+    return phrases
+
+
+def _value_phrases(handle, store):
+    """phrase tuple -> [(column, value)] for low-cardinality dimension columns."""
+    phrases = {}
+    for column in handle.columns:
+        if not _is_dimension(column, handle):
+            continue
+        if column in handle.numeric and "year" not in _words(column):
+            continue  # months and the like are too easy to hit with a stray number
+        values = store.distinct(handle, column, FOLLOWUP_MAX_VALUES)
+        for value in values or []:
+            if not isinstance(value, (str, int)) or isinstance(value, bool):
+                continue
+            phrase = tuple(_words(str(value)))
+            if phrase:
+                phrases.setdefault(phrase, []).append((column, value))
+    return phrases
+
+
+def _longest(words, used, start, phrases):
+    # longest phrase in `phrases` (a dict keyed by tuples) starting at `start`
+    best = None
+    for length in range(min(6, len(words) - start), 0, -1):
+        if any(used[start:start + length]):
+            continue
+        phrase = tuple(words[start:start + length])
+        if phrase in phrases:
+            best = (phrase, length)
+            break
+    return best
+
+
+def _match_column(words, used, start, column_phrases, only=None):
+    """(column, length) of the best column phrase at `start`, or None."""
+    best = None
+    for column, phrases in column_phrases.items():
+        if only is not None and column not in only:
+            continue
+        for phrase, weight in phrases:
+            length = len(phrase)
+            if tuple(words[start:start + length]) != phrase or any(used[start:start + length]):
+                continue
+            score = (length * weight, -list(column_phrases).index(column))
+            if best is None or score > best[0]:
+                best = (score, column, length)
+    return (best[1], best[2]) if best else None
+
+
+def is_followup(question):
+    # short, or refers back to the last answer ("that", "now", "instead") or starts with an operation
+    words = _words(question)
+    return (
+        len(words) <= 4
+        or bool(set(words) & REFERENCES)
+        or (bool(words) and words[0] in FOLLOWUP_STARTS)
+        or question.lower().lstrip().startswith(("what about", "how about"))
+    )
+
+
+def classify_followup(question, turn, store, synonyms=None):
+    """Return (Refinement, None) when `question` can be answered from `turn`'s
+    result, else (None, reason)."""
+    if turn is None or turn.handle is None:
+        return None, "no previous result"
+    if not is_followup(question):
+        return None, "not a follow-up"
+    if not turn.complete:
+        return None, "previous result was capped"
+
+    handle = turn.handle
+    column_phrases = _column_phrases(handle, synonyms)
+    dimensions = [c for c in handle.columns if _is_dimension(c, handle)]
+    measures = [c for c in handle.columns if c not in dimensions]
+    refinement = Refinement()
+    text = " " + question.lower() + " "
+
+    # -- top-k and numeric comparisons, read from the raw text (they need symbols and decimals)
+    match = _TOP_K.search(text)
+    if match:
+        refinement.limit = int(match.group(2))
+        if match.group(1) != "first":
+            refinement.descending = match.group(1) in ("top", "highest", "best", "largest")
+        text = text[:match.start()] + " " + text[match.end():]
+
+    for match in reversed(list(_COMPARE.finditer(text))):
+        words = match.group("col").split()
+        column = None
+        for k in range(len(words), 0, -1):
+            tail = _words(" ".join(words[-k:]))
+            found = _match_column(tail, [False] * len(tail), 0, column_phrases, only=handle.numeric)
+            if found and found[1] == len(tail):
+                column = found[0]
+                break
+        if column is None:
+            return None, f"no column for '{match.group(0).strip()}'"
+        op = _OPERATORS.get(match.group("op"), match.group("op"))
+        refinement.filters.append((column, op, float(match.group("num"))))
+        text = text[:match.start()] + " " + " ".join(words[:-k]) + " " + text[match.end():]
+
+    # -- the rest, word by word
+    words = _words(text)
+    used = [False] * len(words)
+    value_phrases = _value_phrases(handle, store)
+    values = {}  # (column, negated) -> [values]
+    previous = None  # (end, negated) of the last value, so "not Delhi or Pune" negates both
+    for i in range(len(words)):
+        found = _longest(words, used, i, value_phrases)
+        if not found:
+            continue
+        phrase, length = found
+        column, value = value_phrases[phrase][0]
+        negated = False
+        for j in (i - 1, i - 2):
+            if j >= 0 and words[j] in NEGATIONS:
+                used[j] = negated = True
+                break
+        if not negated and previous and all(w in ("and", "or") for w in words[previous[0]:i]):
+            negated = previous[1]
+        values.setdefault((column, negated), []).append(value)
+        used[i:i + length] = [True] * length
+        previous = (i + length, negated)
+
+    by_columns, mentions = [], []  # (position, column)
+    sort_at = pivot_at = None
+    for i, word in enumerate(words):
+        if used[i]:
+            continue
+        if word in SORT_WORDS:
+            sort_at = i
+        elif word in PIVOT_WORDS:
+            pivot_at = i
+        elif word == "column" and i and words[i - 1] in ("as", "into"):
+            pivot_at = i
+            used[i - 1] = True
+        elif word in AGGREGATES:
+            refinement.aggregate = AGGREGATES[word]
+        elif word in DESC_WORDS:
+            refinement.descending = True
+        elif word in ASC_WORDS:
+            refinement.descending = False
+        elif word in GROUP_WORDS:
+            pass
+        elif word in BY_WORDS or (word == "on" and pivot_at is not None):
+            found = _match_column(words, used, i + 1, column_phrases)
+            if not found:
+                continue  # a dangling "by" is left for the leftover check
+            by_columns.append((i, found[0]))
+            used[i + 1:i + 1 + found[1]] = [True] * found[1]
+        else:
+            found = _match_column(words, used, i, column_phrases)
+            if not found:
+                continue
+            mentions.append((i, found[0]))
+            used[i:i + found[1]] = [True] * found[1]
+            continue
+        used[i] = True
+
+    leftover = [w for w, u in zip(words, used) if not u and w not in FILLER]
+    if leftover:
+        return None, f"not in the previous result: {' '.join(leftover)}"
+
+    for (column, negated), listed in values.items():
+        refinement.filters.append((column, "not in" if negated else "in", list(dict.fromkeys(listed))))
+
+    # -- roles of the columns that were named
+    referenced = sorted(by_columns + mentions)
+    if pivot_at is not None:
+        candidates = [(abs(i - pivot_at), c) for i, c in referenced if c in dimensions]
+        if not candidates:
+            return None, "nothing to pivot on"
+        refinement.pivot = min(candidates)[1]
+        pivot_values = store.distinct(handle, refinement.pivot, FOLLOWUP_PIVOT_MAX_COLUMNS)
+        if not pivot_values:
+            return None, f"too many {refinement.pivot} values to pivot"
+        try:
+            refinement.pivot_values = sorted(pivot_values)
+        except TypeError:
+            # mixed types (or NULL) have no native order
+            refinement.pivot_values = sorted(pivot_values, key=str)
+
+    for i, column in by_columns:
+        if column == refinement.pivot:
+            continue
+        if sort_at is not None and i > sort_at and refinement.order_by is None:
+            refinement.order_by = column
+        elif column in dimensions:
+            refinement.group_by.append(column)
+        elif refinement.order_by is None:
+            refinement.order_by = column
+    for i, column in mentions:
+        if column == refinement.pivot:
+            continue
+        if sort_at is not None and i > sort_at and refinement.order_by is None:
+            refinement.order_by = column
+        elif column in measures:
+            refinement.measures.append(column)
+        elif refinement.limit or refinement.aggregate:
+            refinement.group_by.append(column)  # "top 5 cities", "total revenue ... each city"
+        else:
+            return None, f"unclear what to do with {column}"
+
+    refinement.group_by = list(dict.fromkeys(refinement.group_by))
+    refinement.measures = list(dict.fromkeys(refinement.measures))
+    if refinement.aggregate and not (refinement.group_by or refinement.pivot):
+        return None, "aggregate without a grouping column"
+    if refinement.pivot and not (refinement.measures or measures):
+        return None, "no measure to pivot"
+
+    if refinement.order_by is None and (refinement.limit and refinement.descending is not None):
+        # "top 5": by the first measure named, or the result's first measure
+        candidates = refinement.measures or measures
+        if not candidates:
+            return None, "nothing to rank by"
+        refinement.order_by = candidates[0]
+    elif refinement.order_by is None and refinement.descending is not None and not refinement.limit:
+        return None, "sort direction without a column"
+    if refinement.order_by and refinement.descending is None:
+        refinement.descending = refinement.order_by in measures
+
+    if not (refinement.filters or refinement.group_by or refinement.pivot
+            or refinement.order_by or refinement.limit):
+        return None, "no refinement found"
+    if refinement.order_by and (refinement.group_by or refinement.pivot):
+        if refinement.order_by in measures and refinement.order_by not in (refinement.measures or measures):
+            refinement.measures.append(refinement.order_by)
+    return refinement, None
+
+
+# -----------------------------------------------------
+# CONVERSATION STATE
+# -----------------------------------------------------
+@dataclass
+class Turn:
+    questions: tuple  # this question, after up to FOLLOWUP_CONTEXT_TURNS - 1 earlier ones
+    sql: str
+    handle: object  # result_store.ResultHandle
+    complete: bool  # every row of the query, not a capped prefix
+    refinement: str = None
+
+
+def _row_cap(sql, dialect):
+    """Rows the top-level query stops at: its LIMIT, None without one, 0 (always
+    capped) with an OFFSET or when the SQL cannot be read."""
+    try:
+        tree = sqlglot.parse_one(sql, read=dialect)
+    except ParseError:
+        return 0
+    if tree.args.get("offset") is not None:
+        return 0
+    limit = tree.args.get("limit")
+    if limit is None:
+        return None
+    value = limit.expression
+    return int(value.name) if isinstance(value, exp.Literal) and value.name.isdigit() else 0
+
+
+class Conversation:
+    """The questions of one session; the last turn is what follow-ups refine."""
+
+    def __init__(self):
+        self.turns = []
+
+    @property
+    def last(self):
+        return self.turns[-1] if self.turns else None
+
+    def context(self, question):
+        # a follow-up continues the last turn's questions; anything else starts afresh
+        if not self.turns or not is_followup(question):
+            return (question,)
+        return (self.last.questions + (question,))[-FOLLOWUP_CONTEXT_TURNS:]
+
+    def standalone(self, question):
+        """The question as the full pipeline should see it: a follow-up
+        gets the earlier questions in front."""
+        return " Then: ".join(self.context(question))
+
+    def record(self, question, result, row_limit=None):
+        """Keep a finished pipeline result (nlp_engine's result dict) as the new last turn."""
+        if result["error"] or result["result_handle"] is None:
+            return
+        handle = result["result_handle"]
+        # a top-5 query that returned 5 rows may have more behind its LIMIT
+        cap = _row_cap(result["sql"], "duckdb" if result.get("refinement") else "bigquery")
+        complete = (
+            not result.get("truncated")
+            and (row_limit is None or handle.rows < row_limit)
+            and (cap is None or handle.rows < cap)
+        )
+        if result.get("refinement"):
+            complete = complete and bool(self.last and self.last.complete)
+        self.turns.append(Turn(self.context(question), result["sql"], handle, complete,
+                               result.get("refinement")))
+        del self.turns[:-FOLLOWUP_CONTEXT_TURNS]
+
+    def reset(self):
+        self.turns = []
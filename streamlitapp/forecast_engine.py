@@ -0,0 +1,294 @@
+"""Local forecasts for the lifecycle mini-forecast, fitted from the KPI table.
+
+Every service-city series of a measure is a row of one (series x months)
+array, and each model is a recursion along the month axis that runs for all
+series and all candidate parameters at once. Per series, two models are
+fitted with additive errors:
+
+    damped    Holt's linear trend with a damped slope, ETS(A,Ad,N)
+    seasonal  the same on the series minus a fixed calendar-month profile,
+              tried when there are at least two seasons of history
+
+The smoothing parameters are the grid point with the smallest in-sample
+one-step error, and the model with the lower AIC is kept. Intervals use the
+ETS(A,Ad,N) forecast variance. forecast_table() returns rows shaped like
+`analytics.monthly_service_kpis_forecasts`, with `_lower` / `_upper` columns.
+"""
+import multiprocessing
+import os
+import threading
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from kpi_cube import KpiCube
+
+
+FORECAST_HORIZON = int(os.environ.get("FORECAST_HORIZON_MONTHS", "3"))
+# months of actuals, with their in-sample fit, kept before the horizon (as in the table)
+FORECAST_HISTORY = int(os.environ.get("FORECAST_HISTORY_MONTHS", "6"))
+FORECAST_SEASON = int(os.environ.get("FORECAST_SEASON_MONTHS", "12"))
+FORECAST_INTERVAL = float(os.environ.get("FORECAST_INTERVAL", "0.8"))
+# series fitted together; memory is about chunk x grid x 8 bytes per state array
+FORECAST_CHUNK_SERIES = int(os.environ.get("FORECAST_CHUNK_SERIES", "4000"))
+# portfolios with at least this many series are fitted in a process pool (0 = never)
+FORECAST_POOL_MIN_SERIES = int(os.environ.get("FORECAST_POOL_MIN_SERIES", "20000"))
+FORECAST_WORKERS = int(os.environ.get("FORECAST_WORKERS", "0")) or os.cpu_count() or 1
+
+# KPI measures forecast; the table's columns are forecasted_<measure> / actual_<measure>
+FORECAST_MEASURES = ["profit_margin_pct", "roi_percent"]
+# fewer points than this get no forecast
+MIN_POINTS = 3
+# points used for a series' starting level and slope
+INIT_POINTS = 6
+
+ALPHAS = (0.05, 0.2, 0.4, 0.6, 0.8, 0.95)
+BETAS = (0.0, 0.05, 0.15, 0.3)  # slope smoothing, as a fraction of alpha
+PHIS = (0.8, 0.9, 0.98)
+_GRID = np.array(list(product(ALPHAS, BETAS, PHIS))).T  # (alpha, beta, phi) x grid points
+
+
+# -----------------------------------------------------
+# MODELS
+# -----------------------------------------------------
+def _ols(y, mask, t):
+    """Per-row least-squares (intercept, slope) of y on t over the masked points."""
+    n = mask.sum(axis=1)
+    tt = np.where(mask, t, 0.0)
+    yy = np.where(mask, y, 0.0)
+    st, sy = tt.sum(axis=1), yy.sum(axis=1)
+    denom = n * (tt * tt).sum(axis=1) - st * st
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = np.where(denom > 0, (n * (tt * yy).sum(axis=1) - st * sy) / denom, 0.0)
+        intercept = np.where(n > 0, (sy - slope * st) / n, np.nan)
+    return intercept, slope
+
+
+def _seasonal_profile(y, valid, t, calendar, season):
+    """(series x season) mean residual from each series' linear trend per calendar month, centred on 0."""
+    intercept, slope = _ols(y, valid, t)
+    residual = y - (intercept[:, None] + slope[:, None] * t)
+    profile = np.zeros((len(y), season))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # a month with no points gives NaN
+        for position in range(season):
+            columns = calendar == position
+            if columns.any():
+                profile[:, position] = np.nanmean(residual[:, columns], axis=1)
+        profile -= np.nanmean(profile, axis=1, keepdims=True)
+    return np.nan_to_num(profile)
+
+
+def _smooth(y, start, level0, slope0, alpha, beta, phi, keep_fitted=False):
+    """Damped-trend exponential smoothing for every row of y and every parameter column.
+
+    Each row starts at its first point (`start`) with the given level and
+    slope; missing months advance the state without an update. Returns
+    (sse, level, slope, fitted): state after the last month, and with
+    keep_fitted the one-step-ahead predictions (first parameter column).
+    """
+    rows, months = y.shape
+    shape = np.broadcast_shapes((rows, 1), np.shape(alpha))
+    level = np.full(shape, np.nan)
+    slope = np.full(shape, np.nan)
+    sse = np.zeros(shape)
+    fitted = np.full((rows, months), np.nan) if keep_fitted else None
+
+    for t in range(months):
+        starting = (start == t)[:, None]
+        if starting.any():
+            # the first prediction is the initial fit at that month
+            level = np.where(starting, level0[:, None] - phi * slope0[:, None], level)
+            slope = np.where(starting, slope0[:, None], slope)
+        prediction = level + phi * slope
+        error = y[:, t, None] - prediction
+        error = np.where(np.isnan(error), 0.0, error)
+        sse += error * error
+        level = prediction + alpha * error
+        slope = phi * slope + alpha * beta * error
+        if keep_fitted:
+            fitted[:, t] = prediction[:, 0]
+    return sse, level, slope, fitted
+
+
+def fit_series(values, first_month, horizon=FORECAST_HORIZON, season=FORECAST_SEASON,
+               interval=FORECAST_INTERVAL):
+    """Fit every row of `values` (series x months, NaN = missing) and forecast
+    `horizon` months past the last column.
+
+    `first_month` is the kpi_cube.month_index of column 0 (for the calendar
+    month of each column). Returns a dict of per-series arrays: `fitted`
+    (series x months, one-step-ahead), `forecast`, `lower` and `upper`
+    (series x horizon), `sigma` and `model` ("damped", "seasonal", or ""
+    with fewer than MIN_POINTS points and no forecast).
+    """
+    y = np.asarray(values, dtype=np.float64)
+    rows, months = y.shape
+    t = np.arange(months, dtype=np.float64)
+    valid = ~np.isnan(y)
+    n = valid.sum(axis=1)
+    start = np.where(n > 0, valid.argmax(axis=1), -1)
+    calendar = (first_month + np.arange(months + horizon)) % season
+
+    profile = _seasonal_profile(y, valid, t, calendar[:months], season)
+    seasonal_rows = n >= 2 * season
+    variants = [("damped", np.zeros_like(profile), 5)]
+    if seasonal_rows.any():
+        variants.append(("seasonal", profile, 5 + season - 1))
+
+    # -- grid search per variant, then the lower AIC per series
+    alpha, beta, phi = (g[None, :] for g in _GRID)
+    init = valid & (np.cumsum(valid, axis=1) <= INIT_POINTS)
+    best_aic = np.full(rows, np.inf)
+    use_seasonal = np.zeros(rows, dtype=bool)
+    pick, level0, slope0 = np.zeros(rows, dtype=int), np.zeros(rows), np.zeros(rows)
+    for name, shape, n_params in variants:
+        series = y - shape[:, calendar[:months]]
+        intercept, slope = _ols(series, init, t)
+        level = intercept + slope * start
+        sse, _, _, _ = _smooth(series, start, level, slope, alpha, beta, phi)
+        best = sse.argmin(axis=1)
+        sse = sse[np.arange(rows), best]
+        aic = n * np.log(np.maximum(sse / np.maximum(n, 1), 1e-12)) + 2 * n_params
+        if name == "seasonal":
+            aic = np.where(seasonal_rows, aic, np.inf)
+
+        better = aic < best_aic
+        best_aic = np.where(better, aic, best_aic)
+        use_seasonal = np.where(better, name == "seasonal", use_seasonal)
+        pick = np.where(better, best, pick)
+        level0 = np.where(better, level, level0)
+        slope0 = np.where(better, slope, slope0)
+
+    # -- one more pass with each series' own parameters for the fit and final state
+    alpha, beta, phi = (g[pick][:, None] for g in _GRID)
+    seasonal_part = np.where(use_seasonal[:, None], profile, 0.0)[:, calendar]
+    sse, level, slope, fitted = _smooth(
+        y - seasonal_part[:, :months], start, level0, slope0, alpha, beta, phi, keep_fitted=True,
+    )
+    fitted += seasonal_part[:, :months]
+    sigma = np.sqrt(sse[:, 0] / np.maximum(n, 1))
+
+    # -- forecasts, counted from each series' last point
+    steps = np.arange(1, horizon + 1)
+    damping = np.cumsum(phi ** steps, axis=1)  # phi + ... + phi^h
+    forecast = level + damping * slope + seasonal_part[:, months:]
+
+    last = months - 1 - valid[:, ::-1].argmax(axis=1)
+    ahead = (months - 1 - last)[:, None] + steps  # a series that ended early is further out
+    longest = int(ahead.max()) if ahead.size else 1
+    phi_j = np.cumsum(phi ** np.arange(1, longest), axis=1)
+    c_squared = (alpha * (1 + beta * phi_j)) ** 2
+    spread = np.concatenate([np.zeros((rows, 1)), np.cumsum(c_squared, axis=1)], axis=1)
+    variance = sigma[:, None] ** 2 * (1 + np.take_along_axis(spread, ahead - 1, axis=1))
+    z = NormalDist().inv_cdf(0.5 + interval / 2)
+    half_width = z * np.sqrt(variance)
+
+    enough = n >= MIN_POINTS
+    forecast[~enough] = np.nan
+    fitted[~enough] = np.nan
+    return {
+        "fitted": fitted,
+        "forecast": forecast,
+        "lower": forecast - half_width,
+        "upper": forecast + half_width,
+        "sigma": np.where(enough, sigma, np.nan),
+        "model": np.where(enough, np.where(use_seasonal, "seasonal", "damped"), ""),
+    }
+
+
+# -----------------------------------------------------
+# CHUNKS AND THE PROCESS POOL
+# -----------------------------------------------------
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def get_forecast_pool(workers=FORECAST_WORKERS):
+    # spawned rather than forked: the app process runs threads (Streamlit, gRPC)
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def forecast_series(values, first_month, horizon=FORECAST_HORIZON, season=FORECAST_SEASON,
+                    interval=FORECAST_INTERVAL, workers=None):
+    """fit_series() in chunks of FORECAST_CHUNK_SERIES rows, over the process
+    pool once there are FORECAST_POOL_MIN_SERIES rows or more."""
+    values = np.asarray(values, dtype=np.float64)
+    workers = FORECAST_WORKERS if workers is None else workers
+    pooled = workers > 1 and 0 < FORECAST_POOL_MIN_SERIES <= len(values)
+    size = FORECAST_CHUNK_SERIES
+    if pooled:
+        size = min(size, -(-len(values) // workers))
+    chunks = [values[i:i + size] for i in range(0, len(values), size)] or [values]
+
+    args = (first_month, horizon, season, interval)
+    if pooled and len(chunks) > 1:
+        pool = get_forecast_pool(workers)
+        parts = list(pool.map(fit_series, chunks, *([arg] * len(chunks) for arg in args)))
+    else:
+        parts = [fit_series(chunk, *args) for chunk in chunks]
+    return {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+
+
+# -----------------------------------------------------
+# FORECAST TABLE
+# -----------------------------------------------------
+def forecast_table(kpi_df, horizon=FORECAST_HORIZON, history_months=FORECAST_HISTORY,
+                   interval=FORECAST_INTERVAL, workers=None):
+    """Rows like `monthly_service_kpis_forecasts`, fitted from the KPI rows.
+
+    Per pair: its last `history_months` months with actuals (and the
+    in-sample forecast), then `horizon` months after the latest month in
+    the data, sorted by service_category, city, ds. Each forecasted_<measure>
+    also has _lower / _upper bounds of the `interval` prediction interval
+    on the horizon rows.
+    """
+    cube = KpiCube.from_frame(kpi_df, FORECAST_MEASURES)
+    months = cube.n_months
+    keep = cube.present.reshape(-1, months).any(axis=1)
+    pairs = cube.pairs()[keep].reset_index(drop=True)
+    first = max(months - history_months, 0)
+    span = months - first + horizon
+    starts = cube.month_starts()
+    ds = starts[first:].append(
+        pd.date_range(starts[-1] + pd.DateOffset(months=1), periods=horizon, freq="MS")
+    )
+
+    out = {
+        "service_category": np.repeat(pairs["service_category"].to_numpy(), span),
+        "city": np.repeat(pairs["city"].to_numpy(), span),
+        "ds": np.tile(ds.to_numpy(), len(pairs)),
+    }
+    gaps = np.full((len(pairs), horizon), np.nan)
+    history = np.full((len(pairs), months - first), np.nan)
+    observed = np.zeros((len(pairs), span), dtype=bool)
+    forecasted = np.zeros((len(pairs), span), dtype=bool)
+    bounds = {}
+    for measure in FORECAST_MEASURES:
+        values = cube[measure].reshape(-1, months)[keep].astype(np.float64)
+        fit = forecast_series(values, cube.first_month, horizon, interval=interval, workers=workers)
+        actual = np.concatenate([values[:, first:], gaps], axis=1)
+        predicted = np.concatenate([fit["fitted"][:, first:], fit["forecast"]], axis=1)
+        out[f"forecasted_{measure}"] = predicted.ravel()
+        out[f"actual_{measure}"] = actual.ravel()
+        bounds[f"forecasted_{measure}_lower"] = np.concatenate([history, fit["lower"]], axis=1).ravel()
+        bounds[f"forecasted_{measure}_upper"] = np.concatenate([history, fit["upper"]], axis=1).ravel()
+        observed |= ~np.isnan(actual)
+        forecasted[:, months - first:] |= ~np.isnan(fit["forecast"])
+
+    out.update(bounds)
+    table = pd.DataFrame(out)
+    # history months the pair had no row for, and pairs too short to forecast
+    return table[(observed | forecasted).ravel()].reset_index(drop=True)
@@ -0,0 +1,221 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pandas as pd
+
+from llm_gateway import get_gateway
+from rate_limit import TokenBucket
+from tracing import get_tracer, record_cache, record_llm_usage
+
+
+INSIGHT_CACHE_TTL_SECONDS = float(os.environ.get("INSIGHT_CACHE_TTL_SECONDS", str(6 * 3600)))
+INSIGHT_CACHE_MAX_ENTRIES = int(os.environ.get("INSIGHT_CACHE_MAX_ENTRIES", "256"))
+INSIGHT_MAX_WORKERS = int(os.environ.get("INSIGHT_MAX_WORKERS", "4"))
+INSIGHT_RATE_PER_MINUTE = float(os.environ.get("INSIGHT_RATE_PER_MINUTE", "30"))
+INSIGHT_PRECOMPUTE_PAIRS = int(os.environ.get("INSIGHT_PRECOMPUTE_PAIRS", "5"))
+# how long a page render waits for still-pending insights before giving up
+INSIGHT_WAIT_SECONDS = float(os.environ.get("INSIGHT_WAIT_SECONDS", "60"))
+
+
+# -----------------------------------------------------
+# GEMINI (initialized on first use, not at import)
+# -----------------------------------------------------
+_gemini = None
+_gemini_lock = threading.Lock()
+
+
+def get_gemini():
+    global _gemini
+    with _gemini_lock:
+        if _gemini is None:
+            import vertexai
+            from vertexai.generative_models import GenerativeModel
+
+            vertexai.init(project="nonhospitality-bi", location="us-central1")
+            _gemini = GenerativeModel("gemini-2.0-flash")
+        return _gemini
+
+
+_insight_gateway = get_gateway("gemini.insight")
+
+
+# -----------------------------------------------------
+# AI INSIGHT GENERATOR (SHORT + BULLET POINTS)
+# -----------------------------------------------------
+def generate_ai_insight(service, city, roi_value, trend, mom, yoy, revenue_drop, margin_drop):
+    prompt = f"""
+You are a senior revenue optimization analyst.
+
+Provide a VERY SHORT business insight for the weakest service–city pair.
+STRICT: 5 bullet points, each max 12 words.
+
+Context:
+- Service: {service}
+- City: {city}
+- Avg ROI (3M): {roi_value:.2f}%
+- ROI Trend: {trend}
+- MoM ROI: {mom:.2f}%
+- YoY ROI: {yoy:.2f}%
+- Revenue Drop: {revenue_drop:.2f}
+- Margin Drop: {margin_drop:.2f}
+
+Deliver EXACTLY:
+1. Root cause hint
+2. Operational bottleneck
+3. Pricing/demand issue
+4. Quick action
+5. Risk if not fixed
+
+Tone: Sharp, diagnostic, no long paragraphs.
+"""
+    response = _insight_gateway.call(lambda: get_gemini().generate_content(prompt))
+    record_llm_usage(response, "insight")
+    return response.text
+
+
+# -----------------------------------------------------
+# INPUTS FOR THE N WEAKEST PAIRS
+# -----------------------------------------------------
+def weakest_pair_inputs(latest_metrics, n=INSIGHT_PRECOMPUTE_PAIRS):
+    """(service, city, roi, trend, mom, yoy, revenue_drop, margin_drop) per weak pair.
+
+    `latest_metrics` holds the latest-month rows of the KPI window-metrics
+    mart (one per pair), which already carry the 3-month ROI average and
+    the month-over-month and year-over-year deltas.
+    """
+    weakest = latest_metrics.sort_values("roi_3m_avg", kind="mergesort").head(n)
+
+    def value(v):
+        return 0.0 if pd.isna(v) else float(v)
+
+    inputs = []
+    for row in weakest.itertuples(index=False):
+        mom = value(row.roi_mom)
+        inputs.append((
+            row.service_category,
+            row.city,
+            float(row.roi_3m_avg),
+            "Upward" if mom > 0 else "Declining",
+            mom,
+            value(row.roi_yoy),
+            value(row.revenue_mom),
+            value(row.margin_mom),
+        ))
+    return inputs
+
+
+# -----------------------------------------------------
+# CACHED, BACKGROUND INSIGHT SERVICE
+# -----------------------------------------------------
+def insight_key(inputs):
+    # numbers are rounded the way the prompt formats them
+    return tuple(round(v, 2) if isinstance(v, float) else v for v in inputs)
+
+
+class InsightService:
+    """Caches insights per input tuple and computes missing ones in the background.
+
+    Calls go through a bounded thread pool and a token bucket so a page that
+    asks for many pairs cannot exceed the Gemini quota.
+    """
+
+    def __init__(self, generate=generate_ai_insight, ttl_seconds=INSIGHT_CACHE_TTL_SECONDS,
+                 max_entries=INSIGHT_CACHE_MAX_ENTRIES, max_workers=INSIGHT_MAX_WORKERS,
+                 rate_per_minute=INSIGHT_RATE_PER_MINUTE):
+        self.generate = generate
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._limiter = TokenBucket.per_minute(rate_per_minute, burst=max_workers)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="insight")
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "generated": 0, "failed": 0}
+
+    def get(self, inputs):
+        key = insight_key(inputs)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and time.time() - entry[1] < self.ttl_seconds:
+                self._cache.move_to_end(key)
+                self._stats["hits"] += 1
+                hit = entry[0]
+            else:
+                self._stats["misses"] += 1
+                hit = None
+        record_cache("insight", hit is not None)
+        return hit
+
+    def submit(self, inputs, parent=None):
+        """Return a Future for the insight; cached or in-flight work is reused.
+
+        A newly started generation is traced under `parent` (e.g. the page span).
+        """
+        key = insight_key(inputs)
+        cached = self.get(inputs)
+        if cached is not None:
+            done = Future()
+            done.set_result(cached)
+            return done
+
+        with self._lock:
+            # _run may have cached the text and left _pending since get() looked
+            entry = self._cache.get(key)
+            if entry is not None and time.time() - entry[1] < self.ttl_seconds:
+                done = Future()
+                done.set_result(entry[0])
+                return done
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pool.submit(self._run, key, inputs, parent)
+                self._pending[key] = future
+            return future
+
+    def precompute(self, inputs_list, parent=None):
+        return [(inputs, self.submit(inputs, parent)) for inputs in inputs_list]
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out["entries"] = len(self._cache)
+            out["pending"] = len(self._pending)
+        return out
+
+    def _run(self, key, inputs, parent=None):
+        try:
+            with get_tracer().start_span(
+                "insight_generation", parent=parent or False, service=inputs[0], city=inputs[1]
+            ) as span:
+                started = time.monotonic()
+                self._limiter.acquire()
+                span.set_attribute("rate_limit_wait_ms", round((time.monotonic() - started) * 1000, 1))
+                text = self.generate(*inputs)
+        except Exception:
+            with self._lock:
+                self._stats["failed"] += 1
+                self._pending.pop(key, None)
+            raise
+
+        with self._lock:
+            self._cache[key] = (text, time.time())
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+            self._pending.pop(key, None)
+            self._stats["generated"] += 1
+        return text
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_insight_service():
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = InsightService()
+        return _service
@@ -0,0 +1,229 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+
+PAIR_KEYS = ["service_category", "city"]
+AXES = {"service": 0, "city": 1, "month": 2}
+
+DEFAULT_MEASURES = [
+    "roi_percent", "profit_margin_pct", "total_revenue",
+    "marketing_spend_month", "total_guest_count",
+]
+
+
+def month_index(year, month):
+    # consecutive integer per calendar month (year * 12 + month - 1)
+    return np.asarray(year, dtype=np.int64) * 12 + np.asarray(month, dtype=np.int64) - 1
+
+
+def _axes(axis):
+    names = (axis,) if isinstance(axis, str) else tuple(axis)
+    return tuple(AXES[name] for name in names)
+
+
+# -----------------------------------------------------
+# CUBE
+# -----------------------------------------------------
+class KpiCube:
+    """KPI measures as dense float64 arrays indexed by (service, city, month).
+
+    Services and cities are categorical codes (positions in `services` and
+    `cities`, sorted); months run consecutively from `first_month`, a
+    `month_index` value. Missing cells are NaN and `present` marks the cells
+    that had a row. A cube built by `from_frame` keeps `row_cells`, the
+    (service, city, month) codes of each source row. Picking a pair or a
+    month returns a view, so slicing is O(1) instead of a boolean mask over
+    the long frame; the operators below work on whole arrays at once.
+    """
+
+    def __init__(self, services, cities, first_month, measures, present, row_cells=None):
+        self.services = pd.Index(services)
+        self.cities = pd.Index(cities)
+        self.first_month = int(first_month)
+        self.measures = measures
+        self.present = present
+        self.row_cells = row_cells
+        self.shape = present.shape
+        self._service_codes = {s: i for i, s in enumerate(self.services)}
+        self._city_codes = {c: i for i, c in enumerate(self.cities)}
+
+    @classmethod
+    def from_frame(cls, df, measures=None):
+        """Build from a long frame with service_category, city, year, month.
+
+        Duplicate (service, city, month) rows keep the last value. Values
+        stay float64: float32 loses cents on revenue totals.
+        """
+        if measures is None:
+            measures = [m for m in DEFAULT_MEASURES if m in df.columns]
+
+        services = pd.Categorical(df["service_category"])
+        cities = pd.Categorical(df["city"])
+        months = month_index(df["year"], df["month"])
+        first = int(months.min()) if len(months) else 0
+        n_months = int(months.max()) - first + 1 if len(months) else 0
+
+        shape = (len(services.categories), len(cities.categories), n_months)
+        cell = (services.codes, cities.codes, months - first)
+
+        # NumPy does not say which of several writes to one cell wins, so
+        # scatter only the last row per cell (row_cells still covers every row)
+        last = ~df.duplicated(["service_category", "city", "year", "month"], keep="last").to_numpy()
+        unique = tuple(codes[last] for codes in cell)
+
+        present = np.zeros(shape, dtype=bool)
+        present[unique] = True
+        arrays = {}
+        for name in measures:
+            values = np.full(shape, np.nan, dtype=np.float64)
+            values[unique] = df[name].to_numpy(dtype=np.float64, na_value=np.nan)[last]
+            arrays[name] = values
+
+        return cls(services.categories, cities.categories, first, arrays, present, cell)
+
+    # -------------------------------------------------
+    # lookup and slicing
+    # -------------------------------------------------
+    @property
+    def n_months(self):
+        return self.shape[2]
+
+    def __getitem__(self, measure):
+        return self.measures[measure]
+
+    def __contains__(self, measure):
+        return measure in self.measures
+
+    def code(self, service=None, city=None):
+        if service is not None and city is not None:
+            return self._service_codes[service], self._city_codes[city]
+        return self._service_codes[service] if service is not None else self._city_codes[city]
+
+    def month_code(self, year, month):
+        return int(month_index(year, month)) - self.first_month
+
+    def pair(self, measure, service, city):
+        # the pair's full monthly series (a view)
+        s, c = self.code(service, city)
+        return self.measures[measure][s, c]
+
+    def month(self, measure, year, month):
+        # service x city grid for one month (a view)
+        return self.measures[measure][:, :, self.month_code(year, month)]
+
+    def month_starts(self):
+        return pd.date_range(
+            pd.Timestamp(year=self.first_month // 12, month=self.first_month % 12 + 1, day=1),
+            periods=self.n_months, freq="MS",
+        )
+
+    def locate(self, df):
+        """(service, city, month) codes of each row of a long frame, for gathering."""
+        services = pd.Categorical(df["service_category"], categories=self.services).codes
+        cities = pd.Categorical(df["city"], categories=self.cities).codes
+        months = month_index(df["year"], df["month"]) - self.first_month
+        return services, cities, months
+
+    def pairs(self):
+        """All (service_category, city) combinations in flattened-array order."""
+        return pd.DataFrame({
+            "service_category": np.repeat(self.services.to_numpy(), len(self.cities)),
+            "city": np.tile(self.cities.to_numpy(), len(self.services)),
+        })
+
+    # -------------------------------------------------
+    # time operators (along the month axis)
+    # -------------------------------------------------
+    def _values(self, measure):
+        return self.measures[measure] if isinstance(measure, str) else measure
+
+    def shift(self, measure, months):
+        """Value `months` months earlier (negative = later); NaN past the edges."""
+        values = self._values(measure)
+        out = np.full_like(values, np.nan)
+        if months > 0:
+            out[..., months:] = values[..., :-months]
+        elif months < 0:
+            out[..., :months] = values[..., -months:]
+        else:
+            out[...] = values
+        return out
+
+    def mom(self, measure):
+        return self._values(measure) - self.shift(measure, 1)
+
+    def yoy(self, measure):
+        return self._values(measure) - self.shift(measure, 12)
+
+    def rolling_mean(self, measure, months):
+        """Mean over the trailing `months` calendar months, skipping missing ones.
+
+        Only cells that had a row get a value, like AVG over a RANGE frame.
+        """
+        values = self._values(measure)
+        valid = ~np.isnan(values)
+        sums = np.cumsum(np.where(valid, values, 0), axis=-1, dtype=np.float64)
+        counts = np.cumsum(valid, axis=-1)
+        if months < values.shape[-1]:
+            sums[..., months:] -= sums[..., :-months].copy()
+            counts[..., months:] -= counts[..., :-months].copy()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out = np.where(counts > 0, sums / counts, np.nan)
+        out[~self.present] = np.nan
+        return out
+
+    def rank(self, measure, descending=False):
+        """1-based rank of each pair within its month (ties share the lowest rank)."""
+        values = self._values(measure).astype(np.float64)
+        flat = values.reshape(-1, values.shape[-1])
+        keyed = -flat if descending else flat
+
+        order = np.argsort(keyed, axis=0, kind="stable")  # NaN sorts last
+        ordered = np.take_along_axis(keyed, order, axis=0)
+        # position where each run of equal values starts = its "min" rank
+        position = np.arange(flat.shape[0])[:, None]
+        starts = np.ones(ordered.shape, dtype=bool)
+        starts[1:] = ordered[1:] != ordered[:-1]
+        run_start = np.maximum.accumulate(np.where(starts, position, 0), axis=0)
+
+        ranks = np.empty_like(flat)
+        np.put_along_axis(ranks, order, run_start + 1.0, axis=0)
+        ranks[np.isnan(flat)] = np.nan
+        return ranks.reshape(values.shape)
+
+    # -------------------------------------------------
+    # group reductions
+    # -------------------------------------------------
+    def reduce(self, measure, axis, how="mean"):
+        """Reduce over one axis name or a tuple of them ("service", "city", "month").
+
+        Missing cells are skipped; sums and means accumulate in float64.
+        """
+        values = self._values(measure)
+        axes = _axes(axis)
+        if how == "count":
+            return (~np.isnan(values)).sum(axis=axes)
+        funcs = {"mean": np.nanmean, "sum": np.nansum, "min": np.nanmin, "max": np.nanmax}
+        kwargs = {"dtype": np.float64} if how in ("mean", "sum") else {}
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN slices give NaN
+            return funcs[how](values, axis=axes, **kwargs)
+
+    def last_points(self, measure, window):
+        """(pairs x window) last `window` non-missing values per pair, right-aligned.
+
+        Returns (values, n_points) in `pairs()` order; shorter histories are
+        left-padded with NaN and n_points is capped at `window`.
+        """
+        values = self._values(measure)
+        flat = values.reshape(-1, values.shape[-1])
+        valid = ~np.isnan(flat)
+        from_end = np.cumsum(valid[:, ::-1], axis=1)[:, ::-1] - 1
+        rows, cols = np.nonzero(valid & (from_end < window))
+
+        out = np.full((flat.shape[0], window), np.nan)
+        out[rows, window - 1 - from_end[rows, cols]] = flat[rows, cols]
+        n_points = np.minimum(valid.sum(axis=1), window)
+        return out, n_points
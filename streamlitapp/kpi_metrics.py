@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+from kpi_cube import KpiCube
+
+
+# In-process versions of the dbt marts `mart_kpi_window_metrics` and
+# `mart_dashboard_headline` (non_hospitality_ai/models/marts). Home.py reads
+# the marts; these produce the same columns from the raw KPI frame when the
+# marts are not deployed yet.
+
+PAIR_KEYS = ["service_category", "city"]
+
+WINDOW_COLUMNS = PAIR_KEYS + [
+    "year", "month", "month_start", "month_index",
+    "roi_percent", "profit_margin_pct", "total_revenue", "marketing_spend_month",
+    "roi_prev_month", "roi_next_month", "roi_last_year",
+    "roi_mom", "roi_yoy", "revenue_mom", "margin_mom",
+    "roi_3m_avg", "roi_6m_avg", "roi_12m_avg",
+    "roi_rank", "roi_3m_weakest_rank", "is_latest_month",
+]
+
+
+# -----------------------------------------------------
+# WINDOW METRICS (per service, city, month)
+# -----------------------------------------------------
+def window_metrics(df):
+    """Same rows and columns as `mart_kpi_window_metrics`."""
+    cube = KpiCube.from_frame(df, ["roi_percent", "profit_margin_pct", "total_revenue"])
+
+    # rows in (service, city, month) order, straight from their cube cells
+    row_services, row_cities, row_months = cube.row_cells
+    order = np.lexsort((row_months, row_cities, row_services))
+    cell = (row_services[order], row_cities[order], row_months[order])
+    columns = ["year", "month", "roi_percent", "profit_margin_pct", "total_revenue", "marketing_spend_month"]
+    out = pd.DataFrame({
+        "service_category": cube.services[cell[0]],
+        "city": cube.cities[cell[1]],
+        **{col: df[col].to_numpy()[order] for col in columns},
+    })
+    out["month_index"] = cube.first_month + cell[2]
+    out["month_start"] = cube.month_starts().date[cell[2]]
+
+    # every metric is a whole-cube operator, gathered back onto the rows
+    roi = cube["roi_percent"]
+    out["roi_prev_month"] = cube.shift(roi, 1)[cell]
+    out["roi_next_month"] = cube.shift(roi, -1)[cell]
+    out["roi_last_year"] = cube.shift(roi, 12)[cell]
+    out["roi_mom"] = cube.mom(roi)[cell]
+    out["roi_yoy"] = cube.yoy(roi)[cell]
+    out["revenue_mom"] = cube.mom("total_revenue")[cell]
+    out["margin_mom"] = cube.mom("profit_margin_pct")[cell]
+    rolling = {months: cube.rolling_mean(roi, months) for months in (3, 6, 12)}
+    for months, values in rolling.items():
+        out[f"roi_{months}m_avg"] = values[cell]
+
+    out["roi_rank"] = pd.array(cube.rank(roi, descending=True)[cell], dtype="Int64")
+    out["roi_3m_weakest_rank"] = pd.array(cube.rank(rolling[3])[cell], dtype="Int64")
+    out["is_latest_month"] = out["month_index"] == out["month_index"].max()
+
+    metrics = out.columns[out.columns.get_loc("roi_prev_month"):out.columns.get_loc("roi_12m_avg") + 1]
+    out[metrics] = out[metrics].astype("float64")
+    return out[WINDOW_COLUMNS]
+
+
+# -----------------------------------------------------
+# DASHBOARD HEADLINE (one row)
+# -----------------------------------------------------
+def _optional(value):
+    return None if np.isnan(value) else float(value)
+
+
+def dashboard_headline(df):
+    """Same single row as `mart_dashboard_headline`, as a one-row DataFrame."""
+    cube = KpiCube.from_frame(df, ["roi_percent", "total_revenue", "marketing_spend_month"])
+    pairs_axes = ("service", "city")
+
+    roi = cube.reduce("roi_percent", pairs_axes)
+    revenue = cube.reduce("total_revenue", pairs_axes, "sum")
+    marketing = cube.reduce("marketing_spend_month", pairs_axes, "sum")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mer = np.where(marketing != 0, revenue / marketing, np.nan)
+
+    # months run consecutively from the first to the latest one with data
+    latest = cube.n_months - 1
+    current = float(roi[latest])
+    prev = _optional(roi[latest - 1]) if latest >= 1 else None
+    last_year = _optional(roi[latest - 12]) if latest >= 12 else None
+    prev_mer = _optional(mer[latest - 1]) if latest >= 1 else None
+
+    # nanarg* return the first (alphabetical) code on ties, like the mart
+    services = cube.reduce("roi_percent", ("city", "month"))
+    cities = cube.reduce("roi_percent", ("service", "month"))
+    year, month = divmod(cube.first_month + latest, 12)
+
+    return pd.DataFrame([{
+        "latest_year": int(year),
+        "latest_month": int(month) + 1,
+        "roi_current": current,
+        "roi_mom": current - prev if prev is not None else None,
+        "roi_yoy": current - last_year if last_year is not None else None,
+        "roi_3m_avg": float(np.nanmean(roi[max(latest - 2, 0):latest + 1])),
+        "mer_current": float(mer[latest]),
+        "mer_mom": float(mer[latest]) - prev_mer if prev_mer is not None else None,
+        "pair_count": int(cube.present[:, :, latest].sum()),
+        "best_service": cube.services[np.nanargmax(services)],
+        "worst_service": cube.services[np.nanargmin(services)],
+        "best_city": cube.cities[np.nanargmax(cities)],
+        "worst_city": cube.cities[np.nanargmin(cities)],
+    }])
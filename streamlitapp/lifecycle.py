@@ -0,0 +1,334 @@
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from kpi_cube import KpiCube
+
+
+PAIR_KEYS = ["service_category", "city"]
+
+STAGE_ADVICE = {
+    "Insufficient Data": "Not enough ROI history.",
+    "High Risk": "Consistently negative ROI.",
+    "Growth": "Demand accelerating.",
+    "Decline": "ROI falling — investigate.",
+    "Stable": "Watch for movement.",
+}
+
+# the lifecycle panel lists the stages that need action first
+STAGE_ORDER = ["High Risk", "Decline", "Growth", "Stable", "Insufficient Data"]
+STAGE_COLORS = {
+    "High Risk": "#b30000",
+    "Decline": "#dc3545",
+    "Growth": "#28a745",
+    "Stable": "#6c757d",
+    "Insufficient Data": "#6c757d",
+}
+
+LIFECYCLE_PAGE_SIZE = int(os.environ.get("LIFECYCLE_PAGE_SIZE", "12"))
+# points per small-multiple; longer histories are averaged into buckets
+LIFECYCLE_MAX_POINTS = int(os.environ.get("LIFECYCLE_MAX_POINTS", "24"))
+
+
+# -----------------------------------------------------
+# ROI SERIES: ACTUALS + FORECASTS
+# -----------------------------------------------------
+def combine_series(kpi_df, forecast_df):
+    """One long (service_category, city, date, roi) frame, sorted per pair.
+
+    Rows are monthly actuals, then the forecast table's actual and forecasted
+    ROI, in that order within each date (stable sort), as Home.py plots them.
+    """
+    actual = kpi_df[PAIR_KEYS].copy()
+    actual["date"] = pd.to_datetime(
+        kpi_df["year"].astype(str) + "-" + kpi_df["month"].astype(str) + "-01"
+    ).dt.date
+    actual["roi"] = kpi_df["roi_percent"]
+
+    forecast_dates = pd.to_datetime(forecast_df["ds"]).dt.date
+    parts = [actual]
+    for col in ("actual_roi_percent", "forecasted_roi_percent"):
+        part = forecast_df[PAIR_KEYS].copy()
+        part["date"] = forecast_dates
+        part["roi"] = forecast_df[col]
+        parts.append(part)
+
+    combined = pd.concat(parts, ignore_index=True)
+    return combined.dropna(subset=["roi"]).sort_values(PAIR_KEYS + ["date"], kind="mergesort")
+
+
+def roi_cube(kpi_df, forecast_df):
+    """KpiCube with one `roi` per pair and month: the actual where known, else the forecast.
+
+    `is_forecast` is 1 where the value came from `forecasted_roi_percent`.
+    With the usual forecast horizon of three or more months the last three
+    points are forecasts either way, so stages match classify_pairs() on
+    combine_series().
+    """
+    forecast_dates = pd.to_datetime(forecast_df["ds"])
+    parts = []
+    # later parts win on the same month: forecast < forecast-table actual < KPI actual
+    for col, is_forecast in (("forecasted_roi_percent", 1.0), ("actual_roi_percent", 0.0)):
+        parts.append(pd.DataFrame({
+            "service_category": forecast_df["service_category"].array,
+            "city": forecast_df["city"].array,
+            "year": forecast_dates.dt.year.to_numpy(),
+            "month": forecast_dates.dt.month.to_numpy(),
+            "roi": forecast_df[col].to_numpy(dtype=float),
+            "is_forecast": is_forecast,
+        }))
+    parts.append(pd.DataFrame({
+        "service_category": kpi_df["service_category"].array,
+        "city": kpi_df["city"].array,
+        "year": kpi_df["year"].to_numpy(),
+        "month": kpi_df["month"].to_numpy(),
+        "roi": kpi_df["roi_percent"].to_numpy(dtype=float),
+        "is_forecast": 0.0,
+    }))
+
+    rows = pd.concat(parts, ignore_index=True).dropna(subset=["roi"])
+    return KpiCube.from_frame(rows, ["roi", "is_forecast"])
+
+
+# -----------------------------------------------------
+# LAST-N WINDOW MATRIX
+# -----------------------------------------------------
+def window_matrix(df, window=3, keys=PAIR_KEYS, value="roi", order="date"):
+    """Return (pairs, values, n_points) for the last `window` points of each pair.
+
+    `values` is a (pairs x window) float array, right-aligned so that column
+    -1 is the most recent point; shorter histories are left-padded with NaN.
+    """
+    df = df.dropna(subset=[value]).sort_values(list(keys) + [order], kind="mergesort")
+
+    from_end = df.groupby(list(keys), sort=False).cumcount(ascending=False).to_numpy()
+    tail = df[from_end < window]
+    from_end = from_end[from_end < window]
+
+    pair_idx = tail.groupby(list(keys), sort=False).ngroup().to_numpy()
+    pairs = tail[list(keys)].drop_duplicates().reset_index(drop=True)
+
+    values = np.full((len(pairs), window), np.nan)
+    values[pair_idx, window - 1 - from_end] = tail[value].to_numpy(dtype=float)
+    n_points = np.bincount(pair_idx, minlength=len(pairs))
+
+    return pairs, values, n_points
+
+
+def window_slope(values):
+    # least-squares slope per row, in value units per period
+    window = values.shape[1]
+    x = np.arange(window) - (window - 1) / 2
+    y = values - np.nanmean(values, axis=1, keepdims=True)
+    return np.nansum(y * x, axis=1) / (x ** 2).sum()
+
+
+# -----------------------------------------------------
+# LIFECYCLE CLASSIFICATION (ALL PAIRS AT ONCE)
+# -----------------------------------------------------
+def classify_pairs(df, window=3, slope_threshold=None,
+                   keys=PAIR_KEYS, value="roi", order="date"):
+    """Classify every pair in `df` into a lifecycle stage in one array pass.
+
+    The default (window=3, no slope threshold) reproduces the original
+    last-3-points rules. A `slope_threshold` additionally marks pairs whose
+    fitted slope over the window is at least that steep as Growth/Decline
+    even when the points are not strictly monotonic.
+    """
+    if window < 2:
+        raise ValueError("window must be at least 2 points")
+
+    pairs, values, n_points = window_matrix(df, window, keys, value, order)
+    return _classify(pairs, values, n_points, window, slope_threshold)
+
+
+def classify_cube(cube, window=3, slope_threshold=None, measure="roi"):
+    """classify_pairs() for a KpiCube: the same stages from its dense series.
+
+    Only pairs with at least one value are returned, in service/city order.
+    """
+    if window < 2:
+        raise ValueError("window must be at least 2 points")
+
+    values, n_points = cube.last_points(measure, window)
+    keep = n_points > 0
+    pairs = cube.pairs()[keep].reset_index(drop=True)
+    return _classify(pairs, values[keep], n_points[keep], window, slope_threshold)
+
+
+def _classify(pairs, values, n_points, window, slope_threshold):
+    full = n_points >= window
+    filled = np.where(full[:, None], values, 0.0)
+    steps = np.diff(filled, axis=1)
+    slope = np.where(full, window_slope(filled), np.nan)
+
+    conditions = [
+        ~full,
+        (filled < 0).all(axis=1),
+        (steps > 0).all(axis=1),
+        (steps < 0).all(axis=1),
+    ]
+    stages = ["Insufficient Data", "High Risk", "Growth", "Decline"]
+
+    if slope_threshold is not None:
+        conditions += [slope >= slope_threshold, slope <= -slope_threshold]
+        stages += ["Growth", "Decline"]
+
+    stage = np.select(conditions, stages, default="Stable")
+
+    out = pairs.copy()
+    out["stage"] = stage
+    out["advice"] = out["stage"].map(STAGE_ADVICE)
+    out["slope"] = slope
+    out["last_value"] = np.where(n_points > 0, values[:, -1], np.nan)
+    out["n_points"] = n_points
+    return out
+
+
+# -----------------------------------------------------
+# LIFECYCLE PANEL: ORDERING + SMALL-MULTIPLES FRAME
+# -----------------------------------------------------
+def order_pairs(lifecycle, stages=None):
+    """classify_*() rows in `stages` (all when None), in STAGE_ORDER.
+
+    Within a stage the steepest fitted slope comes first, then service/city.
+    """
+    out = lifecycle if stages is None else lifecycle[lifecycle["stage"].isin(list(stages))]
+    rank = pd.Categorical(out["stage"], categories=STAGE_ORDER).codes
+    steep = -np.abs(out["slope"].to_numpy(dtype=float))
+    order = np.lexsort((out["city"].to_numpy(), out["service_category"].to_numpy(),
+                       np.nan_to_num(steep, nan=np.inf), rank))
+    return out.iloc[order].reset_index(drop=True)
+
+
+def pair_label(service, city):
+    return f"{service} ({city})"
+
+
+def _bucket_means(values, n_buckets):
+    """Average (pairs x months) into at most `n_buckets` columns aligned to the end.
+
+    Returns (means, last_month): each bucket's mean and the position of its
+    last month, so the most recent month always closes a bucket.
+    """
+    months = values.shape[1]
+    size = -(-months // max(n_buckets, 1))
+    if size <= 1:
+        return values, np.arange(months)
+    buckets = -(-months // size)
+    padded = np.full((values.shape[0], buckets * size), np.nan, dtype=values.dtype)
+    padded[:, buckets * size - months:] = values
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN buckets give NaN
+        means = np.nanmean(padded.reshape(values.shape[0], buckets, size), axis=2)
+    last_month = np.arange(buckets) * size + size - 1 - (buckets * size - months)
+    return means, last_month
+
+
+def chart_frame(cube, pairs, latest_actual, max_points=LIFECYCLE_MAX_POINTS, measure="roi"):
+    """One long (pair, date, roi, type) frame for a small-multiples chart of `pairs`.
+
+    `latest_actual` is the cube month position of the last actual month;
+    later months are "Forecast". Each pair gets at most `max_points` points:
+    the forecast months as they are and the actuals averaged into buckets
+    that end on `latest_actual`. Pairs keep their order in `pairs`.
+    """
+    services = pd.Categorical(pairs["service_category"], categories=cube.services).codes
+    cities = pd.Categorical(pairs["city"], categories=cube.cities).codes
+    values = cube[measure][services, cities].astype(np.float64)
+
+    split = min(latest_actual + 1, cube.n_months)
+    forecast, forecast_months = _bucket_means(values[:, split:], max_points)
+    actual, actual_months = _bucket_means(values[:, :split], max_points - forecast.shape[1])
+
+    series = np.concatenate([actual, forecast], axis=1)
+    months = np.concatenate([actual_months, forecast_months + split])
+    kind = np.repeat(["Actual", "Forecast"], [actual.shape[1], forecast.shape[1]])
+
+    labels = [pair_label(s, c) for s, c in zip(pairs["service_category"], pairs["city"])]
+    dates = cube.month_starts()[months]
+    out = pd.DataFrame({
+        "pair": np.repeat(labels, series.shape[1]),
+        "date": np.tile(dates, len(labels)),
+        "roi": series.ravel(),
+        "type": np.tile(kind, len(labels)),
+    })
+    return out[~np.isnan(out["roi"].to_numpy())].reset_index(drop=True)
+
+
+# -----------------------------------------------------
+# STREAMLIT PANEL
+# -----------------------------------------------------
+def render_lifecycle_panel(cube, lifecycle, latest_actual, key="lifecycle", parent=None,
+                           page_size=LIFECYCLE_PAGE_SIZE):
+    """Stage filter, a page of cards and one faceted chart of the page's series.
+
+    The page is a single HTML block plus a single chart, however many pairs
+    there are, instead of two columns, a card and a line chart per pair.
+    """
+    import altair as alt
+    import streamlit as st
+
+    from tracing import get_tracer
+
+    state = st.session_state
+    stage_counts = lifecycle["stage"].value_counts()
+    present = [s for s in STAGE_ORDER if s in stage_counts]
+
+    # the stages that need action are shown by default; the rest are a click away
+    stages = st.multiselect(
+        "Stages", present,
+        default=[s for s in ("High Risk", "Decline", "Growth") if s in stage_counts] or present,
+        format_func=lambda s: f"{s} ({stage_counts[s]:,})",
+        key=f"{key}_stages",
+    )
+    shown = order_pairs(lifecycle, stages)
+
+    # a different stage filter starts again from page 1
+    if state.get(f"{key}_view") != tuple(stages):
+        state[f"{key}_view"] = tuple(stages)
+        state[f"{key}_page"] = 1
+
+    pages = max(1, -(-len(shown) // page_size))
+    if state.get(f"{key}_page", 1) > pages:
+        state[f"{key}_page"] = pages
+    page = st.number_input(f"Page (of {pages:,})", 1, pages, key=f"{key}_page") - 1
+    first = page * page_size
+    page_pairs = shown.iloc[first:first + page_size]
+
+    if page_pairs.empty:
+        st.info("No service–city pairs in the selected stages.")
+        return
+    st.caption(f"Pairs {first + 1:,}–{first + len(page_pairs):,} of {len(shown):,}")
+
+    cards = "".join(f"""
+        <div style='padding:12px; border-radius:12px; background:white;
+                    border-left:6px solid {STAGE_COLORS[row.stage]};
+                    box-shadow:0 2px 6px rgba(0,0,0,0.05);'>
+            <strong>{row.service_category} ({row.city}) →
+                <span style="color:{STAGE_COLORS[row.stage]}">{row.stage}</span>
+            </strong>
+            <br>{row.advice}
+        </div>""" for row in page_pairs.itertuples(index=False))
+    st.markdown(
+        "<div style='display:grid; grid-template-columns:repeat(auto-fill, minmax(260px, 1fr));"
+        f" gap:14px; margin-bottom:14px;'>{cards}</div>",
+        unsafe_allow_html=True,
+    )
+
+    with get_tracer().start_span(f"{key}.chart", parent=parent) as span:
+        chart_df = chart_frame(cube, page_pairs, latest_actual)
+        span.set_attributes(pairs=len(page_pairs), points=len(chart_df))
+
+    labels = [pair_label(s, c) for s, c in zip(page_pairs["service_category"], page_pairs["city"])]
+    st.altair_chart(
+        alt.Chart(chart_df).mark_line().encode(
+            x=alt.X("date:T", title=None),
+            y=alt.Y("roi:Q", title="ROI %"),
+            color=alt.Color("type:N", title=None, legend=alt.Legend(orient="top")),
+        ).properties(width=260, height=120).facet(
+            facet=alt.Facet("pair:N", title=None, sort=labels), columns=3,
+        ).resolve_scale(y="independent")
+    )
@@ -0,0 +1,369 @@
+import contextvars
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+from tracing import current_span, get_tracer
+
+
+# whole-call budget, retries included
+LLM_DEADLINE_SECONDS = float(os.environ.get("LLM_DEADLINE_SECONDS", "30"))
+LLM_MAX_ATTEMPTS = int(os.environ.get("LLM_MAX_ATTEMPTS", "3"))
+# full-jitter backoff: sleep uniform(0, min(max, base * 2^retry))
+LLM_BACKOFF_SECONDS = float(os.environ.get("LLM_BACKOFF_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.environ.get("LLM_BACKOFF_MAX_SECONDS", "8"))
+# a call still running past this percentile of recent latencies gets a
+# duplicate request; the first answer wins (0 = no hedging)
+LLM_HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", "20"))
+# consecutive failed calls that open the breaker, and how long it stays open
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.environ.get("LLM_BREAKER_RESET_SECONDS", "30"))
+# longest gap between two chunks of a streamed response
+LLM_STREAM_IDLE_SECONDS = float(os.environ.get("LLM_STREAM_IDLE_SECONDS", "20"))
+
+_END = object()
+
+
+# -----------------------------------------------------
+# ERRORS
+# -----------------------------------------------------
+class LLMError(Exception):
+    pass
+
+
+class LLMTimeout(LLMError, TimeoutError):
+    pass
+
+
+class CircuitOpenError(LLMError):
+    pass
+
+
+class LLMParseError(LLMError):
+    """The model's response is not the JSON object the caller asked for."""
+
+    def __init__(self, reason, text, line=None, column=None):
+        where = f" (line {line}, column {column})" if line is not None else ""
+        super().__init__(f"response is not valid JSON: {reason}{where}")
+        self.reason = reason
+        self.text = text or ""
+        self.line = line
+        self.column = column
+
+    def to_dict(self):
+        return {
+            "type": "json_parse",
+            "reason": self.reason,
+            "line": self.line,
+            "column": self.column,
+            "response_chars": len(self.text),
+            "response_head": self.text[:200],
+        }
+
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def parse_json_response(text):
+    """The JSON object in a model response (a ```json fence is tolerated)."""
+    if not text or not text.strip():
+        raise LLMParseError("empty response", text)
+    try:
+        data = json.loads(_FENCE.sub("", text.strip()))
+    except json.JSONDecodeError as e:
+        raise LLMParseError(e.msg, text, e.lineno, e.colno) from e
+    if not isinstance(data, dict):
+        raise LLMParseError(f"expected an object, got {type(data).__name__}", text)
+    return data
+
+
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+TRANSIENT_NAMES = {
+    "ServiceUnavailable", "ResourceExhausted", "InternalServerError", "DeadlineExceeded",
+    "TooManyRequests", "GatewayTimeout", "ServerError", "Aborted",
+}
+
+
+def is_transient(exc):
+    # google-api-core and google-genai errors carry the HTTP status as `code`
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    code = getattr(exc, "code", None)
+    if isinstance(code, int) and code in TRANSIENT_STATUS:
+        return True
+    return any(cls.__name__ in TRANSIENT_NAMES for cls in type(exc).__mro__)
+
+
+# -----------------------------------------------------
+# LATENCY WINDOW + CIRCUIT BREAKER
+# -----------------------------------------------------
+class LatencyWindow:
+    """Latencies of the last `size` successful calls."""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p, min_samples=1):
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < max(min_samples, 1):
+            return None
+        return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))]
+
+
+class CircuitBreaker:
+    """Opens after `failures` consecutive failed calls and rejects calls
+    outright; after `reset_seconds` one probe call goes through and its
+    outcome closes or re-opens the breaker."""
+
+    def __init__(self, failures=LLM_BREAKER_FAILURES, reset_seconds=LLM_BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._consecutive = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self.state == "half_open" or self._consecutive >= self.failures:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+# -----------------------------------------------------
+# GATEWAY
+# -----------------------------------------------------
+class LLMGateway:
+    """Deadlines, retries, hedging and a circuit breaker around blocking LLM calls.
+
+    `call(fn)` runs fn() (one SDK request) on a helper thread and waits for
+    it at most until the call's deadline. Transient failures (timeouts,
+    429/5xx) are retried with jittered exponential backoff while the
+    deadline allows. An attempt slower than the hedge percentile of recent
+    latencies gets a second, identical request and the first answer wins;
+    the slower one is abandoned. After repeated failed calls the breaker
+    fails new calls at once instead of letting them hang.
+    """
+
+    def __init__(self, name, deadline=LLM_DEADLINE_SECONDS, max_attempts=LLM_MAX_ATTEMPTS,
+                 backoff=LLM_BACKOFF_SECONDS, backoff_max=LLM_BACKOFF_MAX_SECONDS,
+                 hedge_percentile=LLM_HEDGE_PERCENTILE, hedge_min_samples=LLM_HEDGE_MIN_SAMPLES,
+                 breaker=None, idle_timeout=LLM_STREAM_IDLE_SECONDS):
+        self.name = name
+        self.deadline = deadline
+        self.max_attempts = max(1, max_attempts)
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+        self.idle_timeout = idle_timeout
+        self.latencies = LatencyWindow()
+        self._stats = {"calls": 0, "ok": 0, "failed": 0, "rejected": 0, "retries": 0, "hedges": 0, "hedge_wins": 0}
+        self._lock = threading.Lock()
+
+    def call(self, fn, deadline=None, hedge=True):
+        """fn()'s result, within `deadline` seconds (the gateway default when None)."""
+        self._count("calls")
+        if not self.breaker.allow():
+            self._count("rejected")
+            get_tracer().add("llm.calls", 1, gateway=self.name, outcome="rejected")
+            raise CircuitOpenError(f"{self.name}: circuit open after repeated failures")
+
+        deadline_at = time.monotonic() + (self.deadline if deadline is None else deadline)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result, hedged = self._attempt(fn, deadline_at, hedge)
+            except Exception as e:
+                transient = is_transient(e)
+                delay = random.uniform(0, min(self.backoff_max, self.backoff * 2 ** (attempt - 1)))
+                if transient and attempt < self.max_attempts and time.monotonic() + delay < deadline_at:
+                    self._count("retries")
+                    get_tracer().add("llm.retries", 1, gateway=self.name, error=type(e).__name__)
+                    time.sleep(delay)
+                    continue
+
+                # only transient failures say anything about the backend's health
+                if transient:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                self._finish("failed", attempt, e)
+                raise
+
+            self.breaker.record_success()
+            current_span().set_attribute("llm.hedged", hedged)
+            self._finish("ok", attempt)
+            return result
+
+    def stream(self, open_stream, deadline=None, idle_timeout=None):
+        """Chunks of open_stream(), e.g. a generate_content_stream call.
+
+        Opening the stream and its first chunk go through `call` (deadline,
+        retries, breaker; no hedging). After that, chunks must keep arriving
+        within `idle_timeout` seconds of each other.
+        """
+        idle = self.idle_timeout if idle_timeout is None else idle_timeout
+
+        def first_chunk():
+            iterator = iter(open_stream())
+            return iterator, next(iterator, _END)
+
+        iterator, first = self.call(first_chunk, deadline, hedge=False)
+        if first is _END:
+            return
+        yield first
+
+        chunks = queue.Queue()
+
+        def pump():
+            try:
+                for chunk in iterator:
+                    chunks.put((chunk, None))
+                chunks.put((_END, None))
+            except Exception as e:
+                chunks.put((_END, e))
+
+        threading.Thread(target=pump, daemon=True, name=f"llm-{self.name}-stream").start()
+        while True:
+            try:
+                chunk, error = chunks.get(timeout=idle)
+            except queue.Empty:
+                get_tracer().add("llm.stream_stalls", 1, gateway=self.name)
+                raise LLMTimeout(f"{self.name}: no chunk for {idle:g}s")
+            if error is not None:
+                raise error
+            if chunk is _END:
+                return
+            yield chunk
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+        out["breaker"] = self.breaker.state
+        out["hedge_after_s"] = self._hedge_delay()
+        return out
+
+    # -------------------------------------------------
+    def _attempt(self, fn, deadline_at, hedge):
+        started = time.monotonic()
+        hedge_after = self._hedge_delay() if hedge else None
+        pending = {self._submit(fn)}
+        hedge_future = None
+        error = None
+
+        while pending:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                raise LLMTimeout(f"{self.name}: no response within the deadline")
+            timeout = remaining
+            if hedge_after is not None and hedge_future is None:
+                timeout = min(timeout, max(0.0, started + hedge_after - time.monotonic()))
+
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self.latencies.add(time.monotonic() - started)
+                    if future is hedge_future:
+                        self._count("hedge_wins")
+                        get_tracer().add("llm.hedge_wins", 1, gateway=self.name)
+                    return future.result(), hedge_future is not None
+                error = future.exception()
+
+            if (not done and hedge_after is not None and hedge_future is None
+                    and time.monotonic() - started >= hedge_after):
+                hedge_future = self._submit(fn)
+                pending.add(hedge_future)
+                self._count("hedges")
+                get_tracer().add("llm.hedges", 1, gateway=self.name)
+
+        raise error
+
+    def _submit(self, fn):
+        # a plain daemon thread per request: an abandoned (stalled) request
+        # must not hold a pool slot that later calls need
+        future = Future()
+        context = contextvars.copy_context()
+
+        def run():
+            try:
+                future.set_result(context.run(fn))
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, daemon=True, name=f"llm-{self.name}").start()
+        return future
+
+    def _hedge_delay(self):
+        if not self.hedge_percentile:
+            return None
+        return self.latencies.percentile(self.hedge_percentile, self.hedge_min_samples)
+
+    def _finish(self, outcome, attempts, error=None):
+        self._count(outcome)
+        current_span().set_attribute("llm.attempts", attempts)
+        get_tracer().add(
+            "llm.calls", 1, gateway=self.name,
+            outcome=outcome if error is None else ("timeout" if isinstance(error, TimeoutError) else "error"),
+        )
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+
+# -----------------------------------------------------
+# PROCESS-WIDE GATEWAYS
+# -----------------------------------------------------
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+def get_gateway(name, **settings):
+    """The process-wide gateway for `name`; settings apply when it is first created."""
+    with _gateways_lock:
+        if name not in _gateways:
+            _gateways[name] = LLMGateway(name, **settings)
+        return _gateways[name]
+
+
+def gateway_stats():
+    with _gateways_lock:
+        gateways = list(_gateways.values())
+    return {g.name: g.stats() for g in gateways}
@@ -0,0 +1,396 @@
+import argparse
+import json
+import os
+import threading
+import time
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import sqlglot
+from sqlglot import exp
+
+from tracing import get_tracer
+
+
+LOCAL_ENGINE_ENABLED = os.environ.get("LOCAL_ENGINE", "0") == "1"
+SNAPSHOT_DIR = os.environ.get(
+    "LOCAL_ENGINE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "snapshots"),
+)
+# snapshots older than this are refreshed in the background on the next query
+REFRESH_SECONDS = float(os.environ.get("LOCAL_ENGINE_REFRESH_SECONDS", "900"))
+# past this age (refreshes keep failing) queries go to BigQuery instead
+MAX_STALENESS_SECONDS = float(os.environ.get("LOCAL_ENGINE_MAX_STALENESS_SECONDS", "3600"))
+
+# BigQuery table -> local view name, the period key used as the refresh
+# watermark, and how many trailing months are re-fetched for late corrections
+LOCAL_TABLES = {
+    "nonhospitality-bi.analytics.monthly_service_kpis": {
+        "view": "monthly_service_kpis",
+        "period_sql": "year * 100 + month",
+        "lookback_months": 2,
+    },
+    "nonhospitality-bi.analytics.monthly_service_kpis_forecasts": {
+        "view": "monthly_service_kpis_forecasts",
+        "period_sql": "EXTRACT(YEAR FROM ds) * 100 + EXTRACT(MONTH FROM ds)",
+        "lookback_months": 12,
+    },
+    "nonhospitality-bi.raw.market_data": {
+        "view": "market_data",
+        "period_sql": "year * 100 + month",
+        "lookback_months": 2,
+    },
+}
+
+
+class UnsupportedQuery(ValueError):
+    pass
+
+
+def _uses_bigquery_ml(tree):
+    # anything touching BigQuery ML stays on BigQuery: ML.PREDICT / ML.FORECAST
+    # as table functions, and ML.* scalar functions
+    for node in tree.find_all(exp.Predict, exp.Table, exp.Dot):
+        if isinstance(node, exp.Predict):
+            return True
+        if isinstance(node, exp.Table) and node.db.upper() == "ML" and isinstance(node.this, exp.Func):
+            return True
+        if isinstance(node, exp.Dot) and node.this.name.upper() == "ML" and isinstance(node.expression, exp.Func):
+            return True
+    return False
+
+
+def _period(df):
+    if "year" in df.columns and "month" in df.columns:
+        return df["year"].astype("int64") * 100 + df["month"].astype("int64")
+    ds = pd.to_datetime(df["ds"])
+    return ds.dt.year * 100 + ds.dt.month
+
+
+def _shift_period(period, months):
+    index = (period // 100) * 12 + (period % 100 - 1) - months
+    return (index // 12) * 100 + index % 12 + 1
+
+
+class LocalResult:
+    """Record batches of one DuckDB query, cut at `max_rows`.
+
+    The query is run with one row more than the cap, so after iteration
+    `truncated` says whether rows were left out, as on ArrowResultStream.
+    """
+
+    def __init__(self, reader, max_rows=None):
+        self._reader = reader
+        self.schema = reader.schema
+        self.column_names = reader.schema.names
+        self.max_rows = max_rows
+        self.rows = 0
+        self.truncated = False
+
+    def __iter__(self):
+        for batch in self._reader:
+            if self.max_rows is not None and self.rows + batch.num_rows > self.max_rows:
+                batch = batch.slice(0, self.max_rows - self.rows)
+                self.truncated = True
+            if batch.num_rows:
+                self.rows += batch.num_rows
+                yield batch
+            if self.truncated:
+                break
+
+
+# -----------------------------
+# Snapshot + DuckDB execution
+# -----------------------------
+class LocalEngine:
+    """Parquet snapshots of the bot's allowed tables, queried with DuckDB.
+
+    Generated BigQuery SQL is transpiled with sqlglot; queries that use
+    BigQuery ML, reference other tables or fail to transpile raise
+    UnsupportedQuery so the caller can fall back to BigQuery.
+    """
+
+    def __init__(self, snapshot_dir=SNAPSHOT_DIR):
+        self.snapshot_dir = snapshot_dir
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.refresh_error = None  # the last background refresh's failure, if any
+        self._con = None
+        self.manifest = self._read_manifest()
+
+    # ---- snapshots ----
+    def _path(self, table_id):
+        return os.path.join(self.snapshot_dir, f"{LOCAL_TABLES[table_id]['view']}.parquet")
+
+    def _manifest_path(self):
+        return os.path.join(self.snapshot_dir, "manifest.json")
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self, manifest):
+        tmp = self._manifest_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, self._manifest_path())
+
+    def _manifest_snapshot(self):
+        # refresh() swaps in a new dict under the lock and never edits the
+        # published one, so readers only need the reference
+        with self._lock:
+            return self.manifest
+
+    def available(self):
+        return all(os.path.exists(self._path(t)) for t in LOCAL_TABLES)
+
+    def age(self):
+        # seconds since the least recently refreshed snapshot (inf without one)
+        refreshed = [m.get("refreshed_at", 0) for m in self._manifest_snapshot().values()]
+        if not self.available() or not refreshed:
+            return float("inf")
+        return time.time() - min(refreshed)
+
+    def is_stale(self):
+        return self.age() > REFRESH_SECONDS
+
+    def refresh(self, client, full=False):
+        """Bring every snapshot up to date; returns per-table refresh stats.
+
+        Tables whose BigQuery last-modified time has not moved are skipped.
+        Otherwise only rows at or after (watermark - lookback) are fetched and
+        replace the same periods in the snapshot.
+        """
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        report = {}
+        # built up aside and published at the end; request threads read the old one meanwhile
+        manifest = {table_id: dict(state) for table_id, state in self._manifest_snapshot().items()}
+
+        for table_id, spec in LOCAL_TABLES.items():
+            path = self._path(table_id)
+            state = manifest.setdefault(table_id, {})
+            modified = str(client.get_table(table_id).modified)
+            have_snapshot = os.path.exists(path) and "watermark" in state
+
+            if have_snapshot and not full and state.get("modified") == modified:
+                state["refreshed_at"] = time.time()
+                report[table_id] = {"mode": "unchanged", "rows": state.get("rows")}
+                continue
+
+            if have_snapshot and not full:
+                cutoff = int(_shift_period(state["watermark"], spec["lookback_months"]))
+                fresh = client.query(
+                    f"SELECT * FROM `{table_id}` WHERE {spec['period_sql']} >= {cutoff}"
+                ).result().to_arrow().to_pandas()
+                old = pq.read_table(path).to_pandas()
+                kept = old[_period(old) < cutoff]
+                df = pd.concat([kept, fresh], ignore_index=True) if len(fresh) else old
+                mode, fetched = "incremental", len(fresh)
+            else:
+                df = client.query(f"SELECT * FROM `{table_id}`").result().to_arrow().to_pandas()
+                mode, fetched = "full", len(df)
+
+            tmp = path + ".tmp"
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp)
+            os.replace(tmp, path)
+
+            manifest[table_id] = {
+                "modified": modified,
+                "watermark": int(_period(df).max()) if len(df) else 0,
+                "rows": len(df),
+                "refreshed_at": time.time(),
+            }
+            report[table_id] = {"mode": mode, "fetched": fetched, "rows": len(df)}
+
+        self._write_manifest(manifest)
+        with self._lock:
+            self.manifest = manifest
+            self._con = None  # re-create views over the new files
+        return report
+
+    def refresh_in_background(self, client):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            tracer = get_tracer()
+            with tracer.start_span("local_engine.refresh", parent=False) as span:
+                try:
+                    report = self.refresh(client)
+                    span.set_attributes(**{f"{t}.mode": r["mode"] for t, r in report.items()})
+                    self.refresh_error = None
+                except Exception as e:
+                    # keep serving the old snapshot until MAX_STALENESS_SECONDS
+                    span.record_exception(e)
+                    tracer.add("local_engine.refresh_errors", 1)
+                    self.refresh_error = f"{type(e).__name__}: {e}"
+                finally:
+                    with self._lock:
+                        self._refreshing = False
+
+        threading.Thread(target=run, daemon=True, name="local-engine-refresh").start()
+
+    # ---- translation ----
+    def translate(self, sql):
+        try:
+            tree = sqlglot.parse_one(sql, read="bigquery")
+        except sqlglot.errors.ParseError as e:
+            raise UnsupportedQuery(f"could not parse SQL: {e}") from e
+        if _uses_bigquery_ml(tree):
+            raise UnsupportedQuery("BigQuery ML is not available locally")
+
+        ctes = {cte.alias_or_name for cte in tree.find_all(exp.CTE)}
+        for table in tree.find_all(exp.Table):
+            if not table.catalog and not table.db and table.name in ctes:
+                continue
+            full_name = ".".join(p for p in (table.catalog, table.db, table.name) if p)
+            spec = LOCAL_TABLES.get(full_name)
+            if spec is None:
+                raise UnsupportedQuery(f"table {full_name} has no local snapshot")
+            alias = table.alias
+            table.replace(exp.to_table(spec["view"]).as_(alias) if alias else exp.to_table(spec["view"]))
+
+        try:
+            return tree.sql(dialect="duckdb")
+        except sqlglot.errors.SqlglotError as e:
+            raise UnsupportedQuery(f"could not translate SQL: {e}") from e
+
+    # ---- execution ----
+    def _cursor(self):
+        with self._lock:
+            if self._con is None:
+                con = duckdb.connect()
+                for table_id, spec in LOCAL_TABLES.items():
+                    path = self._path(table_id).replace("'", "''")
+                    con.execute(f"CREATE VIEW {spec['view']} AS SELECT * FROM read_parquet('{path}')")
+                self._con = con
+            return self._con.cursor()
+
+    def stream(self, sql, max_rows=None, batch_rows=10_000):
+        # translation and execution happen here, so unsupported or failing
+        # queries raise before the caller commits to the local path
+        if not self.available():
+            raise UnsupportedQuery("no local snapshot yet")
+        age = self.age()
+        if age > MAX_STALENESS_SECONDS:
+            raise UnsupportedQuery(
+                f"snapshot is {age / 60:.0f} min old"
+                + (f" (last refresh failed: {self.refresh_error})" if self.refresh_error else "")
+            )
+        local_sql = self.translate(sql)
+        if max_rows is not None:
+            # one extra row tells a capped result from one that just fits
+            local_sql = f"SELECT * FROM ({local_sql}) LIMIT {int(max_rows) + 1}"
+        try:
+            return LocalResult(self._cursor().execute(local_sql).fetch_record_batch(batch_rows), max_rows)
+        except duckdb.Error as e:
+            raise UnsupportedQuery(f"DuckDB could not run the query: {e}") from e
+
+    def run(self, sql):
+        if not self.available():
+            raise UnsupportedQuery("no local snapshot yet")
+        try:
+            return self._cursor().execute(self.translate(sql)).df()
+        except duckdb.Error as e:
+            raise UnsupportedQuery(f"DuckDB could not run the query: {e}") from e
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_local_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = LocalEngine()
+        return _engine
+
+
+# -----------------------------
+# Result parity (local vs BigQuery)
+# -----------------------------
+def _normalize_frame(df):
+    out = df.copy()
+    for col in out.columns:
+        if pd.api.types.is_datetime64_any_dtype(out[col]):
+            out[col] = pd.to_datetime(out[col]).dt.tz_localize(None)
+        elif pd.api.types.is_numeric_dtype(out[col]):
+            out[col] = out[col].astype("float64")
+        else:
+            out[col] = out[col].astype("string")
+    return out.sort_values(list(out.columns)).reset_index(drop=True)
+
+
+def compare_results(local_df, bq_df, rtol=1e-6):
+    """Return None when both results match, otherwise a short description."""
+    if list(local_df.columns) != list(bq_df.columns):
+        return f"columns differ: {list(local_df.columns)} vs {list(bq_df.columns)}"
+    if len(local_df) != len(bq_df):
+        return f"row count differs: {len(local_df)} vs {len(bq_df)}"
+    try:
+        pd.testing.assert_frame_equal(
+            _normalize_frame(local_df), _normalize_frame(bq_df),
+            check_dtype=False, rtol=rtol,
+        )
+    except AssertionError as e:
+        return str(e).splitlines()[0]
+    return None
+
+
+def check_parity(engine, client, queries):
+    report = []
+    for sql in queries:
+        entry = {"sql": sql}
+        try:
+            local_df = engine.run(sql)
+        except UnsupportedQuery as e:
+            entry.update(status="skipped", reason=str(e))
+            report.append(entry)
+            continue
+        bq_df = client.query(sql).result().to_arrow().to_pandas()
+        diff = compare_results(local_df, bq_df)
+        entry.update(status="match" if diff is None else "mismatch", detail=diff)
+        report.append(entry)
+    return report
+
+
+def _read_queries(path):
+    with open(path) as f:
+        return [q.strip() for q in f.read().split(";") if q.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local DuckDB snapshot engine")
+    sub = parser.add_subparsers(dest="command", required=True)
+    refresh = sub.add_parser("refresh", help="update the Parquet snapshots from BigQuery")
+    refresh.add_argument("--full", action="store_true")
+    parity = sub.add_parser("parity", help="compare local and BigQuery results")
+    parity.add_argument("queries", help="file of ';'-separated BigQuery SQL statements")
+    args = parser.parse_args()
+
+    from sql_executor import get_bigquery_client
+
+    engine = get_local_engine()
+    client = get_bigquery_client()
+
+    if args.command == "refresh":
+        print(json.dumps(engine.refresh(client, full=args.full), indent=2))
+        return
+
+    report = check_parity(engine, client, _read_queries(args.queries))
+    for entry in report:
+        print(f"[{entry['status']}] {entry['sql'][:80]}  {entry.get('detail') or entry.get('reason') or ''}")
+    if any(e["status"] == "mismatch" for e in report):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,66 +1,469 @@
-import json
+import os
+import queue
+import threading
+import time
 from vertex_utils import get_vertex_client
 
-from schema_loader import load_all_schemas
-from sql_prompt_builder import build_sql_prompt
-from sql_executor import run_llm_sql_generation, run_bigquery_sql
-from summary_engine import summarize_results_with_llm
+from schema_loader import get_schema_registry
+from sql_prompt_builder import build_sql_prompt, build_question_suffix
+from schema_index import prompt_stats
+from sql_executor import run_llm_sql_generation, stream_bigquery_sql, get_bigquery_client
+from summary_engine import DigestBuilder, render_summary_prompt, generate_summary, stream_summary
+from sql_cache import get_sql_cache
+from context_cache import get_context_cache, CONTEXT_CACHE_ENABLED, CONTEXT_CACHE_MODEL
+from local_engine import get_local_engine, LOCAL_ENGINE_ENABLED, UnsupportedQuery
+from tracing import get_tracer, current_span, record_cache
+from sql_validator import SqlValidationError, SQL_REPAIR_ATTEMPTS, SQL_ROW_LIMIT, build_repair_note
+from llm_gateway import LLMError, LLMParseError
+from result_store import get_result_store
+from followup import FOLLOWUP_LOCAL, classify_followup
 
 
-schemas = load_all_schemas()
+tracer = get_tracer()
+context_cache = get_context_cache()
+sql_cache = get_sql_cache()
 
+_schemas_loaded = False
+_schemas_lock = threading.Lock()
 
-def answer_user_query(user_query):
-    client = get_vertex_client()
 
-    result = {
+def schema_snapshot():
+    """The compiled schemas, loaded on the first question rather than at import.
+
+    The first load also ties the SQL cache to the schema hash, so cached SQL
+    for an older schema is dropped.
+    """
+    global _schemas_loaded
+    registry = get_schema_registry()
+    with _schemas_lock:
+        if not _schemas_loaded:
+            sql_cache.invalidate_schema(registry.snapshot().schema_hash)
+            registry.add_listener(lambda compiled: sql_cache.invalidate_schema(compiled.schema_hash))
+            _schemas_loaded = True
+    return registry.snapshot()
+
+
+# caps on how much of a query result is pulled into memory (0 = no cap)
+MAX_RESULT_ROWS = int(os.environ.get("BOT_MAX_RESULT_ROWS", "100000")) or None
+MAX_RESULT_BYTES = int(os.environ.get("BOT_MAX_RESULT_MB", "64")) * 1024 * 1024 or None
+# batches the download thread may run ahead of the page before it waits
+RESULT_QUEUE_BATCHES = int(os.environ.get("BOT_RESULT_QUEUE_BATCHES", "8"))
+
+
+def _empty_result():
+    return {
         "sql": None,
         "dataframe": None,
         "summary": None,
         "uses_market_data": False,
         "uses_ml_prediction": False,
-        "error": None
+        "sql_cached": False,
+        "prompt_stats": None,
+        "engine": None,
+        "result_handle": None,
+        "truncated": False,
+        "refinement": None,
+        "trace_id": None,
+        "error": None,
+        "error_detail": None
     }
 
-    # Step 1 — SQL Prompt
+
+def _call_llm(client, compiled, user_query, sql_prompt, cached_content, repair=""):
+    # returns the generation plus the prompt/cached content actually used,
+    # so a repair round goes down the same path
+    if cached_content:
+        try:
+            return run_llm_sql_generation(
+                client, sql_prompt + repair, cached_content=cached_content, model=CONTEXT_CACHE_MODEL
+            ), sql_prompt, cached_content
+        except LLMError:
+            # timeouts, an open breaker or unparseable output: resending
+            # the full prompt would not help
+            raise
+        except Exception:
+            # provider cache expired or rejected: resend the full prompt
+            context_cache.forget(compiled.prefix_id)
+            sql_prompt = build_sql_prompt(
+                user_query, compiled.schemas, static_prefix=compiled.static_prefix
+            )
+
+    return run_llm_sql_generation(client, sql_prompt + repair), sql_prompt, None
+
+
+def _generate_sql(client, compiled, user_query, sql_prompt, cached_content, use_sql_cache=True):
+    """Return ((sql, uses_market, uses_ml), cached) with the SQL already validated.
+
+    Rejected SQL is never run: the validator's errors go back to the model
+    for up to SQL_REPAIR_ATTEMPTS rounds, then SqlValidationError is raised.
+    """
+    validator = compiled.validator
+    cached = sql_cache.get(user_query, compiled.schema_hash) if use_sql_cache else None
+    if use_sql_cache:
+        record_cache("sql", bool(cached))
+    if cached:
+        check = validator.validate(cached[0])
+        if not check.errors:
+            return (check.sql, cached[1], cached[2]), True
+        sql_cache.discard(user_query, compiled.schema_hash)
+
+    repair = ""
+    for attempt in range(SQL_REPAIR_ATTEMPTS + 1):
+        (sql, use_market, use_ml), sql_prompt, cached_content = _call_llm(
+            client, compiled, user_query, sql_prompt, cached_content, repair
+        )
+
+        with tracer.start_span("sql_validation", attempt=attempt) as span:
+            check = validator.validate(sql)
+            span.set_attributes(limit_added=check.limited, errors="; ".join(check.errors) or None)
+        tracer.add("sql.validation", 1, result="rejected" if check.errors else "ok")
+
+        if not check.errors:
+            current_span().set_attribute("repairs", attempt)
+            return (check.sql, use_market, use_ml), False
+        repair = build_repair_note(sql, check.errors)
+
+    raise SqlValidationError(check.errors)
+
+
+def _open_result(sql):
+    # plain queries run on the local DuckDB snapshot when enabled;
+    # ML.PREDICT and anything it cannot translate go to BigQuery
+    if LOCAL_ENGINE_ENABLED:
+        engine = get_local_engine()
+        if engine.is_stale():
+            engine.refresh_in_background(get_bigquery_client())
+        try:
+            return engine.stream(sql, max_rows=MAX_RESULT_ROWS), "duckdb"
+        except UnsupportedQuery as e:
+            current_span().set_attribute("local_engine.fallback", str(e))
+            tracer.add("local_engine.fallbacks", 1)
+
+    return stream_bigquery_sql(sql, max_rows=MAX_RESULT_ROWS, max_bytes=MAX_RESULT_BYTES), "bigquery"
+
+
+def _fetch_batches(sql, out, parent, stop):
+    # runs on a worker thread so rendering and digest work overlap the download;
+    # `out` is bounded and `stop` is set once the consumer goes away, so an
+    # abandoned answer stops pulling batches instead of buffering them all
+    def put(item):
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
     try:
-        sql_prompt = build_sql_prompt(user_query, schemas)
+        with tracer.start_span("query_execution", parent=parent) as span:
+            batches, engine = _open_result(sql)
+            span.set_attribute("engine", engine)
+            put(("engine", engine))
+            columns = getattr(batches, "column_names", None)
+            put(("columns", columns if columns is not None else batches.schema.names))
+            for batch in batches:
+                if not put(("batch", batch)):
+                    span.set_attribute("abandoned", True)
+                    return
+            # both ArrowResultStream and LocalResult know once iterated
+            span.set_attribute("truncated", batches.truncated)
+            put(("truncated", batches.truncated))
+        put(("done", None))
     except Exception as e:
-        result["error"] = f"Prompt Build Error: {e}"
-        return result
+        put(("error", e))
+
+
+# -----------------------------
+# Streaming pipeline
+# -----------------------------
+def stream_user_query(user_query, stream_tokens=True, client=None, summarize=True, conversation=None,
+                      use_sql_cache=True):
+    """Run the pipeline and yield events as each piece becomes available.
+
+    Events are dicts with a "type" of "sql", "rows" (one per result batch),
+    "result", "summary_token", "error", and finally "done" carrying the same
+    result dict that answer_user_query returns. Each run is one trace
+    (`result["trace_id"]`) with a span per stage. With summarize=False the
+    run stops after the result (no summary call). With use_sql_cache=False
+    the SQL is always generated and the shared SQL cache is neither read
+    nor changed.
+
+    With a followup.Conversation, a follow-up that only filters, sorts,
+    regroups or pivots the previous result is answered from the stored
+    result (engine "followup", no model call and no summary); any other
+    question goes through the pipeline with the earlier questions as context.
+    The answer is recorded as the conversation's new last turn.
+    """
+    result = _empty_result()
+    root = tracer.start_span("answer_user_query", parent=False, question=user_query[:200])
+    result["trace_id"] = root.trace_id
+
+    def pipeline(question):
+        return _pipeline(question, stream_tokens, client or get_vertex_client(), result, root, summarize,
+                         use_sql_cache)
 
-    # Step 2 — LLM SQL Generation
     try:
-        sql, use_market, use_ml = run_llm_sql_generation(client, sql_prompt)
+        if conversation is None:
+            yield from pipeline(user_query)
+        elif (yield from _followup(user_query, conversation, result, root)):
+            tracer.add("followup", 1, route="local")
+        else:
+            tracer.add("followup", 1, route="pipeline" if conversation.last else "first")
+            yield from pipeline(conversation.standalone(user_query))
+    finally:
+        if conversation is not None:
+            conversation.record(user_query, result, min(filter(None, [SQL_ROW_LIMIT, MAX_RESULT_ROWS]), default=None))
+        root.set_attributes(
+            sql_cached=result["sql_cached"],
+            engine=result["engine"],
+            error=result["error"],
+        )
+        if result["error"]:
+            root.status, root.status_message = "ERROR", result["error"]
+        tracer.add("questions", 1, outcome="error" if result["error"] else "ok")
+        root.end()
+
+
+def _followup(user_query, conversation, result, root):
+    """Answer from the previous result when the question only refines it.
 
-        result["sql"] = sql
-        result["uses_market_data"] = use_market
-        result["uses_ml_prediction"] = use_ml
+    Returns True when it did (events already yielded), False to fall through
+    to the full pipeline.
+    """
+    if not FOLLOWUP_LOCAL or conversation.last is None:
+        return False
+    store = get_result_store()
+    with tracer.start_span("followup_classify", parent=root) as span:
+        try:
+            synonyms = schema_snapshot().schemas["semantic"]["semantic_model"].get("synonyms")
+        except (KeyError, TypeError, AttributeError):
+            synonyms = None
+        try:
+            refinement, reason = classify_followup(user_query, conversation.last, store, synonyms)
+        except Exception as e:  # an expired result, an unreadable file
+            refinement, reason = None, str(e)
+        span.set_attributes(local=refinement is not None, reason=reason)
+    if refinement is None:
+        return False
 
-        if not sql:
-            raise ValueError("Generated SQL was empty.")
+    previous = conversation.last.handle
+    with tracer.start_span("followup_query", parent=root) as span:
+        try:
+            sql = refinement.sql(previous)
+            handle = store.derive(previous, sql)
+            df = store.page(handle, 0, max(handle.rows, 1))
+        except Exception as e:
+            # the pipeline can still answer it
+            span.record_exception(e)
+            return False
+        span.set_attribute("rows", len(df))
 
+    result.update(sql=sql, engine="followup", result_handle=handle, dataframe=df,
+                  refinement=refinement.describe(previous))
+    yield {
+        "type": "sql",
+        "sql": sql,
+        "uses_market_data": False,
+        "uses_ml_prediction": False,
+        "sql_cached": False,
+        "prompt_stats": None,
+        "refinement": result["refinement"],
+    }
+    yield {"type": "result", "dataframe": df, "engine": "followup", "result_handle": handle}
+    yield {"type": "done", "result": result}
+    return True
+
+
+def _pipeline(user_query, stream_tokens, client, result, root, summarize=True, use_sql_cache=True):
+    compiled = schema_snapshot()
+    schema_hash = compiled.schema_hash
+
+    def fail(message):
+        result["error"] = message
+        return [{"type": "error", "error": message}, {"type": "done", "result": result}]
+
+    # Step 1 — SQL Prompt: the static prefix lives in the provider's context
+    # cache when enabled, otherwise only the schema parts the question needs
+    try:
+        with tracer.start_span("prompt_build", parent=root) as span:
+            full_prompt_chars = len(compiled.static_prefix) + len(build_question_suffix(user_query))
+            cached_content = None
+            if CONTEXT_CACHE_ENABLED:
+                cached_content = context_cache.get_or_create(
+                    client, compiled.prefix_id, compiled.static_prefix
+                )
+                record_cache("context", bool(cached_content))
+
+            if cached_content:
+                sql_prompt = build_question_suffix(user_query)
+                fallback = False
+            else:
+                selection = compiled.index.select(user_query)
+                sql_prompt = build_sql_prompt(
+                    user_query, compiled.schemas, selection, compiled.static_prefix
+                )
+                fallback = selection["fallback"]
+
+            result["prompt_stats"] = prompt_stats.record(full_prompt_chars, len(sql_prompt), fallback)
+            result["prompt_stats"]["context_cached"] = bool(cached_content)
+            span.set_attributes(prompt_chars=len(sql_prompt), full_schema=fallback)
     except Exception as e:
-        result["error"] = f"SQL Generation Error: {e}"
-        return result
+        yield from fail(f"Prompt Build Error: {e}")
+        return
 
-    # Step 3 — Run SQL
+    # Step 2 — LLM SQL Generation (reused for repeated questions)
     try:
-        df = run_bigquery_sql(sql)
-        result["dataframe"] = df
+        with tracer.start_span("sql_generation", parent=root):
+            (sql, use_market, use_ml), cached = _generate_sql(
+                client, compiled, user_query, sql_prompt, cached_content, use_sql_cache
+            )
 
-        if df is None or df.empty:
-            result["summary"] = "No data available for this query."
-            return result
+            result["sql"] = sql
+            result["uses_market_data"] = use_market
+            result["uses_ml_prediction"] = use_ml
+            result["sql_cached"] = cached
 
+            if use_sql_cache and not cached:
+                sql_cache.put(user_query, schema_hash, sql, use_market, use_ml)
+
+    except SqlValidationError as e:
+        yield from fail(f"SQL Validation Error: {e}")
+        return
+    except LLMParseError as e:
+        result["error_detail"] = e.to_dict()
+        yield from fail(f"SQL Generation Error: {e}")
+        return
     except Exception as e:
-        result["error"] = f"BigQuery Execution Error: {e}"
-        return result
+        yield from fail(f"SQL Generation Error: {e}")
+        return
+
+    yield {
+        "type": "sql",
+        "sql": sql,
+        "uses_market_data": use_market,
+        "uses_ml_prediction": use_ml,
+        "sql_cached": result["sql_cached"],
+        "prompt_stats": result["prompt_stats"],
+    }
+
+    # Step 3 — Run SQL, handing batches over as they arrive. The assembly
+    # span covers the whole download; its cpu_ms is our own pandas time.
+    # Batches are also spilled to a Parquet file so the page can show any
+    # slice of the result without keeping it in the session.
+    digest = DigestBuilder()
+    try:
+        spill = get_result_store().writer()
+    except Exception:
+        spill = None  # no spill directory: the page falls back to the frame
+    columns = []
+    batches = queue.Queue(maxsize=RESULT_QUEUE_BATCHES)
+    stop = threading.Event()
+    threading.Thread(target=_fetch_batches, args=(sql, batches, root, stop), daemon=True).start()
+    assembly = tracer.start_span("result_assembly", parent=root)
+    cpu = 0.0
+    rows_so_far = 0
+    error = None
+
+    # the finally also runs when the page drops this generator mid-download
+    try:
+        while True:
+            kind, payload = batches.get()
+            if kind == "done":
+                break
+            if kind == "engine":
+                result["engine"] = payload
+                continue
+            if kind == "columns":
+                columns = payload
+                continue
+            if kind == "truncated":
+                result["truncated"] = payload
+                continue
+            if kind == "error":
+                error = payload
+                break
+
+            started = time.perf_counter()
+            if spill is not None:
+                try:
+                    spill.write(payload)
+                except Exception as e:
+                    assembly.set_attribute("spill_error", str(e))
+                    spill.abort()
+                    spill = None
+            frame = payload.to_pandas()
+            digest.add(frame)
+            rows_so_far += len(frame)
+            cpu += time.perf_counter() - started
+            yield {"type": "rows", "dataframe": frame, "rows_so_far": rows_so_far}
+
+        if error is not None:
+            assembly.record_exception(error)
+        else:
+            started = time.perf_counter()
+            df = digest.dataframe()
+            if spill is not None:
+                try:
+                    result["result_handle"] = spill.close(columns)
+                except Exception as e:
+                    assembly.set_attribute("spill_error", str(e))
+                    spill.abort()
+                spill = None
+            cpu += time.perf_counter() - started
+            assembly.set_attributes(rows=len(df), batches=len(digest.frames), cpu_ms=round(cpu * 1000, 2))
+    finally:
+        stop.set()
+        if spill is not None:
+            spill.abort()
+        assembly.end()
+
+    if error is not None:
+        # don't keep serving SQL that BigQuery rejects
+        if use_sql_cache:
+            sql_cache.discard(user_query, schema_hash)
+        yield from fail(f"BigQuery Execution Error: {error}")
+        return
+
+    result["dataframe"] = df
+    yield {"type": "result", "dataframe": df, "engine": result["engine"], "result_handle": result["result_handle"]}
+
+    if df.empty:
+        result["summary"] = "No data available for this query."
+        yield {"type": "done", "result": result}
+        return
+
+    if not summarize:
+        yield {"type": "done", "result": result}
+        return
 
     # Step 4 — Summary
     try:
-        result["summary"] = summarize_results_with_llm(client, user_query, df)
+        with tracer.start_span("summary_digest", parent=root) as span:
+            data, meta = digest.build(df)
+            summary_prompt = render_summary_prompt(user_query, data, meta)
+            span.set_attributes(mode=meta.get("mode"), prompt_chars=len(summary_prompt))
+
+        with tracer.start_span("summary_generation", parent=root, streamed=stream_tokens):
+            if stream_tokens:
+                parts = []
+                for text in stream_summary(client, summary_prompt):
+                    parts.append(text)
+                    yield {"type": "summary_token", "text": text}
+                result["summary"] = "".join(parts)
+            else:
+                result["summary"] = generate_summary(client, summary_prompt)
     except Exception as e:
-        result["error"] = f"Summary Error: {e}"
+        yield from fail(f"Summary Error: {e}")
+        return
+
+    yield {"type": "done", "result": result}
+
 
+def answer_user_query(user_query, client=None):
+    # drain the stream so the trace's root span closes before returning
+    result = None
+    for event in stream_user_query(user_query, stream_tokens=False, client=client):
+        if event["type"] == "done":
+            result = event["result"]
     return result
@@ -0,0 +1,43 @@
+import time
+
+
+def timed_call(fn, *args, **kwargs):
+    # run on a worker thread: returns the value plus how long the call itself took
+    start = time.perf_counter()
+    value = fn(*args, **kwargs)
+    return value, time.perf_counter() - start
+
+
+class PageTimer:
+    """Per-section timings for one script run.
+
+    `lap(name)` closes a rendering section (time since the previous lap);
+    `wait(name, future)` blocks on a dependency started with `timed_call`
+    and records both its own duration and how long the page waited for it.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.rows = []
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.rows.append({"step": name, "kind": "section", "seconds": now - self._last, "waited": None})
+        self._last = now
+
+    def wait(self, name, future):
+        start = time.perf_counter()
+        value, fetch_seconds = future.result()
+        waited = time.perf_counter() - start
+        self.rows.append({"step": name, "kind": "dependency", "seconds": fetch_seconds, "waited": waited})
+        self._last += waited  # waiting is not charged to the next section
+        return value
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def table(self):
+        rows = [dict(r) for r in self.rows]
+        rows.append({"step": "page total", "kind": "total", "seconds": self.total(), "waited": None})
+        return rows
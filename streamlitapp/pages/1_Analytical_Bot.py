@@ -1,28 +1,130 @@
 import streamlit as st
-from nlp_engine import answer_user_query
+from followup import Conversation
+from nlp_engine import stream_user_query
+from result_store import RESULT_PAGE_SIZE, render_result_viewer
+from tracing import render_debug_panel
 
 st.title("📊 Analytical Chatbot - AMA")
 
+# earlier answers, so "now only Mumbai" can refine the last one
+conversation = st.session_state.setdefault("conversation", Conversation())
+if conversation.last is not None and st.button("New conversation"):
+    conversation.reset()
+    st.session_state.pop("bot_answer", None)
+
 query = st.text_input("Ask your business question:")
 
+
+def prompt_caption(ps):
+    return f"Prompt: {ps['sent_chars']:,} chars " + (
+        "(full schema)" if ps["fallback"] else f"({ps['saved_pct']}% smaller than full schema)"
+    )
+
+
+def render_table(handle, preview, total_rows, container):
+    # the stored result is paged server-side; without one, show the first page only
+    if handle is not None:
+        render_result_viewer(handle, container)
+    elif preview is not None:
+        container.dataframe(preview)
+        if total_rows > len(preview):
+            st.caption(f"Showing the first {len(preview):,} of {total_rows:,} rows.")
+
+
+def refinement_caption(refinement):
+    return f"Answered from the previous result: {refinement}"
+
+
+def render_answer(answer):
+    # the last answer, redrawn on every rerun (paging, sorting, filtering)
+    if answer["error"]:
+        st.error(answer["error"])
+    if answer["sql"]:
+        st.subheader("📜 Generated SQL")
+        st.code(answer["sql"], language="sql")
+        if answer.get("refinement"):
+            st.caption(refinement_caption(answer["refinement"]))
+        elif answer["prompt_stats"]:
+            st.caption(prompt_caption(answer["prompt_stats"]))
+    render_table(answer["handle"], answer["preview"], answer["rows"], st.container())
+    if answer["summary"] and not answer["error"]:
+        st.subheader("🧠 AI Summary")
+        st.markdown(answer["summary"])
+
+
 if st.button("Ask"):
 
     if not query.strip():
         st.warning("Enter a question.")
         st.stop()
 
-    with st.spinner("🔎 Analyzing using Gemini + BigQuery..."):
-        result = answer_user_query(query)
+    status = st.empty()
+    status.info("🔎 Generating SQL with Gemini...")
 
-    if result["error"]:
-        st.error(result["error"])
-        st.stop()
+    sql_area = st.container()
+    table_area = st.empty()
+    summary_header = st.empty()
+    summary_area = st.empty()
+
+    summary_text = ""
+
+    for event in stream_user_query(query, conversation=conversation):
+
+        if event["type"] == "error":
+            # the "done" event follows; keep reading so the trace closes
+            status.empty()
+            st.error(event["error"])
+
+        elif event["type"] == "sql":
+            status.info("🔁 Refining the previous result..." if event.get("refinement")
+                        else "📡 Running query in BigQuery...")
+            with sql_area:
+                st.subheader("📜 Generated SQL")
+                st.code(event["sql"], language="sql")
+
+                if event.get("refinement"):
+                    st.caption(refinement_caption(event["refinement"]))
+                elif event["prompt_stats"]:
+                    st.caption(prompt_caption(event["prompt_stats"]))
+
+        elif event["type"] == "rows" and event["rows_so_far"] == len(event["dataframe"]):
+            # first batch: show its first page right away, the viewer replaces it later
+            table_area.dataframe(event["dataframe"].head(RESULT_PAGE_SIZE))
+            status.info(f"📥 Receiving rows... ({event['rows_so_far']:,} so far)")
+
+        elif event["type"] == "result":
+            df = event["dataframe"]
+            render_table(event["result_handle"], df.head(RESULT_PAGE_SIZE), len(df), table_area)
+            if event["engine"] != "followup":  # a refinement has no summary
+                status.info("🧠 Summarizing with Gemini...")
+                summary_header.subheader("🧠 AI Summary")
+
+        elif event["type"] == "summary_token":
+            summary_text += event["text"]
+            summary_area.markdown(summary_text)
+
+        elif event["type"] == "done":
+            status.empty()
+            result = event["result"]
+            st.session_state["last_trace_id"] = result["trace_id"]
+            if not result["error"] and result["summary"]:
+                summary_header.subheader("🧠 AI Summary")
+                summary_area.markdown(result["summary"] or "")
 
-    st.subheader("📜 Generated SQL")
-    st.code(result["sql"], language="sql")
+            # only a handle and one page of rows stay in the session
+            df = result["dataframe"]
+            st.session_state["bot_answer"] = {
+                "sql": result["sql"],
+                "prompt_stats": result["prompt_stats"],
+                "refinement": result["refinement"],
+                "handle": result["result_handle"],
+                "preview": None if df is None else df.head(RESULT_PAGE_SIZE),
+                "rows": 0 if df is None else len(df),
+                "summary": result["summary"],
+                "error": result["error"],
+            }
 
-    if result["dataframe"] is not None:
-        st.dataframe(result["dataframe"])
+elif "bot_answer" in st.session_state:
+    render_answer(st.session_state["bot_answer"])
 
-    st.subheader("🧠 AI Summary")
-    st.write(result["summary"])
+render_debug_panel(st.session_state.get("last_trace_id"))
@@ -0,0 +1,97 @@
+import threading
+import time
+
+from tracing import current_span, get_tracer
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, calls, burst=None):
+        return cls(calls / 60.0, burst)
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+
+            if deadline is not None:
+                if now + wait > deadline:
+                    return False
+            time.sleep(wait)
+
+
+# -----------------------------------------------------
+# RATE-LIMITED CLIENTS
+# -----------------------------------------------------
+def _throttled(fn, bucket, resource):
+    def call(*args, **kwargs):
+        started = time.monotonic()
+        bucket.acquire()
+        waited_ms = (time.monotonic() - started) * 1000
+        current_span().set_attribute(f"rate_limit.{resource}_wait_ms", round(waited_ms, 1))
+        get_tracer().add("rate_limit.wait_ms", waited_ms, resource=resource)
+        return fn(*args, **kwargs)
+    return call
+
+
+class _RateLimitedModels:
+    def __init__(self, models, bucket):
+        self._models = models
+        self._bucket = bucket
+
+    def __getattr__(self, name):
+        attr = getattr(self._models, name)
+        if name in ("generate_content", "generate_content_stream"):
+            return _throttled(attr, self._bucket, "gemini")
+        return attr
+
+
+class RateLimitedGenAIClient:
+    """google-genai client whose generate calls take a token from `bucket` first."""
+
+    def __init__(self, client, bucket):
+        self._client = client
+        self.models = _RateLimitedModels(client.models, bucket)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class RateLimitedBigQueryClient:
+    """bigquery.Client whose query() calls take a token from `bucket` first."""
+
+    def __init__(self, client, bucket):
+        self._client = client
+        self.query = _throttled(client.query, bucket, "bigquery")
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
@@ -0,0 +1,330 @@
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+RESULT_STORE_DIR = os.environ.get(
+    "RESULT_STORE_DIR", os.path.join(tempfile.gettempdir(), "nonhospitality-results")
+)
+RESULT_STORE_TTL_SECONDS = float(os.environ.get("RESULT_STORE_TTL_SECONDS", str(6 * 3600)))
+RESULT_STORE_MAX_BYTES = int(os.environ.get("RESULT_STORE_MAX_MB", "2048")) * 1024 * 1024
+RESULT_PAGE_SIZE = int(os.environ.get("RESULT_PAGE_SIZE", "100"))
+
+
+class ResultExpired(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class ResultHandle:
+    """Server-side reference to one query result; small enough for session state."""
+    result_id: str
+    path: str
+    rows: int
+    columns: tuple
+    numeric: tuple  # names of the numeric columns
+
+
+# -----------------------------------------------------
+# FILTERS
+# -----------------------------------------------------
+_COMPARISON = re.compile(r"^\s*(>=|<=|!=|=|>|<)?\s*(-?[\d.]+(?:e-?\d+)?)\s*$", re.IGNORECASE)
+
+
+def parse_filter(handle, column, text):
+    """(column, op, value) from what the user typed.
+
+    Numeric columns take a comparison like "> 10" or "<= -2.5" (a bare
+    number means "="); other columns match case-insensitively on substring.
+    Returns None for an empty or unusable filter.
+    """
+    text = (text or "").strip()
+    if not text or column not in handle.columns:
+        return None
+    if column in handle.numeric:
+        match = _COMPARISON.match(text)
+        if not match:
+            return None
+        return column, match.group(1) or "=", float(match.group(2))
+    return column, "contains", text
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _where(handle, filters):
+    clauses, params = [], []
+    for column, op, value in filters or []:
+        if column not in handle.columns:
+            raise ValueError(f"unknown column: {column}")
+        if op == "contains":
+            clauses.append(f"contains(lower(CAST({_quote(column)} AS VARCHAR)), lower(?))")
+            params.append(value)
+        elif op in ("=", "!=", ">", ">=", "<", "<="):
+            clauses.append(f"{_quote(column)} {op} ?")
+            params.append(value)
+        else:
+            raise ValueError(f"unknown filter operator: {op}")
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _order_by(handle, sort, descending):
+    if not sort:
+        return ""
+    if sort not in handle.columns:
+        raise ValueError(f"unknown column: {sort}")
+    return f" ORDER BY {_quote(sort)} {'DESC' if descending else 'ASC'} NULLS LAST"
+
+
+# -----------------------------------------------------
+# SPILL WRITER
+# -----------------------------------------------------
+class ResultWriter:
+    """Appends Arrow record batches to a Parquet file as they arrive."""
+
+    def __init__(self, store, result_id, path):
+        self._store = store
+        self._result_id = result_id
+        self._path = path
+        self._tmp = path + ".tmp"
+        self._writer = None
+        self._schema = None
+        self.rows = 0
+
+    def write(self, batch):
+        if self._writer is None:
+            self._schema = batch.schema
+            self._writer = pq.ParquetWriter(self._tmp, batch.schema)
+        if batch.schema.equals(self._schema):
+            self._writer.write_batch(batch)
+        else:
+            self._writer.write_table(pa.Table.from_batches([batch]).cast(self._schema))
+        self.rows += batch.num_rows
+
+    def close(self, column_names=()):
+        if self._writer is None:
+            # no rows: still an (empty) result with the query's columns
+            self._schema = pa.schema([(name, pa.string()) for name in column_names])
+            pq.write_table(self._schema.empty_table(), self._tmp)
+        else:
+            self._writer.close()
+        os.replace(self._tmp, self._path)
+
+        numeric = tuple(
+            f.name for f in self._schema
+            if pa.types.is_integer(f.type) or pa.types.is_floating(f.type) or pa.types.is_decimal(f.type)
+        )
+        handle = ResultHandle(self._result_id, self._path, self.rows, tuple(self._schema.names), numeric)
+        self._store._evict()
+        return handle
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self._tmp):
+            os.remove(self._tmp)
+
+
+# -----------------------------------------------------
+# STORE
+# -----------------------------------------------------
+class ResultStore:
+    """Query results spilled to local Parquet files and read back a page at a time.
+
+    Pages, sorts, filters and exports run in DuckDB over the file, so only
+    the rows on screen are ever turned into a DataFrame. Files older than
+    the TTL, or the oldest ones beyond `max_bytes`, are deleted; a handle to
+    a deleted result raises ResultExpired.
+    """
+
+    def __init__(self, directory=RESULT_STORE_DIR, ttl_seconds=RESULT_STORE_TTL_SECONDS,
+                 max_bytes=RESULT_STORE_MAX_BYTES):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._con = duckdb.connect()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def writer(self):
+        result_id = uuid.uuid4().hex
+        return ResultWriter(self, result_id, os.path.join(self.directory, f"{result_id}.parquet"))
+
+    def count(self, handle, filters=None):
+        where, params = _where(handle, filters)
+        if not where:
+            return handle.rows
+        sql = f"SELECT COUNT(*) FROM read_parquet('{self._path(handle)}'){where}"
+        return self._cursor().execute(sql, params).fetchone()[0]
+
+    def page(self, handle, page=0, page_size=RESULT_PAGE_SIZE, sort=None, descending=False, filters=None):
+        """DataFrame of rows [page * page_size, (page + 1) * page_size) after filter and sort."""
+        where, params = _where(handle, filters)
+        sql = (
+            f"SELECT * FROM read_parquet('{self._path(handle)}'){where}"
+            f"{_order_by(handle, sort, descending)} LIMIT ? OFFSET ?"
+        )
+        return self._cursor().execute(sql, params + [page_size, max(page, 0) * page_size]).df()
+
+    def distinct(self, handle, column, limit):
+        """Up to `limit` distinct non-null values of `column`, or None when there are more."""
+        if column not in handle.columns:
+            raise ValueError(f"unknown column: {column}")
+        sql = (
+            f"SELECT DISTINCT {_quote(column)} FROM read_parquet('{self._path(handle)}')"
+            f" WHERE {_quote(column)} IS NOT NULL LIMIT ?"
+        )
+        values = [row[0] for row in self._cursor().execute(sql, [limit + 1]).fetchall()]
+        return None if len(values) > limit else values
+
+    def derive(self, handle, query, params=()):
+        """A new stored result from `query`, which reads this one as the table `result`."""
+        sql = f"WITH result AS (SELECT * FROM read_parquet('{self._path(handle)}')) {query}"
+        reader = self._cursor().execute(sql, list(params)).fetch_record_batch(10_000)
+        writer = self.writer()
+        try:
+            for batch in reader:
+                writer.write(batch)
+            return writer.close(reader.schema.names)
+        except Exception:
+            writer.abort()
+            raise
+
+    def export_csv(self, handle, sort=None, descending=False, filters=None):
+        """Path of a CSV with every matching row, written by DuckDB straight to disk."""
+        where, params = _where(handle, filters)
+        path = os.path.join(self.directory, f"{handle.result_id}-{uuid.uuid4().hex[:8]}.csv")
+        self._cursor().execute(
+            f"COPY (SELECT * FROM read_parquet('{self._path(handle)}'){where}"
+            f"{_order_by(handle, sort, descending)}) TO '{path}' (HEADER, DELIMITER ',')",
+            params,
+        )
+        return path
+
+    # -------------------------------------------------
+    def _cursor(self):
+        with self._lock:
+            return self._con.cursor()
+
+    def _path(self, handle):
+        if not os.path.exists(handle.path):
+            raise ResultExpired("This result has expired; ask the question again.")
+        return handle.path.replace("'", "''")
+
+    def _evict(self):
+        now = time.time()
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.ttl_seconds:
+                _remove(path)
+            elif not name.endswith(".tmp"):  # still being written
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            _remove(path)
+            total -= size
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_result_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ResultStore()
+        return _store
+
+
+# -----------------------------------------------------
+# STREAMLIT VIEWER
+# -----------------------------------------------------
+def render_result_viewer(handle, container=None, key="result", page_size=RESULT_PAGE_SIZE):
+    """Sort / filter / page controls over a stored result, plus a CSV export.
+
+    Only the current page is read from the file and sent to the browser.
+    """
+    import streamlit as st
+
+    store = get_result_store()
+    state = st.session_state
+    # a new result starts from page 1 with no sort or filter
+    if state.get(f"{key}_id") != handle.result_id:
+        for name in ("sort", "desc", "filter_col", "filter", "page", "view"):
+            state.pop(f"{key}_{name}", None)
+        state[f"{key}_id"] = handle.result_id
+
+    with (container or st.container()).container():
+        controls = st.columns([3, 2, 3, 3])
+        sort = controls[0].selectbox("Sort by", ["—"] + list(handle.columns), key=f"{key}_sort")
+        descending = controls[1].toggle("Descending", key=f"{key}_desc")
+        filter_col = controls[2].selectbox("Filter column", handle.columns, key=f"{key}_filter_col")
+        filter_text = controls[3].text_input(
+            "Filter", key=f"{key}_filter",
+            placeholder="e.g. > 10" if filter_col in handle.numeric else "contains…",
+        )
+        sort = None if sort == "—" else sort
+        filters = [f for f in [parse_filter(handle, filter_col, filter_text)] if f]
+        # a different sort or filter starts again from page 1
+        view = (sort, descending, tuple(filters))
+        if state.get(f"{key}_view") != view:
+            state[f"{key}_view"] = view
+            state[f"{key}_page"] = 1
+
+        try:
+            total = store.count(handle, filters)
+            pages = max(1, -(-total // page_size))
+            if state.get(f"{key}_page", 1) > pages:
+                state[f"{key}_page"] = pages
+            page = st.number_input(f"Page (of {pages:,})", 1, pages, key=f"{key}_page") - 1
+            df = store.page(handle, page, page_size, sort, descending, filters)
+        except ResultExpired as e:
+            st.warning(str(e))
+            return
+
+        st.dataframe(df, hide_index=True)
+        first = page * page_size
+        if total:
+            st.caption(
+                f"Rows {first + 1:,}–{first + len(df):,} of {total:,}"
+                + (f" (filtered from {handle.rows:,})" if filters else "")
+            )
+        else:
+            st.caption("No rows match the filter." if filters else "The query returned no rows.")
+
+        def export():
+            path = store.export_csv(handle, sort, descending, filters)
+            try:
+                with open(path, "rb") as f:
+                    return f.read()
+            finally:
+                _remove(path)
+
+        st.download_button(
+            "⬇ Export CSV", data=export, file_name="result.csv", mime="text/csv", key=f"{key}_export"
+        )
@@ -0,0 +1,237 @@
+import os
+import re
+import threading
+
+
+# table key in load_all_schemas() -> question words that pull the table in
+# (mirrors the STRICT RULES in sql_prompt_builder)
+TABLE_TRIGGERS = {
+    "forecast": ["predict", "forecast", "projection", "expected", "next month",
+                 "next quarter", "future"],
+    "market": ["market", "competitor", "demand", "utilization", "price", "discount",
+               "seasonality", "sentiment", "rating"],
+}
+
+# columns every selected table keeps so SQL can filter, group and join
+KEY_COLUMNS = {"service_category", "city", "year", "month", "ds", "date"}
+
+STOP_WORDS = {
+    "a", "an", "the", "of", "for", "in", "on", "by", "to", "and", "or", "is", "are",
+    "what", "which", "who", "how", "show", "me", "give", "list", "per", "each", "with",
+    "that", "this", "was", "were", "be", "it", "its", "our", "we", "all", "from", "at",
+    "as", "than", "into", "total", "number", "value", "values", "service", "city",
+}
+
+NAME_WEIGHT = 3.0
+SYNONYM_WEIGHT = 3.0
+DESCRIPTION_WEIGHT = 1.0
+
+# a question needs at least one name/synonym-level hit on a measure to trust the selection
+MIN_CONFIDENCE = float(os.environ.get("SCHEMA_INDEX_MIN_CONFIDENCE", "1.0"))
+USE_EMBEDDINGS = os.environ.get("SCHEMA_INDEX_EMBEDDINGS", "0") == "1"
+EMBEDDING_MODEL = os.environ.get("SCHEMA_INDEX_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_MIN_SIMILARITY = 0.45
+
+
+def _stem(word):
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+def tokenize(text):
+    return [_stem(w) for w in re.findall(r"[a-z0-9&]+", str(text).lower())]
+
+
+def _phrase(text):
+    return " ".join(tokenize(text))
+
+
+# -----------------------------
+# Index
+# -----------------------------
+class SchemaIndex:
+    """Keyword/synonym index over the schema YAMLs, built once per process.
+
+    `select(question)` returns the tables, columns and semantic entries that
+    the question refers to, or a fallback marker when the match is too weak
+    to trust.
+    """
+
+    def __init__(self, schemas, use_embeddings=USE_EMBEDDINGS):
+        self.schemas = schemas
+        self.semantic = schemas["semantic"]["semantic_model"]
+        self.tables = {
+            key: schemas[key] for key in ("descriptive", "forecast", "market") if key in schemas
+        }
+
+        self.term_index = {}
+        self.phrase_index = {}
+        self.column_docs = {}
+        self._build()
+
+        self._embedder = None
+        self._embeddings = None
+        if use_embeddings:
+            self._build_embeddings()
+
+    def _add(self, text, target, weight):
+        phrase = _phrase(text)
+        if not phrase:
+            return
+        index = self.phrase_index if " " in phrase else self.term_index
+        bucket = index.setdefault(phrase, {})
+        bucket[target] = max(bucket.get(target, 0.0), weight)
+
+    def _build(self):
+        synonyms = self.semantic.get("synonyms", {}) or {}
+
+        for table_key, table in self.tables.items():
+            for col in table.get("columns", []):
+                name = col["name"]
+                target = (table_key, name)
+
+                self._add(name.replace("_", " "), target, NAME_WEIGHT)
+                for part in name.split("_"):
+                    if part not in STOP_WORDS and len(part) > 2:
+                        self._add(part, target, NAME_WEIGHT / 2)
+                for syn in synonyms.get(name, []) or []:
+                    self._add(syn, target, SYNONYM_WEIGHT)
+                for word in tokenize(col.get("description", "")):
+                    if word not in STOP_WORDS and len(word) > 2:
+                        self._add(word, target, DESCRIPTION_WEIGHT)
+
+                self.column_docs[target] = " ".join(
+                    [name.replace("_", " "), col.get("description", "")]
+                    + [str(s) for s in synonyms.get(name, []) or []]
+                )
+
+    def _build_embeddings(self):
+        # optional: sentence-transformers is heavy and may be absent
+        try:
+            from sentence_transformers import SentenceTransformer
+            self._embedder = SentenceTransformer(EMBEDDING_MODEL)
+            self._doc_keys = list(self.column_docs)
+            self._embeddings = self._embedder.encode(
+                [self.column_docs[k] for k in self._doc_keys], normalize_embeddings=True
+            )
+        except Exception:
+            self._embedder = None
+            self._embeddings = None
+
+    # -----------------------------
+    # Retrieval
+    # -----------------------------
+    def _score(self, question):
+        words = tokenize(question)
+        text = " ".join(words)
+        scores = {}
+        strong = set()
+
+        def hit(target, weight):
+            scores[target] = scores.get(target, 0.0) + weight
+            if weight >= NAME_WEIGHT:
+                strong.add(target)
+
+        for word in words:
+            for target, weight in self.term_index.get(word, {}).items():
+                hit(target, weight)
+        for phrase, targets in self.phrase_index.items():
+            if f" {phrase} " in f" {text} ":
+                for target, weight in targets.items():
+                    hit(target, weight)
+
+        if self._embeddings is not None:
+            query = self._embedder.encode([question], normalize_embeddings=True)[0]
+            sims = self._embeddings @ query
+            for i in sims.argsort()[::-1][:5]:
+                if sims[i] >= EMBEDDING_MIN_SIMILARITY:
+                    hit(self._doc_keys[i], float(sims[i]) * NAME_WEIGHT)
+
+        return text, scores, strong
+
+    def select(self, question):
+        text, scores, strong = self._score(question)
+
+        tables = {"descriptive"}
+        for table_key, triggers in TABLE_TRIGGERS.items():
+            if any(f" {_phrase(t)} " in f" {text} " for t in triggers):
+                tables.add(table_key)
+
+        measures = {
+            target: score for target, score in scores.items()
+            if target[1] not in KEY_COLUMNS
+        }
+        # an exact column name or synonym hit pulls its table in
+        for table_key, name in strong:
+            if name not in KEY_COLUMNS:
+                tables.add(table_key)
+        tables &= set(self.tables)
+
+        columns = {}
+        for table_key in [k for k in self.tables if k in tables]:
+            names = [c["name"] for c in self.tables[table_key].get("columns", [])]
+            picked = [
+                n for n in names
+                if n in KEY_COLUMNS or measures.get((table_key, n), 0.0) >= DESCRIPTION_WEIGHT
+            ]
+            columns[table_key] = picked
+
+        metrics = self._metrics(text, columns)
+        for metric in metrics.values():
+            source = metric.get("source_column")
+            for table_key, names in columns.items():
+                known = {c["name"] for c in self.tables[table_key].get("columns", [])}
+                for ref in [source] + re.findall(r"[a-z_]+", metric.get("formula", "")):
+                    if ref in known and ref not in names:
+                        names.append(ref)
+
+        confidence = max(measures.values(), default=0.0) / NAME_WEIGHT
+        if any(f" {_phrase(name)} " in f" {text} " for name in metrics):
+            confidence = max(confidence, 1.0)
+        return {
+            "tables": list(columns),
+            "columns": columns,
+            "metrics": metrics,
+            "confidence": round(confidence, 2),
+            "fallback": confidence < MIN_CONFIDENCE,
+        }
+
+    def _metrics(self, text, columns):
+        selected = {c for names in columns.values() for c in names}
+        picked = {}
+        for name, metric in (self.semantic.get("metric_definitions", {}) or {}).items():
+            source = metric.get("source_column")
+            if f" {_phrase(name)} " in f" {text} " or (source and source in selected):
+                picked[name] = metric
+        return picked
+
+
+# -----------------------------
+# Prompt-size savings
+# -----------------------------
+class PromptStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {"prompts": 0, "fallbacks": 0, "full_chars": 0, "sent_chars": 0}
+
+    def record(self, full_chars, sent_chars, fallback):
+        with self._lock:
+            self._totals["prompts"] += 1
+            self._totals["fallbacks"] += int(fallback)
+            self._totals["full_chars"] += full_chars
+            self._totals["sent_chars"] += sent_chars
+        return {
+            "full_chars": full_chars,
+            "sent_chars": sent_chars,
+            "saved_pct": round(100 * (1 - sent_chars / full_chars), 1) if full_chars else 0.0,
+            "fallback": fallback,
+        }
+
+    def totals(self):
+        with self._lock:
+            out = dict(self._totals)
+        full = out["full_chars"]
+        out["saved_pct"] = round(100 * (1 - out["sent_chars"] / full), 1) if full else 0.0
+        return out
+
+
+prompt_stats = PromptStats()
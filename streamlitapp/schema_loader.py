@@ -1,16 +1,182 @@
-import yaml
+import hashlib
 import os
+import threading
+import time
+from collections import namedtuple
+
+import yaml
+
+from schema_index import SchemaIndex
+from sql_validator import SqlValidator
+from sql_prompt_builder import build_static_prefix
+
+
+SCHEMA_DIR = os.environ.get(
+    "SCHEMA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "schemas")
+)
+
+SCHEMA_FILES = {
+    "descriptive": "monthly_service_kpis.yaml",
+    "forecast": "monthly_service_kpis_forecasts.yaml",
+    "market": "market_data_schema.yaml",
+    "semantic": "semantic_model_business.yaml",
+}
+
+# minimum seconds between stat() sweeps of the schema files
+CHECK_INTERVAL_SECONDS = float(os.environ.get("SCHEMA_CHECK_INTERVAL_SECONDS", "2"))
+
+
+class SchemaValidationError(ValueError):
+    pass
+
 
 def load_yaml(path):
     with open(path, "r") as f:
         return yaml.safe_load(f)
 
+
+def validate_schema(key, data):
+    if not isinstance(data, dict):
+        raise SchemaValidationError(f"{key}: expected a mapping at the top level")
+
+    if key == "semantic":
+        model = data.get("semantic_model")
+        if not isinstance(model, dict) or "datasets" not in model:
+            raise SchemaValidationError("semantic: missing semantic_model.datasets")
+        return data
+
+    if not (data.get("table") or data.get("table_name")):
+        raise SchemaValidationError(f"{key}: missing table / table_name")
+
+    columns = data.get("columns")
+    if not isinstance(columns, list) or not columns:
+        raise SchemaValidationError(f"{key}: columns must be a non-empty list")
+
+    seen = set()
+    for col in columns:
+        if not isinstance(col, dict) or not col.get("name") or not col.get("type"):
+            raise SchemaValidationError(f"{key}: every column needs a name and a type")
+        if col["name"] in seen:
+            raise SchemaValidationError(f"{key}: duplicate column {col['name']}")
+        seen.add(col["name"])
+    return data
+
+
+# -----------------------------
+# Compiled schema registry
+# -----------------------------
+CompiledSchemas = namedtuple(
+    "CompiledSchemas",
+    ["version", "schemas", "schema_hash", "index", "static_prefix", "prefix_id", "validator"],
+)
+
+
+class SchemaRegistry:
+    """Parses and validates the schema YAMLs once and keeps derived artifacts.
+
+    Files are re-read only when their mtime/size changes, and recompiled only
+    when their content hash changes. A broken edit keeps the last good
+    version in service and is reported through `last_error`.
+    """
+
+    def __init__(self, base_dir=SCHEMA_DIR, check_interval=CHECK_INTERVAL_SECONDS):
+        self.base_dir = base_dir
+        self.check_interval = check_interval
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._file_state = {}
+        self._file_hash = {}
+        self._parsed = {}
+        self._compiled = None
+        self._checked_at = 0.0
+        self._listeners = []
+
+        self.refresh(force=True)
+        if self._compiled is None:
+            raise self.last_error
+
+    def add_listener(self, fn):
+        # fn(compiled) runs after every successful (re)compile
+        self._listeners.append(fn)
+
+    def snapshot(self):
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self.refresh()
+        return self._compiled
+
+    def refresh(self, force=False):
+        with self._lock:
+            self._checked_at = time.monotonic()
+            changed = False
+            parsed = dict(self._parsed)
+            hashes = dict(self._file_hash)
+            states = dict(self._file_state)
+
+            try:
+                for key, filename in SCHEMA_FILES.items():
+                    path = os.path.join(self.base_dir, filename)
+                    stat = os.stat(path)
+                    state = (stat.st_mtime_ns, stat.st_size)
+                    if not force and states.get(key) == state:
+                        continue
+
+                    with open(path, "rb") as f:
+                        raw = f.read()
+                    states[key] = state
+                    digest = hashlib.sha256(raw).hexdigest()
+                    if hashes.get(key) == digest:
+                        continue
+
+                    parsed[key] = validate_schema(key, yaml.safe_load(raw))
+                    hashes[key] = digest
+                    changed = True
+            except (OSError, yaml.YAMLError, SchemaValidationError) as e:
+                self.last_error = e
+                return False
+
+            self._file_state = states
+            if not changed:
+                return False
+
+            self._parsed = parsed
+            self._file_hash = hashes
+            self._compiled = self._compile(parsed, hashes)
+            self.last_error = None
+            compiled = self._compiled
+
+        for fn in self._listeners:
+            fn(compiled)
+        return True
+
+    def _compile(self, parsed, hashes):
+        schemas = {key: parsed[key] for key in SCHEMA_FILES}
+        schema_hash = hashlib.sha256(
+            "".join(hashes[key] for key in SCHEMA_FILES).encode("utf-8")
+        ).hexdigest()[:16]
+        static_prefix = build_static_prefix(schemas)
+
+        return CompiledSchemas(
+            version=(self._compiled.version + 1) if self._compiled else 1,
+            schemas=schemas,
+            schema_hash=schema_hash,
+            index=SchemaIndex(schemas),
+            static_prefix=static_prefix,
+            prefix_id=hashlib.sha256(static_prefix.encode("utf-8")).hexdigest()[:16],
+            validator=SqlValidator(schemas),
+        )
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_schema_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = SchemaRegistry()
+        return _registry
+
+
 def load_all_schemas():
-    base = "schemas"
-
-    return {
-        "descriptive": load_yaml(f"{base}/monthly_service_kpis.yaml"),
-        "forecast": load_yaml(f"{base}/monthly_service_kpis_forecasts.yaml"),
-        "market": load_yaml(f"{base}/market_data_schema.yaml"),
-        "semantic": load_yaml(f"{base}/semantic_model_business.yaml"),
-    }
+    return get_schema_registry().snapshot().schemas
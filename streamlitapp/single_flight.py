@@ -0,0 +1,309 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+from tracing import current_span, get_tracer
+
+
+# "0" turns coalescing off: every call runs on its own
+SINGLE_FLIGHT_ENABLED = os.environ.get("SINGLE_FLIGHT", "1") == "1"
+# how long a coalesced caller waits for someone else's call before giving up
+SINGLE_FLIGHT_WAIT_SECONDS = float(os.environ.get("SINGLE_FLIGHT_WAIT_SECONDS", "300"))
+
+
+class SingleFlightTimeout(TimeoutError):
+    pass
+
+
+class _LeaderAborted(Exception):
+    # the caller running the shared call was interrupted (e.g. a script
+    # rerun); waiters retry instead of failing with the interruption
+    pass
+
+
+_END = object()
+
+
+# -----------------------------------------------------
+# KEYS
+# -----------------------------------------------------
+_QUOTED = re.compile(r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`[^`]*`)""")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """Whitespace-insensitive form of a query; quoted text is left untouched."""
+    parts = _QUOTED.split(sql.strip().rstrip(";"))
+    return "".join(p if i % 2 else _SPACE.sub(" ", p) for i, p in enumerate(parts)).strip()
+
+
+def prompt_key(*parts):
+    # prompts can be large; key on a digest of the exact call arguments
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+# -----------------------------------------------------
+# SHARED STREAM
+# -----------------------------------------------------
+class _SharedStream:
+    """One upstream iterator replayed to every reader.
+
+    Whichever reader first needs a chunk that is not buffered yet pulls it
+    from the upstream (one at a time); the others wait for it. Readers that
+    join late replay the buffered chunks first.
+    """
+
+    def __init__(self, flight, key):
+        self.flight = flight
+        self.key = key
+        self.readers = 0  # guarded by flight._lock
+        self._source = None
+        self._chunks = []
+        self._done = False
+        self._error = None
+        self._driving = True  # until the leader has opened the upstream
+        self._cond = threading.Condition()
+
+    def _open(self, source):
+        with self._cond:
+            self._source = source
+            self._driving = False
+            self._cond.notify_all()
+
+    def read(self, timeout):
+        index = 0
+        try:
+            while True:
+                chunk = self._get(index, timeout)
+                if chunk is _END:
+                    return
+                yield chunk
+                index += 1
+        finally:
+            self.flight._leave_stream(self)
+
+    def _get(self, index, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                while True:
+                    if index < len(self._chunks):
+                        return self._chunks[index]
+                    if self._done:
+                        if self._error is not None:
+                            raise self._error
+                        return _END
+                    if not self._driving:
+                        self._driving = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.flight._count("timeouts")
+                        raise SingleFlightTimeout(f"{self.flight.name}: no chunk within {timeout:g}s")
+                    self._cond.wait(remaining)
+
+            try:
+                chunk = next(self._source)
+            except StopIteration:
+                self._finish(None)
+            except Exception as e:
+                self._finish(e)
+            except BaseException:
+                self._finish(_LeaderAborted())
+                raise
+            else:
+                with self._cond:
+                    self._chunks.append(chunk)
+                    self._driving = False
+                    self._cond.notify_all()
+
+    def _finish(self, error):
+        with self._cond:
+            self._done = True
+            self._error = error
+            self._driving = False
+            self._cond.notify_all()
+        if error is not None:
+            self.flight._count("errors")
+        self.flight._forget(self.key, self)
+
+    def close(self):
+        # every reader left before the end: stop the upstream call
+        with self._cond:
+            if self._done:
+                return
+            self._done = True
+            self._error = _LeaderAborted()
+        close = getattr(self._source, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                pass
+
+
+class SharedStream:
+    """Iterator over a (possibly coalesced) stream; `leader` is True for the
+    caller whose request opened it, e.g. to record token usage once."""
+
+    def __init__(self, iterator, leader):
+        self._iterator = iterator
+        self.leader = leader
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._iterator)
+
+    def close(self):
+        self._iterator.close()
+
+
+# -----------------------------------------------------
+# SINGLE FLIGHT
+# -----------------------------------------------------
+class SingleFlight:
+    """Concurrent calls with the same key share one execution and its result.
+
+    The first caller (the leader) runs the call on its own thread; callers
+    arriving while it is in flight wait for the same result or exception,
+    for at most `timeout` seconds. Nothing is cached: once the call returns,
+    the next caller starts a new one.
+    """
+
+    def __init__(self, name, timeout=SINGLE_FLIGHT_WAIT_SECONDS, enabled=SINGLE_FLIGHT_ENABLED):
+        self.name = name
+        self.timeout = timeout
+        self.enabled = enabled
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "executions": 0, "coalesced": 0, "errors": 0, "timeouts": 0}
+
+    def do(self, key, fn, timeout=None):
+        """Return fn() for this key, sharing an identical call already in flight."""
+        if not self.enabled:
+            return fn()
+
+        while True:
+            with self._lock:
+                future = self._calls.get(key)
+                leader = future is None
+                if leader:
+                    future = Future()
+                    self._calls[key] = future
+                self._record(leader)
+
+            if leader:
+                return self._lead(key, future, fn)
+
+            wait = self.timeout if timeout is None else timeout
+            try:
+                return future.result(timeout=wait)
+            except _LeaderAborted:
+                continue  # run it ourselves (or join whoever got there first)
+            except TimeoutError:
+                self._count("timeouts")
+                raise SingleFlightTimeout(f"{self.name}: shared call did not finish within {wait:g}s")
+
+    def stream(self, key, open_stream, timeout=None):
+        """SharedStream over open_stream()'s chunks, shared with identical open streams."""
+        if not self.enabled:
+            return SharedStream(iter(open_stream()), leader=True)
+
+        with self._lock:
+            shared = self._calls.get(key)
+            leader = shared is None
+            if leader:
+                shared = _SharedStream(self, key)
+                self._calls[key] = shared
+            shared.readers += 1
+            self._record(leader)
+
+        if leader:
+            try:
+                source = iter(open_stream())
+            except BaseException as e:
+                shared._finish(e if isinstance(e, Exception) else _LeaderAborted())
+                with self._lock:
+                    shared.readers -= 1
+                raise
+            shared._open(source)
+        return SharedStream(shared.read(self.timeout if timeout is None else timeout), leader)
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out["in_flight"] = len(self._calls)
+        return out
+
+    # -------------------------------------------------
+    def _lead(self, key, future, fn):
+        try:
+            result = fn()
+        except Exception as e:
+            self._forget(key, future)
+            self._count("errors")
+            future.set_exception(e)
+            raise
+        except BaseException:
+            self._forget(key, future)
+            future.set_exception(_LeaderAborted())
+            raise
+        self._forget(key, future)
+        future.set_result(result)
+        return result
+
+    def _leave_stream(self, shared):
+        with self._lock:
+            shared.readers -= 1
+            abandoned = shared.readers == 0 and self._calls.get(shared.key) is shared
+            if abandoned:
+                del self._calls[shared.key]
+        if abandoned:
+            shared.close()
+
+    def _forget(self, key, call):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+    def _record(self, leader):
+        # called with self._lock held
+        self._stats["calls"] += 1
+        self._stats["executions" if leader else "coalesced"] += 1
+        role = "leader" if leader else "coalesced"
+        current_span().set_attribute(f"singleflight.{self.name}", role)
+        get_tracer().add("singleflight.calls", 1, flight=self.name, role=role)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+        get_tracer().add(f"singleflight.{name}", 1, flight=self.name)
+
+
+# -----------------------------------------------------
+# PROCESS-WIDE FLIGHTS
+# -----------------------------------------------------
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def get_flight(name):
+    with _flights_lock:
+        if name not in _flights:
+            _flights[name] = SingleFlight(name)
+        return _flights[name]
+
+
+def flight_stats():
+    with _flights_lock:
+        flights = list(_flights.values())
+    return {f.name: f.stats() for f in flights}
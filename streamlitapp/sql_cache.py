@@ -0,0 +1,168 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+CACHE_PATH = os.environ.get(
+    "SQL_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "sql_cache.sqlite"),
+)
+CACHE_TTL_SECONDS = float(os.environ.get("SQL_CACHE_TTL_SECONDS", str(24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.environ.get("SQL_CACHE_MAX_ENTRIES", "512"))
+
+
+# -----------------------------
+# Keys
+# -----------------------------
+def normalize_question(question):
+    text = unicodedata.normalize("NFKC", question).lower().strip()
+    text = text.strip("\"'`")
+    text = re.sub(r"\s+", " ", text)
+    return text.rstrip("?.! ")
+
+
+def cache_key(question, schema_hash):
+    raw = f"{schema_hash}\n{normalize_question(question)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# -----------------------------
+# Memory LRU + SQLite store
+# -----------------------------
+class SQLCache:
+    """Generated SQL per (normalized question, schema hash).
+
+    Lookups go to an in-memory LRU first and fall back to a SQLite file so
+    entries survive restarts. Entries older than the TTL are treated as misses.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl_seconds=CACHE_TTL_SECONDS,
+                 max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "expired": 0}
+        self._init_store()
+
+    def get(self, question, schema_hash):
+        key = cache_key(question, schema_hash)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry["created_at"] < self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry["value"]
+                del self._memory[key]
+
+        row = self._query(
+            "SELECT sql, uses_market_data, uses_ml_prediction, created_at "
+            "FROM sql_cache WHERE key = ?", (key,), fetch=True,
+        )
+
+        with self._lock:
+            if row and now - row[3] < self.ttl_seconds:
+                value = (row[0], bool(row[1]), bool(row[2]))
+                self._remember(key, value, row[3])
+                self._stats["hits"] += 1
+                self._stats["disk_hits"] += 1
+                return value
+            if row:
+                self._stats["expired"] += 1
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, question, schema_hash, sql, uses_market_data, uses_ml_prediction):
+        key = cache_key(question, schema_hash)
+        now = time.time()
+        value = (sql, bool(uses_market_data), bool(uses_ml_prediction))
+
+        with self._lock:
+            self._remember(key, value, now)
+            self._stats["stores"] += 1
+
+        self._query(
+            "INSERT OR REPLACE INTO sql_cache "
+            "(key, schema_hash, question, sql, uses_market_data, uses_ml_prediction, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, schema_hash, normalize_question(question), sql,
+             int(value[1]), int(value[2]), now),
+        )
+
+    def discard(self, question, schema_hash):
+        key = cache_key(question, schema_hash)
+        with self._lock:
+            self._memory.pop(key, None)
+        self._query("DELETE FROM sql_cache WHERE key = ?", (key,))
+
+    def invalidate_schema(self, schema_hash):
+        # drop everything generated against a different schema version
+        with self._lock:
+            self._memory.clear()
+        self._query("DELETE FROM sql_cache WHERE schema_hash != ?", (schema_hash,))
+        self._query("DELETE FROM sql_cache WHERE created_at < ?",
+                    (time.time() - self.ttl_seconds,))
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out["memory_entries"] = len(self._memory)
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = out["hits"] / lookups if lookups else 0.0
+        return out
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = {"value": value, "created_at": created_at}
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _init_store(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._query(
+            "CREATE TABLE IF NOT EXISTS sql_cache ("
+            " key TEXT PRIMARY KEY,"
+            " schema_hash TEXT NOT NULL,"
+            " question TEXT NOT NULL,"
+            " sql TEXT NOT NULL,"
+            " uses_market_data INTEGER NOT NULL,"
+            " uses_ml_prediction INTEGER NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+
+    def _query(self, statement, params=(), fetch=False):
+        # short-lived connections keep this safe across Streamlit threads;
+        # a broken disk store degrades to memory-only caching
+        try:
+            conn = sqlite3.connect(self.path, timeout=5)
+        except sqlite3.Error:
+            return None
+        try:
+            with conn:
+                cur = conn.execute(statement, params)
+                return cur.fetchone() if fetch else None
+        except sqlite3.Error:
+            return None
+        finally:
+            conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_sql_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SQLCache()
+        return _cache
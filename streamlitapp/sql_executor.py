@@ -1,21 +1,42 @@
-import json
-from google.cloud import bigquery
+import threading
+
+import pandas as pd
+import pyarrow as pa
+
+from llm_gateway import get_gateway, parse_json_response
+from single_flight import get_flight, normalize_sql, prompt_key
+from tracing import current_span, get_tracer, record_llm_usage
+
+# identical calls in flight at the same time (across sessions) share one
+# execution; see single_flight.py
+_bq_flight = get_flight("bigquery")
+_sql_flight = get_flight("gemini.sql")
+_sql_gateway = get_gateway("gemini.sql")
 
 # -----------------------------
 # LLM → SQL
 # -----------------------------
-def run_llm_sql_generation(client, sql_prompt):
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=sql_prompt,
-        config={
-            "temperature": 0.0,
-            "max_output_tokens": 512,
-            "response_mime_type": "application/json"
-        }
-    )
+def run_llm_sql_generation(client, sql_prompt, cached_content=None, model="gemini-2.0-flash"):
+    config = {
+        "temperature": 0.0,
+        "max_output_tokens": 512,
+        "response_mime_type": "application/json"
+    }
+    # static rules + schemas already uploaded as provider-side cached content
+    if cached_content:
+        config["cached_content"] = cached_content
+
+    def generate():
+        response = _sql_gateway.call(lambda: client.models.generate_content(
+            model=model,
+            contents=sql_prompt,
+            config=config
+        ))
+        record_llm_usage(response, "sql")
+        return response.text
 
-    data = json.loads(response.text)
+    key = prompt_key(id(client), model, sql_prompt, cached_content)
+    data = parse_json_response(_sql_flight.do(key, generate))
 
     return (
         data.get("sql"),
@@ -23,9 +44,130 @@ def run_llm_sql_generation(client, sql_prompt):
         data.get("uses_ml_prediction", False)
     )
 
+# -----------------------------
+# Process-wide BigQuery clients
+# -----------------------------
+_bq_client = None
+_bqstorage_client = None
+_client_lock = threading.Lock()
+
+
+def get_bigquery_client():
+    global _bq_client
+    with _client_lock:
+        if _bq_client is None:
+            # imported here: google-cloud-bigquery is slow to import and
+            # Home.py can paint from cached or warm-start data without it
+            from google.cloud import bigquery
+            _bq_client = bigquery.Client()
+        return _bq_client
+
+
+def get_bqstorage_client():
+    # Storage Read API client; None means "page through REST instead"
+    global _bqstorage_client
+    with _client_lock:
+        if _bqstorage_client is None:
+            try:
+                from google.cloud import bigquery_storage
+                _bqstorage_client = bigquery_storage.BigQueryReadClient()
+            except Exception:
+                _bqstorage_client = False
+        return _bqstorage_client or None
+
+
+def set_bigquery_client(client, bqstorage_client=None):
+    # swap the process-wide clients, e.g. for the offline benchmark fakes
+    global _bq_client, _bqstorage_client
+    with _client_lock:
+        _bq_client = client
+        _bqstorage_client = bqstorage_client or False
+
 # -----------------------------
 # Execute SQL in BigQuery
 # -----------------------------
-def run_bigquery_sql(sql):
-    bq = bigquery.Client()
-    return bq.query(sql).to_dataframe()
+class ArrowResultStream:
+    """Iterator of pyarrow RecordBatches for one query, with optional caps.
+
+    After iteration, `rows`, `bytes` and `truncated` describe what was read.
+    `client` can be any object with BigQuery's `query(sql).result()` shape,
+    which is how the executor is exercised against a local fake.
+    """
+
+    def __init__(self, sql, max_rows=None, max_bytes=None, client=None, bqstorage_client=None):
+        self.sql = sql
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.rows = 0
+        self.bytes = 0
+        self.truncated = False
+        self.column_names = []
+
+        bq = client or get_bigquery_client()
+
+        def run_job():
+            job = bq.query(sql)
+            job.result()
+            get_tracer().add("bq.bytes_processed", getattr(job, "total_bytes_processed", None))
+            return job
+
+        # callers of the same query share the job; each reads its own rows
+        job = _bq_flight.do((id(bq), normalize_sql(sql)), run_job)
+        self._row_iter = job.result()
+
+        current_span().set_attributes(**{
+            "bq.bytes_processed": getattr(job, "total_bytes_processed", None),
+            "bq.cache_hit": getattr(job, "cache_hit", None),
+        })
+        self._bqstorage_client = bqstorage_client or get_bqstorage_client()
+        self.column_names = [field.name for field in (self._row_iter.schema or [])]
+
+    def __iter__(self):
+        batches = self._row_iter.to_arrow_iterable(bqstorage_client=self._bqstorage_client)
+
+        for batch in batches:
+            keep = batch.num_rows
+
+            if self.max_rows is not None:
+                keep = min(keep, self.max_rows - self.rows)
+
+            if self.max_bytes is not None and batch.num_rows:
+                row_bytes = batch.nbytes / batch.num_rows
+                if row_bytes:
+                    keep = min(keep, int((self.max_bytes - self.bytes) // row_bytes))
+
+            if keep < batch.num_rows:
+                batch = batch.slice(0, max(keep, 0))
+                self.truncated = True
+
+            if batch.num_rows:
+                self.rows += batch.num_rows
+                self.bytes += batch.nbytes
+                yield batch
+
+            if self.truncated:
+                break
+
+        current_span().set_attributes(**{
+            "bq.rows": self.rows,
+            "bq.result_bytes": self.bytes,
+            "bq.truncated": self.truncated,
+        })
+        get_tracer().add("bq.rows", self.rows)
+
+    def to_dataframe(self):
+        batches = list(self)
+        if not batches:
+            return pd.DataFrame(columns=self.column_names)
+
+        df = pa.Table.from_batches(batches).to_pandas()
+        df.attrs["truncated"] = self.truncated
+        return df
+
+
+def stream_bigquery_sql(sql, max_rows=None, max_bytes=None, client=None, bqstorage_client=None):
+    return ArrowResultStream(sql, max_rows, max_bytes, client, bqstorage_client)
+
+
+def run_bigquery_sql(sql, max_rows=None, max_bytes=None, client=None, bqstorage_client=None):
+    return stream_bigquery_sql(sql, max_rows, max_bytes, client, bqstorage_client).to_dataframe()
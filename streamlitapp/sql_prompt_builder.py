@@ -1,12 +1,19 @@
 import json
 
-def build_sql_prompt(user_query, schemas):
-    desc_cols = schemas["descriptive"]
-    forecast_cols = schemas["forecast"]
-    market_cols = schemas["market"]
-    semantic = schemas["semantic"]
+TABLE_LABELS = {
+    "descriptive": "HISTORICAL",
+    "forecast": "FORECAST",
+    "market": "MARKET",
+}
 
-    return f"""
+# the allow-list and join keys spelled out in SQL_RULES, for sql_validator
+ALLOWED_MODELS = {
+    "nonhospitality-bi.analytics.roi_regression_model",
+    "nonhospitality-bi.analytics.predict_guest_count",
+}
+MARKET_JOIN_KEYS = ["city", "service_category", "year", "month"]
+
+SQL_RULES = """
 You are a BigQuery SQL generator for hotel analytics.
 
 STRICT RULES:
@@ -32,30 +39,98 @@ JOIN keys:
 - NEVER invent columns.
 - ONLY use columns from schemas below.
 - ALWAYS return JSON with fields:
-{{
+{
   "sql": "...",
   "uses_market_data": true/false,
   "uses_ml_prediction": true/false
-}}
+}
+"""
+
 
+def table_id(table):
+    # the market YAML carries its full id; the analytics ones only a name
+    return table.get("table") or f"nonhospitality-bi.analytics.{table.get('table_name')}"
+
+
+def render_full_schemas(schemas):
+    return f"""
 ------------------------------------------
 SCHEMAS
 ------------------------------------------
 HISTORICAL:
-{json.dumps(desc_cols, indent=2)}
+{json.dumps(schemas["descriptive"], indent=2)}
 
 FORECAST:
-{json.dumps(forecast_cols, indent=2)}
+{json.dumps(schemas["forecast"], indent=2)}
 
 MARKET:
-{json.dumps(market_cols, indent=2)}
+{json.dumps(schemas["market"], indent=2)}
 
 SEMANTIC MODEL:
-{json.dumps(semantic, indent=2)}
+{json.dumps(schemas["semantic"], indent=2)}
+"""
+
+
+def render_selected_schemas(schemas, selection):
+    semantic = schemas["semantic"]["semantic_model"]
+    blocks = []
+
+    for key in selection["tables"]:
+        table = schemas[key]
+        name = table_id(table)
+        wanted = set(selection["columns"][key])
+        lines = [
+            f"  - {c['name']} {c['type']}: {c.get('description', '')}".rstrip()
+            for c in table.get("columns", []) if c["name"] in wanted
+        ]
+        blocks.append(f"{TABLE_LABELS[key]} `{name}`:\n" + "\n".join(lines))
 
+    selected = {c for names in selection["columns"].values() for c in names}
+    synonyms = {
+        col: words for col, words in (semantic.get("synonyms", {}) or {}).items()
+        if col in selected
+    }
+
+    compact = {
+        "synonyms": synonyms,
+        "metric_definitions": selection["metrics"],
+        "temporal_semantics": semantic.get("temporal_semantics", {}),
+        "decision_rules": semantic.get("decision_rules", []),
+        "sql_generation_rules": semantic.get("sql_generation_rules", []),
+    }
+
+    return f"""
+------------------------------------------
+SCHEMAS (relevant tables and columns)
+------------------------------------------
+{chr(10).join(blocks)}
+
+SEMANTIC MODEL:
+{json.dumps(compact, separators=(",", ":"))}
+"""
+
+
+def build_static_prefix(schemas):
+    # identical for every question: rules + full schemas
+    return f"{SQL_RULES}{render_full_schemas(schemas)}"
+
+
+def build_question_suffix(user_query):
+    return f"""
 ------------------------------------------
 USER QUESTION:
 \"\"\"{user_query}\"\"\"
 
 Generate SQL now.
 """
+
+
+def build_sql_prompt(user_query, schemas, selection=None, static_prefix=None):
+    # `selection` comes from schema_index.SchemaIndex.select(); without one,
+    # or when the index is not confident, every schema is sent in full
+    if selection is None or selection["fallback"]:
+        head = static_prefix or build_static_prefix(schemas)
+    else:
+        head = f"{SQL_RULES}{render_selected_schemas(schemas, selection)}"
+
+    return head + build_question_suffix(user_query)
@@ -0,0 +1,169 @@
+import os
+from collections import namedtuple
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import OptimizeError, ParseError
+from sqlglot.optimizer.qualify import qualify
+
+from sql_prompt_builder import ALLOWED_MODELS, MARKET_JOIN_KEYS, table_id
+
+
+# LIMIT added to generated SQL that has none (0 = leave the SQL alone)
+SQL_ROW_LIMIT = int(os.environ.get("SQL_ROW_LIMIT", "10000"))
+# extra LLM rounds allowed to fix SQL the validator rejected
+SQL_REPAIR_ATTEMPTS = int(os.environ.get("SQL_REPAIR_ATTEMPTS", "2"))
+
+TABLE_KEYS = ["descriptive", "forecast", "market"]
+
+
+class SqlValidationError(ValueError):
+    def __init__(self, errors):
+        self.errors = list(errors)
+        super().__init__("; ".join(self.errors))
+
+
+SqlCheck = namedtuple("SqlCheck", ["sql", "errors", "tables", "limited"])
+
+
+def _full_name(table):
+    return ".".join(p for p in (table.catalog, table.db, table.name) if p)
+
+
+# -----------------------------
+# Validator
+# -----------------------------
+class SqlValidator:
+    """Checks generated SQL against the schema YAMLs before it reaches BigQuery.
+
+    Rejects anything that is not a single SELECT, tables and models outside
+    the SQL_RULES allow-list, unknown columns, and market_data joins missing
+    a key. SQL without a LIMIT gets one appended.
+    """
+
+    def __init__(self, schemas, row_limit=SQL_ROW_LIMIT):
+        self.row_limit = row_limit
+        self.columns = {}
+        for key in TABLE_KEYS:
+            table = schemas[key]
+            self.columns[table_id(table)] = {c["name"]: c["type"] for c in table.get("columns", [])}
+
+        self.market_table = table_id(schemas["market"])
+        self.kpi_table = table_id(schemas["descriptive"])
+
+        # nested catalog -> db -> table -> columns, as sqlglot's qualify wants it
+        self.qualify_schema = {}
+        for name, cols in self.columns.items():
+            catalog, db, table = name.split(".")
+            self.qualify_schema.setdefault(catalog, {}).setdefault(db, {})[table] = cols
+
+    def validate(self, sql):
+        if not sql or not sql.strip():
+            return SqlCheck(sql, ["no SQL was returned"], [], False)
+
+        sql = sql.strip().rstrip(";").strip()
+        try:
+            statements = sqlglot.parse(sql, read="bigquery")
+        except ParseError as e:
+            return SqlCheck(sql, [f"SQL does not parse: {str(e).splitlines()[0]}"], [], False)
+
+        if len(statements) != 1:
+            return SqlCheck(sql, ["exactly one statement is allowed"], [], False)
+        tree = statements[0]
+        if not isinstance(tree, exp.Query):
+            return SqlCheck(sql, ["only SELECT queries are allowed"], [], False)
+
+        errors = []
+        tables = self._check_tables(tree, errors)
+        if not errors:
+            self._check_columns(tree, errors)
+            self._check_market_join(tree, errors)
+
+        limited = False
+        if not errors and self.row_limit and tree.args.get("limit") is None:
+            sql = f"{sql}\nLIMIT {self.row_limit}"
+            limited = True
+
+        return SqlCheck(sql, errors, sorted(tables), limited)
+
+    def _check_tables(self, tree, errors):
+        ctes = {cte.alias_or_name for cte in tree.find_all(exp.CTE)}
+        used = set()
+
+        for table in tree.find_all(exp.Table):
+            if isinstance(table.this, exp.Predict):
+                continue  # the ML.PREDICT(...) wrapper; its model is checked below
+            name = _full_name(table)
+            if not table.db and table.name in ctes:
+                continue
+
+            if isinstance(table.parent, exp.Predict):
+                if name not in ALLOWED_MODELS:
+                    errors.append(f"model `{name}` is not allowed; use one of {sorted(ALLOWED_MODELS)}")
+            elif name in self.columns:
+                used.add(name)
+            else:
+                errors.append(f"table `{name}` is not allowed; use one of {sorted(self.columns)}")
+        return used
+
+    def _check_columns(self, tree, errors):
+        # ML.PREDICT adds output columns the schemas don't list, so only the
+        # model inputs are checked for those queries
+        predicts = list(tree.find_all(exp.Predict))
+        scopes = [p.expression.this if isinstance(p.expression, exp.Subquery) else p.expression
+                  for p in predicts] if predicts else [tree]
+
+        for scope in scopes:
+            if not isinstance(scope, exp.Query):
+                continue
+            try:
+                qualify(scope.copy(), schema=self.qualify_schema, dialect="bigquery",
+                        validate_qualify_columns=True)
+            except OptimizeError as e:
+                message = str(e).split(". Line:")[0]
+                referenced = sorted({_full_name(t) for t in scope.find_all(exp.Table)} & set(self.columns))
+                hint = "; ".join(f"`{name}` columns: {', '.join(self.columns[name])}" for name in referenced)
+                errors.append(f"{message}. {hint}" if hint else message)
+
+    def _check_market_join(self, tree, errors):
+        for select in tree.find_all(exp.Select):
+            sources = [select.args.get("from_") or select.args.get("from")] + list(select.args.get("joins") or [])
+            names = {_full_name(s.this) for s in sources if s is not None and isinstance(s.this, exp.Table)}
+            if self.market_table not in names or self.kpi_table not in names:
+                continue
+
+            conditions = [j.args.get("on") for j in select.args.get("joins") or []]
+            conditions.append(select.args.get("where"))
+            # JOIN ... USING (city, ...) equates each listed column
+            equal = {key.name for j in select.args.get("joins") or [] for key in j.args.get("using") or []}
+            for cond in filter(None, conditions):
+                for eq in cond.find_all(exp.EQ):
+                    left, right = eq.this, eq.expression
+                    if isinstance(left, exp.Column) and isinstance(right, exp.Column) and left.name == right.name:
+                        equal.add(left.name)
+
+            missing = [k for k in MARKET_JOIN_KEYS if k not in equal]
+            if missing:
+                errors.append(
+                    "market_data must be joined on "
+                    + " AND ".join(f"k.{k} = m.{k}" for k in MARKET_JOIN_KEYS)
+                    + f"; missing: {', '.join(missing)}"
+                )
+
+
+# -----------------------------
+# Repair note
+# -----------------------------
+def build_repair_note(sql, errors):
+    # appended to the original SQL prompt: the rejected SQL and what was wrong
+    problems = "\n".join(f"- {e}" for e in errors)
+    return f"""
+------------------------------------------
+YOUR PREVIOUS SQL WAS REJECTED BEFORE EXECUTION:
+{sql or "(empty)"}
+
+Problems:
+{problems}
+
+Fix exactly these problems and return the same JSON shape.
+"""
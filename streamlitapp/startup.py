@@ -0,0 +1,171 @@
+"""Cold start: a warm-start snapshot of the dashboard datasets and background pre-warming.
+
+Heavy libraries (google-cloud-bigquery, google-genai, duckdb, sqlglot,
+sentence-transformers) are imported where they are first used, and the
+BigQuery and Gemini clients are built on first use, so a fresh instance
+can paint Home.py before any of them is loaded. Import cost per module is
+measured by benchmarks/bench_startup.py.
+
+With WARM_START_DIR set, every dashboard dataset fetched from BigQuery is
+also written there as Parquet. A new process serves those copies for its
+first paint, without touching the network, and checks BigQuery in the
+background (see dashboard_data.DatasetCache). On Cloud Run, point
+WARM_START_DIR at a mounted volume, or fill it at build time with
+
+    python startup.py snapshot
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+
+WARM_START_DIR = os.environ.get("WARM_START_DIR", "")  # unset = no snapshot
+WARM_START_MAX_AGE_SECONDS = float(os.environ.get("WARM_START_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+STARTUP_PREWARM = os.environ.get("STARTUP_PREWARM", "1") == "1"
+
+_MODIFIED_KEY = b"warm_start.modified"
+
+
+# -----------------------------------------------------
+# WARM-START SNAPSHOT
+# -----------------------------------------------------
+class WarmStartSnapshot:
+    """Last fetched copy of each dashboard dataset, one Parquet file per cache key.
+
+    Each file keeps the table's last-modified time from when it was fetched,
+    so the first revalidation can skip the refetch when nothing changed.
+    Files older than `max_age_seconds` are ignored.
+    """
+
+    def __init__(self, directory=WARM_START_DIR, max_age_seconds=WARM_START_MAX_AGE_SECONDS):
+        self.directory = directory
+        self.max_age_seconds = max_age_seconds
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.parquet")
+
+    def save(self, key, df, modified=None):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[_MODIFIED_KEY] = (modified.isoformat() if modified else "").encode()
+        path = self.path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        pq.write_table(table.replace_schema_metadata(metadata), tmp)
+        os.replace(tmp, path)
+
+    def load(self, key):
+        """(DataFrame, last-modified time or None), or None when there is no usable copy."""
+        import pyarrow.parquet as pq
+
+        path = self.path(key)
+        try:
+            if time.time() - os.stat(path).st_mtime > self.max_age_seconds:
+                return None
+            table = pq.read_table(path)
+        except Exception:
+            return None
+        modified = (table.schema.metadata or {}).get(_MODIFIED_KEY, b"").decode()
+        return table.to_pandas(), datetime.fromisoformat(modified) if modified else None
+
+    def keys(self):
+        return sorted(name[:-len(".parquet")] for name in os.listdir(self.directory) if name.endswith(".parquet"))
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_warm_start():
+    # None when WARM_START_DIR is unset or cannot be created
+    global _snapshot
+    with _snapshot_lock:
+        if _snapshot is None and WARM_START_DIR:
+            try:
+                _snapshot = WarmStartSnapshot()
+            except OSError:
+                _snapshot = False
+        return _snapshot or None
+
+
+# -----------------------------------------------------
+# BACKGROUND PRE-WARM
+# -----------------------------------------------------
+_prewarm_started = False
+_prewarm_lock = threading.Lock()
+_prewarm_report = {}
+
+
+def _prewarm():
+    # what the first bot question would otherwise pay for, in that order
+    steps = [
+        ("bigquery_client", lambda: __import__("sql_executor").get_bigquery_client()),
+        ("bqstorage_client", lambda: __import__("sql_executor").get_bqstorage_client()),
+        ("nlp_engine", lambda: __import__("nlp_engine").schema_snapshot()),
+        ("vertex_client", lambda: __import__("vertex_utils").get_vertex_client()),
+    ]
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step()
+            _prewarm_report[name] = round((time.perf_counter() - started) * 1000, 1)
+        except Exception as e:
+            _prewarm_report[name] = f"{type(e).__name__}: {e}"
+
+
+def prewarm_in_background():
+    """Once per process, after the first page has rendered: build the clients
+    and load the bot pipeline on a daemon thread."""
+    global _prewarm_started
+    with _prewarm_lock:
+        if _prewarm_started or not STARTUP_PREWARM:
+            return
+        _prewarm_started = True
+    threading.Thread(target=_prewarm, name="startup-prewarm", daemon=True).start()
+
+
+def prewarm_report():
+    # step -> milliseconds, or the error it raised
+    return dict(_prewarm_report)
+
+
+# -----------------------------------------------------
+# CLI
+# -----------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Warm-start snapshot of the dashboard datasets")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("snapshot", help="fetch every Home.py dataset and write it to WARM_START_DIR")
+    sub.add_parser("show", help="list the datasets in WARM_START_DIR")
+    args = parser.parse_args()
+
+    snapshot = get_warm_start()
+    if snapshot is None:
+        raise SystemExit("WARM_START_DIR is not set")
+
+    if args.command == "snapshot":
+        from dashboard_data import clear_cache, fetch_dashboard_data
+
+        clear_cache()  # fetch, don't serve an older snapshot
+        for name, future in fetch_dashboard_data().items():
+            df, seconds = future.result()
+            print(f"{name}: {len(df):,} rows in {seconds:.2f}s")
+
+    report = {}
+    for key in snapshot.keys():
+        loaded = snapshot.load(key)
+        report[key] = None if loaded is None else {
+            "rows": len(loaded[0]),
+            "modified": loaded[1].isoformat() if loaded[1] else None,
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,202 @@
 import json
+import os
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
+from llm_gateway import get_gateway
+from single_flight import get_flight, prompt_key
+from tracing import record_llm_usage
+
+# prompt budget for the DATA section and a rough chars→tokens ratio
+TOKEN_BUDGET = int(os.environ.get("SUMMARY_TOKEN_BUDGET", "6000"))
+CHARS_PER_TOKEN = 4
+
+# digest detail levels, tried from richest to leanest until one fits
+DIGEST_LEVELS = [
+    {"top_k": 5, "sample_per_group": 3, "max_groups": 20, "max_periods": 24},
+    {"top_k": 3, "sample_per_group": 2, "max_groups": 10, "max_periods": 12},
+    {"top_k": 2, "sample_per_group": 1, "max_groups": 5, "max_periods": 6},
+    {"top_k": 1, "sample_per_group": 0, "max_groups": 3, "max_periods": 3},
+]
+
+PRIMARY_MEASURE_HINTS = ["roi", "revenue", "margin", "profit"]
+TIME_COLUMNS = ["ds", "date"]
+
+SUMMARY_MODEL = "gemini-2.0-flash"
+SUMMARY_CONFIG = {"temperature": 0.3}
+
+# sessions asking for the same summary at the same time share one call
+_summary_flight = get_flight("gemini.summary")
+_summary_gateway = get_gateway("gemini.summary")
+
+
 def make_json_safe(df):
-    out = []
-    for r in df.to_dict(orient="records"):
-        clean = {}
-        for k, v in r.items():
-            if isinstance(v, pd.Timestamp):
-                clean[k] = v.isoformat()
-            elif pd.isna(v):
-                clean[k] = None
-            elif hasattr(v, "item"):
-                try:
-                    clean[k] = v.item()
-                except:
-                    clean[k] = str(v)
-            else:
-                clean[k] = v
-        out.append(clean)
-    return out
+    # pandas serializes timestamps, NaN and numpy scalars in one vectorized pass
+    if df.empty:
+        return []
+    return json.loads(df.to_json(orient="records", date_format="iso", default_handler=str))
 
 
-def summarize_results_with_llm(client, user_query, df):
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _compact(obj):
+    return json.dumps(obj, separators=(",", ":"), default=str)
+
+
+# -----------------------------
+# Column roles
+# -----------------------------
+def _column_roles(df):
+    dims, measures = [], []
+    for col in df.columns:
+        series = df[col]
+        if col in ("year", "month") or col in TIME_COLUMNS:
+            continue
+        if pd.api.types.is_bool_dtype(series) or not pd.api.types.is_numeric_dtype(series):
+            if series.nunique(dropna=True) <= max(50, len(df) // 20):
+                dims.append(col)
+        else:
+            measures.append(col)
+
+    if {"year", "month"} <= set(df.columns):
+        period = pd.to_numeric(df["year"]) * 100 + pd.to_numeric(df["month"])
+    else:
+        time_col = next((c for c in TIME_COLUMNS if c in df.columns), None)
+        period = pd.to_datetime(df[time_col], errors="coerce") if time_col else None
+
+    return dims, measures, period
+
+
+def _primary_measure(measures):
+    for hint in PRIMARY_MEASURE_HINTS:
+        for col in measures:
+            if hint in col.lower():
+                return col
+    return measures[0] if measures else None
+
+
+# -----------------------------
+# Digest sections
+# -----------------------------
+def _digest(df, dims, measures, period, level):
+    digest = {}
+    primary = _primary_measure(measures)
+
+    if measures:
+        stats = df[measures].agg(["count", "mean", "min", "max", "sum"]).T.round(4)
+        digest["overall"] = stats.to_dict(orient="index")
+
+    by_dim = {}
+    for dim in dims:
+        grouped = df.groupby(dim, dropna=False)[measures].mean().round(4) if measures \
+            else df.groupby(dim, dropna=False).size().to_frame("rows")
+        if primary:
+            grouped = grouped.sort_values(primary, ascending=False)
+        grouped = grouped.head(level["max_groups"])
+        by_dim[dim] = make_json_safe(grouped.reset_index())
+    if by_dim:
+        digest["mean_by_dimension"] = by_dim
+
+    if primary and level["top_k"]:
+        digest[f"top_{level['top_k']}_by_{primary}"] = make_json_safe(df.nlargest(level["top_k"], primary))
+        digest[f"bottom_{level['top_k']}_by_{primary}"] = make_json_safe(df.nsmallest(level["top_k"], primary))
+
+    if period is not None and measures and period.notna().any():
+        trend_cols = ([primary] + [m for m in measures if m != primary])[:3]
+        per_period = df[trend_cols].groupby(period.rename("period")).mean().sort_index()
+        steps = np.arange(len(per_period))
+        trend = {}
+        for col in trend_cols:
+            values = per_period[col].to_numpy(dtype=float)
+            ok = ~np.isnan(values)
+            if ok.sum() < 2:
+                continue
+            first, last = values[ok][0], values[ok][-1]
+            trend[col] = {
+                "slope_per_period": round(float(np.polyfit(steps[ok], values[ok], 1)[0]), 4),
+                "first": round(float(first), 4),
+                "last": round(float(last), 4),
+                "change_pct": round(float((last - first) / abs(first) * 100), 2) if first else None,
+            }
+        digest["trend"] = {
+            "periods": len(per_period),
+            "stats": trend,
+            "recent_period_means": make_json_safe(
+                per_period.tail(level["max_periods"]).round(4).reset_index()
+            ),
+        }
+
+    if level["sample_per_group"]:
+        if dims:
+            sample = df.groupby(dims[0], dropna=False, group_keys=False).head(level["sample_per_group"])
+        else:
+            sample = df.sample(min(len(df), level["sample_per_group"] * 5), random_state=0)
+        digest["stratified_sample"] = make_json_safe(sample)
+
+    return digest
+
 
-    safe_data = make_json_safe(df)
+def build_result_digest(df, token_budget=TOKEN_BUDGET):
+    """Return (data, meta) for the summary prompt.
+
+    Results that fit the budget are sent verbatim. Larger ones are reduced to
+    aggregates, top/bottom rows, trend statistics and a stratified sample; the
+    richest digest level that fits is used. `meta` records what was done.
+    """
+    # extrapolate from a slice first so huge results are never fully serialized
+    probe = make_json_safe(df.head(200))
+    verbatim_tokens = estimate_tokens(_compact(probe)) * max(1, len(df) // max(len(probe), 1))
+    records = probe
+    if len(df) > len(probe) and verbatim_tokens <= token_budget * 2:
+        records = make_json_safe(df)
+        verbatim_tokens = estimate_tokens(_compact(records))
+
+    meta = {
+        "mode": "verbatim",
+        "total_rows": len(df),
+        "total_columns": len(df.columns),
+        "token_budget": token_budget,
+        "estimated_tokens": verbatim_tokens,
+    }
+    if verbatim_tokens <= token_budget:
+        return records, meta
+
+    dims, measures, period = _column_roles(df)
+    for level in DIGEST_LEVELS:
+        digest = _digest(df, dims, measures, period, level)
+        tokens = estimate_tokens(_compact(digest))
+        if tokens <= token_budget:
+            break
+
+    meta.update({
+        "mode": "digest",
+        "verbatim_tokens": verbatim_tokens,
+        "estimated_tokens": tokens,
+        "over_budget": tokens > token_budget,
+        "dimensions": dims,
+        "measures": measures,
+        "sections": list(digest),
+        "level": level,
+    })
+    return digest, meta
+
+
+def render_summary_prompt(user_query, data, meta):
     today = datetime.now().strftime("%Y-%m-%d")
 
-    prompt = f"""
+    if meta["mode"] == "digest":
+        data_note = (
+            f"The query returned {meta['total_rows']} rows, too many to list. "
+            "Below is a digest computed over ALL rows: overall stats, means per "
+            "dimension, top/bottom rows, trend statistics and a stratified sample."
+        )
+    else:
+        data_note = f"All {meta['total_rows']} rows returned by the query."
+
+    return f"""
 You are a business analyst.
 
 CURRENT DATE: {today}
@@ -35,8 +204,12 @@ CURRENT DATE: {today}
 USER QUESTION:
 {user_query}
 
+DATA REDUCTION:
+{data_note}
+{_compact(meta)}
+
 DATA (DO NOT HALLUCINATE):
-{json.dumps(safe_data, indent=2)}
+{_compact(data)}
 
 TASK:
 - Provide insights
@@ -45,10 +218,90 @@ TASK:
 - Use ONLY data provided
 """
 
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=prompt,
-        config={"temperature": 0.3}
+
+def build_summary_prompt(user_query, df, token_budget=TOKEN_BUDGET):
+    data, meta = build_result_digest(df, token_budget)
+    return render_summary_prompt(user_query, data, meta), meta
+
+
+class DigestBuilder:
+    """Builds the summary input batch by batch while the result downloads.
+
+    Each batch is serialized as it arrives while the result still fits the
+    budget verbatim; once it stops fitting, only the frames are kept and the
+    digest is computed once at the end.
+    """
+
+    def __init__(self, token_budget=TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.frames = []
+        self.records = []
+        self.tokens = 0
+        self.verbatim = True
+
+    def add(self, df):
+        self.frames.append(df)
+        if self.verbatim:
+            records = make_json_safe(df)
+            self.records.extend(records)
+            self.tokens += estimate_tokens(_compact(records))
+            if self.tokens > self.token_budget:
+                self.verbatim = False
+                self.records = []
+
+    def dataframe(self):
+        if not self.frames:
+            return pd.DataFrame()
+        return pd.concat(self.frames, ignore_index=True) if len(self.frames) > 1 else self.frames[0]
+
+    def build(self, df=None):
+        df = self.dataframe() if df is None else df
+        if not self.verbatim:
+            return build_result_digest(df, self.token_budget)
+        return self.records, {
+            "mode": "verbatim",
+            "total_rows": len(df),
+            "total_columns": len(df.columns),
+            "token_budget": self.token_budget,
+            "estimated_tokens": self.tokens,
+        }
+
+
+def generate_summary(client, prompt):
+    def generate():
+        response = _summary_gateway.call(lambda: client.models.generate_content(
+            model=SUMMARY_MODEL,
+            contents=prompt,
+            config=SUMMARY_CONFIG
+        ))
+        record_llm_usage(response, "summary")
+        return response.text
+
+    return _summary_flight.do(prompt_key(id(client), SUMMARY_MODEL, prompt), generate)
+
+
+def stream_summary(client, prompt):
+    chunks = _summary_flight.stream(
+        prompt_key(id(client), SUMMARY_MODEL, prompt, "stream"),
+        lambda: _summary_gateway.stream(lambda: client.models.generate_content_stream(
+            model=SUMMARY_MODEL,
+            contents=prompt,
+            config=SUMMARY_CONFIG
+        )),
     )
+    last = None
+    for chunk in chunks:
+        last = chunk
+        if chunk.text:
+            yield chunk.text
+
+    # usage metadata on the final chunk covers the whole response; a
+    # coalesced reader shares the opener's call, so only it records usage
+    if last is not None and chunks.leader:
+        record_llm_usage(last, "summary")
+
+
+def summarize_results_with_llm(client, user_query, df):
 
-    return response.text
+    prompt, _ = build_summary_prompt(user_query, df)
+    return generate_summary(client, prompt)
@@ -0,0 +1,48 @@
+"""Conversation.record: which results a follow-up may refine locally."""
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from followup import Conversation, classify_followup  # noqa: E402
+
+ROW_LIMIT = 10000
+
+
+def record(sql, rows, refinement=None, conversation=None):
+    conversation = conversation or Conversation()
+    handle = SimpleNamespace(rows=rows, columns=["city", "revenue"])
+    conversation.record("question", {
+        "error": None, "result_handle": handle, "sql": sql, "truncated": False, "refinement": refinement,
+    }, ROW_LIMIT)
+    return conversation
+
+
+def test_top_k_result_is_not_refined_locally():
+    conversation = record(
+        "SELECT city, SUM(total_revenue) AS revenue FROM `p.analytics.monthly_service_kpis` "
+        "GROUP BY city ORDER BY revenue DESC LIMIT 5",
+        rows=5,
+    )
+    assert not conversation.last.complete
+    refinement, reason = classify_followup("top 10", conversation.last, store=None)
+    assert refinement is None and reason == "previous result was capped"
+
+
+def test_limit_the_result_did_not_reach_keeps_it_complete():
+    conversation = record("SELECT city FROM t GROUP BY city LIMIT 5", rows=3)
+    assert conversation.last.complete
+
+
+def test_appended_row_limit_keeps_it_complete():
+    conversation = record(f"SELECT city, revenue FROM t\nLIMIT {ROW_LIMIT}", rows=120)
+    assert conversation.last.complete
+
+
+def test_offset_and_local_top_k_are_capped():
+    assert not record("SELECT city FROM t LIMIT 5 OFFSET 5", rows=2).last.complete
+    conversation = record("SELECT city, revenue FROM t", rows=40)
+    conversation = record('SELECT * FROM result ORDER BY "revenue" DESC NULLS LAST LIMIT 10',
+                          rows=10, refinement="top 10 by revenue", conversation=conversation)
+    assert not conversation.last.complete
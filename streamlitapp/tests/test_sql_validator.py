@@ -0,0 +1,38 @@
+"""SqlValidator: the market_data join-key check."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schema_loader import get_schema_registry  # noqa: E402
+
+KPIS = "`nonhospitality-bi.analytics.monthly_service_kpis`"
+MARKET = "`nonhospitality-bi.raw.market_data`"
+
+
+def validate(sql):
+    return get_schema_registry().snapshot().validator.validate(sql)
+
+
+def test_market_join_on_all_keys_passes():
+    check = validate(
+        f"SELECT k.city, m.market_demand_index FROM {KPIS} k JOIN {MARKET} m "
+        "ON k.city = m.city AND k.service_category = m.service_category "
+        "AND k.year = m.year AND k.month = m.month"
+    )
+    assert check.errors == []
+
+
+def test_market_join_using_all_keys_passes():
+    check = validate(
+        f"SELECT city, m.market_demand_index FROM {KPIS} k JOIN {MARKET} m "
+        "USING (city, service_category, year, month)"
+    )
+    assert check.errors == []
+
+
+def test_market_join_missing_a_key_is_rejected():
+    check = validate(
+        f"SELECT city, m.market_demand_index FROM {KPIS} k JOIN {MARKET} m USING (city, year, month)"
+    )
+    assert len(check.errors) == 1 and check.errors[0].endswith("missing: service_category")
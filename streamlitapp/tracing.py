@@ -0,0 +1,386 @@
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+
+# none | console | file (comma-separated for several)
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "none")
+TRACE_FILE = os.environ.get(
+    "TRACE_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "traces.jsonl"),
+)
+# show the trace panel on every page without ticking the sidebar box
+TRACE_DEBUG_PANEL = os.environ.get("TRACE_DEBUG_PANEL", "0") == "1"
+TRACE_KEEP_RECENT = int(os.environ.get("TRACE_KEEP_RECENT", "50"))
+
+SERVICE_NAME = "nonhospitality-bi"
+
+
+# -----------------------------------------------------
+# SPANS
+# -----------------------------------------------------
+_current = ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, tracer, name, parent=None, attributes=None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.status = "UNSET"
+        self.status_message = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set_attribute(self, key, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, **attrs):
+        for key, value in attrs.items():
+            self.set_attribute(key, value)
+
+    def record_exception(self, exc):
+        self.status = "ERROR"
+        self.status_message = f"{type(exc).__name__}: {exc}"
+        self.events.append({
+            "name": "exception",
+            "time_ns": time.time_ns(),
+            "attributes": {"exception.type": type(exc).__name__, "exception.message": str(exc)},
+        })
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            if self.status == "UNSET":
+                self.status = "OK"
+            self.tracer._finish(self)
+
+    @property
+    def duration_ms(self):
+        end = self.end_ns or time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    # a span is also its own context manager: `with tracer.start_span(...) as s`
+    def __enter__(self):
+        self._previous = _current.get()
+        _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None and not isinstance(exc, GeneratorExit):
+            self.record_exception(exc)
+        # restore by value rather than token: spans may close on another
+        # context when a streaming generator is abandoned mid-way
+        _current.set(self._previous)
+        self.end()
+        return False
+
+
+class _NoopSpan:
+    trace_id = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, **attrs):
+        pass
+
+    def record_exception(self, exc):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def current_span():
+    return _current.get() or NOOP_SPAN
+
+
+# -----------------------------------------------------
+# COUNTERS
+# -----------------------------------------------------
+class Counters:
+    """Monotonic sums keyed by name and attribute set (OTel Sum semantics)."""
+
+    def __init__(self):
+        self.start_ns = time.time_ns()
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, value=1, **attrs):
+        if value is None:
+            return
+        key = (name, tuple(sorted(attrs.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            return [
+                {"name": name, "attributes": dict(attrs), "value": value}
+                for (name, attrs), value in sorted(self._values.items(), key=lambda kv: kv[0])
+            ]
+
+
+# -----------------------------------------------------
+# EXPORTERS (OTLP/JSON shaped)
+# -----------------------------------------------------
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attrs):
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attrs.items()]
+
+
+def _resource():
+    return {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})}
+
+
+def span_to_otlp(span):
+    out = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": 1,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": _otlp_attributes(span.attributes),
+        "events": [
+            {"name": e["name"], "timeUnixNano": str(e["time_ns"]), "attributes": _otlp_attributes(e["attributes"])}
+            for e in span.events
+        ],
+        "status": {"code": 2 if span.status == "ERROR" else 1},
+    }
+    if span.parent_id:
+        out["parentSpanId"] = span.parent_id
+    if span.status_message:
+        out["status"]["message"] = span.status_message
+    return out
+
+
+def spans_to_otlp(spans):
+    return {"resourceSpans": [{
+        "resource": _resource(),
+        "scopeSpans": [{"scope": {"name": SERVICE_NAME}, "spans": [span_to_otlp(s) for s in spans]}],
+    }]}
+
+
+def counters_to_otlp(points, start_ns):
+    now = str(time.time_ns())
+    metrics = {}
+    for p in points:
+        number = {"asInt": str(p["value"])} if isinstance(p["value"], int) else {"asDouble": p["value"]}
+        metrics.setdefault(p["name"], []).append({
+            "attributes": _otlp_attributes(p["attributes"]),
+            "startTimeUnixNano": str(start_ns),
+            "timeUnixNano": now,
+            **number,
+        })
+    return {"resourceMetrics": [{
+        "resource": _resource(),
+        "scopeMetrics": [{"scope": {"name": SERVICE_NAME}, "metrics": [
+            {"name": name, "sum": {"dataPoints": points, "aggregationTemporality": 2, "isMonotonic": True}}
+            for name, points in metrics.items()
+        ]}],
+    }]}
+
+
+class FileExporter:
+    """One OTLP/JSON object per line, the format of the collector's file exporter."""
+
+    def __init__(self, path=TRACE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def _write(self, record):
+        line = json.dumps(record, separators=(",", ":"))
+        with self._lock, open(self.path, "a") as f:
+            f.write(line + "\n")
+
+    def export_spans(self, spans):
+        self._write(spans_to_otlp(spans))
+
+    def export_counters(self, points, start_ns):
+        self._write(counters_to_otlp(points, start_ns))
+
+
+class ConsoleExporter:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+
+    def export_spans(self, spans):
+        for s in spans:
+            attrs = " ".join(f"{k}={v}" for k, v in s.attributes.items())
+            print(f"[trace {s.trace_id[:8]}] {s.name} {s.duration_ms:.1f}ms {s.status} {attrs}", file=self.stream)
+
+    def export_counters(self, points, start_ns):
+        for p in points:
+            attrs = ",".join(f"{k}={v}" for k, v in p["attributes"].items())
+            print(f"[metric] {p['name']}{{{attrs}}} {p['value']}", file=self.stream)
+
+
+def exporters_from_env(setting=TRACE_EXPORTER):
+    exporters = []
+    for name in (part.strip() for part in setting.split(",")):
+        if name == "file":
+            exporters.append(FileExporter())
+        elif name == "console":
+            exporters.append(ConsoleExporter())
+    return exporters
+
+
+# -----------------------------------------------------
+# TRACER
+# -----------------------------------------------------
+class Tracer:
+    """Spans for one process; finished traces are kept for the debug panel.
+
+    Each span is exported as it ends; the counters are exported whenever a
+    root span ends.
+    """
+
+    def __init__(self, exporters=None, keep_recent=TRACE_KEEP_RECENT):
+        self.exporters = exporters if exporters is not None else exporters_from_env()
+        self.keep_recent = keep_recent
+        self.counters = Counters()
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start_span(self, name, parent=None, **attrs):
+        """New span under `parent`: the current span when None, a new trace when False.
+
+        Use it with `with` to make it current, or call `end()` yourself.
+        """
+        if parent is None:
+            parent = _current.get()
+        return Span(self, name, parent, attrs)
+
+    def span(self, name, parent=None, **attrs):
+        return self.start_span(name, parent, **attrs)
+
+    def add(self, name, value=1, **attrs):
+        self.counters.add(name, value, **attrs)
+
+    def trace(self, trace_id):
+        with self._lock:
+            return list(self._recent.get(trace_id, []))
+
+    def _finish(self, span):
+        with self._lock:
+            self._recent.setdefault(span.trace_id, []).append(span)
+            self._recent.move_to_end(span.trace_id)
+            while len(self._recent) > self.keep_recent:
+                self._recent.popitem(last=False)
+
+        points = self.counters.snapshot() if span.parent_id is None else None
+        for exporter in self.exporters:
+            try:
+                exporter.export_spans([span])
+                if points is not None:
+                    exporter.export_counters(points, self.counters.start_ns)
+            except Exception:
+                pass  # tracing must never break a page
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+        return _tracer
+
+
+# -----------------------------------------------------
+# RECORDING HELPERS
+# -----------------------------------------------------
+def record_llm_usage(response, kind):
+    """Copy Gemini usage metadata onto the current span and the token counters."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_token_count", None)
+    response_tokens = getattr(usage, "candidates_token_count", None)
+    current_span().set_attributes(**{
+        "llm.prompt_tokens": prompt_tokens,
+        "llm.response_tokens": response_tokens,
+    })
+    tracer = get_tracer()
+    tracer.add("llm.prompt_tokens", prompt_tokens, kind=kind)
+    tracer.add("llm.response_tokens", response_tokens, kind=kind)
+
+
+def record_cache(cache, hit):
+    current_span().set_attribute(f"cache.{cache}", "hit" if hit else "miss")
+    get_tracer().add("cache.lookups", 1, cache=cache, result="hit" if hit else "miss")
+
+
+# -----------------------------------------------------
+# STREAMLIT DEBUG PANEL
+# -----------------------------------------------------
+def trace_rows(spans):
+    by_id = {s.span_id: s for s in spans}
+
+    def depth(span):
+        d = 0
+        while span.parent_id in by_id:
+            span = by_id[span.parent_id]
+            d += 1
+        return d
+
+    rows = []
+    for s in sorted(spans, key=lambda s: s.start_ns):
+        rows.append({
+            "span": "  " * depth(s) + s.name,
+            "ms": round(s.duration_ms, 1),
+            "status": s.status,
+            "attributes": ", ".join(f"{k}={v}" for k, v in s.attributes.items()),
+        })
+    return rows
+
+
+def render_debug_panel(trace_id, container=None):
+    """Sidebar expander with the spans of one trace and the process counters."""
+    import pandas as pd
+    import streamlit as st
+
+    target = container or st.sidebar
+    if not (TRACE_DEBUG_PANEL or target.checkbox("🐞 Show trace", key="trace-panel")):
+        return
+
+    tracer = get_tracer()
+    with target.expander("🐞 Trace", expanded=True):
+        spans = tracer.trace(trace_id) if trace_id else []
+        if spans:
+            st.dataframe(pd.DataFrame(trace_rows(spans)), hide_index=True)
+        else:
+            st.caption("No trace recorded for this run.")
+
+        counters = tracer.counters.snapshot()
+        if counters:
+            st.dataframe(pd.DataFrame([
+                {"counter": c["name"], "attributes": ", ".join(f"{k}={v}" for k, v in c["attributes"].items()),
+                 "value": c["value"]}
+                for c in counters
+            ]), hide_index=True)
@@ -1,7 +1,23 @@
-from google import genai
 import os
+import threading
+
+
+_client = None
+_client_lock = threading.Lock()
 
 
 def get_vertex_client():
-    os.environ["GOOGLE_CLOUD_API_KEY"] = "AQ.Ab8RN6Ku11MlnrqOjUkD9ouPBe68j6kmWH4l_4YmnVSsiUjU_A"
-    return genai.Client(vertexai=True, api_key=os.environ["GOOGLE_CLOUD_API_KEY"])
\ No newline at end of file
+    # one client per process, built on first use
+    global _client
+    with _client_lock:
+        if _client is None:
+            from google import genai  # slow to import; only pages that call Gemini need it
+
+            # an API key from the environment, else Application Default
+            # Credentials with GOOGLE_CLOUD_PROJECT / GOOGLE_CLOUD_LOCATION
+            api_key = os.environ.get("GOOGLE_CLOUD_API_KEY")
+            if api_key:
+                _client = genai.Client(vertexai=True, api_key=api_key)
+            else:
+                _client = genai.Client(vertexai=True)
+        return _client